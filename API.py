@@ -5,29 +5,42 @@ print(">>> KOD DOSYASI BAŞARIYLA ÇALIŞTIRILDI - VERSİYON KONTROLÜ <<<")
 
 import chromadb
 import google.generativeai as genai
+import hashlib
 import os
 import sys
 import json
 import time
 import re
 import random
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from flask import Flask, request, Response, stream_with_context
 from flask_cors import CORS
-# GCS ve Firestore kütüphanelerini import et
-from google.cloud import storage
+# Firestore kütüphanesini import et
 from google.cloud import firestore
+from BelgeDeposu import DOCUMENT_STORE_DIRNAME, ProductDocumentStore, features_length
+from DepoSenkronu import GCSStorageBackend, LocalStorageBackend, sync_database
+from Eslestirici import QueryMatcher
+from FiyatIndeksi import PRICE_INDEX_DIRNAME, PriceIndex, price_bounds_from_where
+from Olcumler import NULL_TRACE, MetricsRegistry, SamplingProfiler, activate, set_search_type, span
+from Onbellek import CoalescingCache, EmbeddingCache, SemanticAnswerCache
+from PromptOlusturucu import PromptBuilder
+from OturumDeposu import FirestoreSessionBackend, InMemorySessionBackend, SessionStore
+from VektorUretici import DEFAULT_BATCH_SIZE as EMBED_BATCH_SIZE, EMBEDDING_MODEL
+from Yonlendirici import ROUTER_DIRNAME, CategoryRouter
 
 # --- SABİTLER VE YAPILANDIRMA ---
 # Güvenlik için API anahtarını ortam değişkenlerinden almak en iyisidir.
-
+load_dotenv()
+API_KEY = os.environ.get("GOOGLE_API_KEY")
 GENERATION_MODEL = "gemini-2.5-pro"
-EMBEDDING_MODEL = "models/text-embedding-004"
 CATEGORIES_FILENAME = "kategoriler.json"
 GCS_BUCKET_NAME = "rag-api-veritabani"
 DB_PATH = "/tmp/urun_veritabani"
 DB_SOURCE_FOLDER = "urun_veritabani"
+# Doluysa veritabanı GCS yerine bu yerel klasörden eşitlenir (testler ve yerel geliştirme için)
+DB_SOURCE_DIR = os.environ.get("DB_SOURCE_DIR") or None
+DB_DOWNLOAD_WORKERS = int(os.environ.get("DB_DOWNLOAD_WORKERS", 8))
 SEARCH_TYPE_DEFAULT = 'default'
 SEARCH_TYPE_FP = 'price_performance'
 SEARCH_TYPE_CHEAPEST = 'cheapest'
@@ -35,39 +48,121 @@ SEARCH_TYPE_EXPENSIVE = 'most_expensive'
 DEFAULT_N_RESULTS = 20
 SPECIAL_N_RESULTS = 50
 PRICE_RANGE_MULTIPLIER = 0.2
+# Kategorisi belirtilmemiş sorgularda aranacak en yakın koleksiyon sayısı ve gereken en düşük benzerlik
+ROUTER_TOP_K = int(os.environ.get("ROUTER_TOP_K", 3))
+ROUTER_MIN_SCORE = float(os.environ.get("ROUTER_MIN_SCORE", 0.0))
+# Koleksiyon arama havuzu: aynı anda arama yapan her istek iş parçacığı (gunicorn threads) ROUTER_TOP_K
+# iş parçacığı kullanır. SEARCH_THREADS verilirse havuz boyutu doğrudan budur.
+REQUEST_THREADS = int(os.environ.get("GUNICORN_THREADS", 8))
+SEARCH_THREADS = int(os.environ.get("SEARCH_THREADS", 0))
+# /search/batch'in gruplanmış koleksiyon sorguları ayrı havuzda çalışır; tekli aramaları bekletmez
+BATCH_SEARCH_THREADS = int(os.environ.get("BATCH_SEARCH_THREADS", 4))
+# Fiyat indeksinde nicemlenmiş vektör katmanı varsa (VeriTabanı.py --vector-tier) fiyat aralığı aramalarında
+# adaylar bu katmanla seçilir; en yakın DEFAULT_N_RESULTS * VECTOR_TIER_RERANK_FACTOR aday kesin olarak sıralanır.
+VECTOR_TIER_ENABLED = os.environ.get("VECTOR_TIER_ENABLED", "1") == "1"
+VECTOR_TIER_RERANK_FACTOR = int(os.environ.get("VECTOR_TIER_RERANK_FACTOR", 4))
+# Arama türünü belirleyen ifadeler (sıra önceliktir: ilk eşleşen tür kazanır)
+SEARCH_INTENT_PHRASES = {
+    SEARCH_TYPE_FP: ['fiyat performans', 'f/p'],
+    SEARCH_TYPE_CHEAPEST: ['daha ucuz', 'en ucuz'],
+    SEARCH_TYPE_EXPENSIVE: ['daha pahalı', 'en pahalı'],
+}
+# Sorgu vektörü önbelleği (EMBEDDING_CACHE_PATH boşsa yalnızca bellek katmanı kullanılır)
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 4096))
+EMBEDDING_CACHE_TTL = int(os.environ.get("EMBEDDING_CACHE_TTL", 6 * 60 * 60))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH") or None
+# Disk katmanının kayıt ömrü ve en fazla kayıt sayısı (768 boyutlu vektörle kayıt başına ~3 KB)
+EMBEDDING_CACHE_DISK_TTL = int(os.environ.get("EMBEDDING_CACHE_DISK_TTL", 30 * 24 * 60 * 60))
+EMBEDDING_CACHE_DISK_MAX_ROWS = int(os.environ.get("EMBEDDING_CACHE_DISK_MAX_ROWS", 100000))
+# Aynı anda gelen özdeş aramalar (koleksiyon, arama metni, filtre, arama türü) tek bir vektör üretimi ve
+# sorguyla yanıtlanır; sonuç SEARCH_CACHE_TTL saniye saklanır (0: yalnızca eşzamanlı istekler birleştirilir).
+SEARCH_COALESCING_ENABLED = os.environ.get("SEARCH_COALESCING_ENABLED", "1") == "1"
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 2048))
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 30))
+# /search ve /search/batch: varsayılan ve en fazla döndürülen ürün sayısı, bir istekteki en fazla sorgu sayısı
+SEARCH_RESULT_LIMIT = int(os.environ.get("SEARCH_RESULT_LIMIT", 5))
+SEARCH_MAX_RESULT_LIMIT = DEFAULT_N_RESULTS
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", 500))
+# İsteğe bağlı cevap önbelleği: aynı ürün için benzer soruların (kosinüs >= ANSWER_CACHE_SIMILARITY)
+# model cevabı yeniden kullanılır. Yalnızca geçmişi en fazla ANSWER_CACHE_MAX_HISTORY_TURNS tur olan
+# konuşmalarda devreye girer; ürünün fiyatı veya teklifleri değişince o ürünün cevapları geçersiz olur.
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "0") == "1"
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", 0.95))
+ANSWER_CACHE_MAX_HISTORY_TURNS = int(os.environ.get("ANSWER_CACHE_MAX_HISTORY_TURNS", 2))
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 1024))
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 60 * 60))
+# Konuşma geçmişi deposu ('firestore' veya testler için 'memory')
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "firestore")
+MAX_HISTORY_TURNS = int(os.environ.get("MAX_HISTORY_TURNS", 20))
+# Süreç içi geçmiş önbelleği; birden çok gunicorn işçisinde kapatılır (bkz. gunicorn.conf.py)
+SESSION_CACHE_ENABLED = os.environ.get("SESSION_CACHE_ENABLED", "1") == "1"
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+SESSION_CACHE_TTL = int(os.environ.get("SESSION_CACHE_TTL", 10 * 60))
+SESSION_FLUSH_INTERVAL = float(os.environ.get("SESSION_FLUSH_INTERVAL", 0.5))
+# Prompt boyutu sınırı (tahmini token) ve olduğu gibi eklenecek son tur sayısı
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 8000))
+PROMPT_VERBATIM_TURNS = int(os.environ.get("PROMPT_VERBATIM_TURNS", 3))
+# 'post_fork' ise içe aktarmada yalnızca paylaşılan durum hazırlanır; istemciler her işçi sürecinde
+# fork'tan sonra initialize_process_clients() ile açılır (bkz. gunicorn.conf.py).
+# 'manual' ise içe aktarmada hiçbir şey başlatılmaz (benchmark'lar servisleri kendisi başlatır).
+PROCESS_CLIENTS_MODE = os.environ.get("API_PROCESS_CLIENTS", "import")
+# İstek aşaması ölçümleri (/metrics, Server-Timing). Kapalıyken span'lar hiçbir şey yapmaz.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+# Açıksa akışın sonuna aşama sürelerini taşıyan bir '8:' kaydı eklenir
+METRICS_STREAM_TRAILER = os.environ.get("METRICS_STREAM_TRAILER", "0") == "1"
+# Açıksa /debug/profile?seconds=N örneklemeli profil (katlanmış yığın) döndürür
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL = float(os.environ.get("PROFILER_INTERVAL", 0.005))
+PROFILE_DEFAULT_SECONDS = 10
+CATEGORY_REQUIRED_MESSAGE = "Lütfen sorgunuzda bir ürün kategorisi belirtin."
+SEARCH_ERROR_MESSAGE = "Arama sırasında beklenmedik bir sorun oluştu."
+BATCH_SEARCH_TYPE = "batch"
+# Arama uç noktalarının metriklerde /chat'ten ayrılan 'endpoint' etiketleri
+SEARCH_ENDPOINT_LABEL = "search"
+BATCH_SEARCH_ENDPOINT_LABEL = "search_batch"
 
 # --- UYGULAMA BAŞLANGICI ---
 app = Flask(__name__)
-CORS(app, resources={r"/chat": {"origins": "*"}})
+CORS(app, resources={r"/chat": {"origins": "*"}, r"/search.*": {"origins": "*"}},
+     expose_headers=["X-Prompt-Tokens", "X-Prompt-Chars", "Server-Timing"])
 
 # --- GLOBAL DEĞİŞKENLER ---
 CLIENT = None
 MODEL = None
+EMBED_CONTENT = None
 ALL_CATEGORIES = []
 DB_FIRESTORE = None
+EMBEDDING_CACHE = None
+QUERY_MATCHER = None
+PRICE_INDEX = None
+CATEGORY_ROUTER = None
+DOCUMENT_STORE = None
+SEARCH_CACHE = None
+ANSWER_CACHE = None
+# Koleksiyon adı -> ChromaDB koleksiyon tanıtıcısı (süreç istemcisi açılırken doldurulur)
+COLLECTION_HANDLES = {}
+SESSION_STORE = None
+PROMPT_BUILDER = PromptBuilder(token_budget=PROMPT_TOKEN_BUDGET, verbatim_turns=PROMPT_VERBATIM_TURNS)
+METRICS = MetricsRegistry(enabled=METRICS_ENABLED)
+PROFILER = SamplingProfiler(interval=PROFILER_INTERVAL) if PROFILER_ENABLED else None
+# Yönlendirilen koleksiyonlarda paralel arama (iş parçacıkları ilk kullanımda, fork'tan sonra başlar)
+SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=SEARCH_THREADS or max(1, ROUTER_TOP_K) * max(1, REQUEST_THREADS),
+                                     thread_name_prefix="koleksiyon-arama")
+BATCH_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, BATCH_SEARCH_THREADS), thread_name_prefix="toplu-arama")
 
 
 # --- YARDIMCI FONKSİYONLAR ---
 
+def create_storage_backend():
+    """Veritabanının indirileceği depolama arka ucunu oluşturur."""
+    if DB_SOURCE_DIR: return LocalStorageBackend(DB_SOURCE_DIR)
+    return GCSStorageBackend(GCS_BUCKET_NAME, DB_SOURCE_FOLDER)
+
+
 def download_database_from_gcs():
-    """Veritabanı dosyalarını Google Cloud Storage'dan indirir."""
-    bucket_name = GCS_BUCKET_NAME
-    print(f"'{bucket_name}' bucket'ından veritabanı indirilmeye başlanıyor...")
-    if os.path.exists(DB_PATH): shutil.rmtree(DB_PATH)
-    os.makedirs(DB_PATH)
+    """Veritabanı dosyalarını depodan (varsayılan olarak Google Cloud Storage) eşitler."""
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        blobs = bucket.list_blobs(prefix=DB_SOURCE_FOLDER)
-        file_count = 0
-        for blob in blobs:
-            if not blob.name.endswith('/'):
-                destination_file_name = os.path.join(DB_PATH, os.path.basename(blob.name))
-                blob.download_to_filename(destination_file_name)
-                file_count += 1
-        if file_count == 0: return False
-        print(f"✅ Veritabanı başarıyla indirildi. Toplam {file_count} dosya indirildi -> {DB_PATH}")
-        return True
+        return sync_database(create_storage_backend(), DB_PATH, max_workers=DB_DOWNLOAD_WORKERS)
     except Exception as e:
         print(f"HATA: GCS'den veritabanı indirilirken bir sorun oluştu: {e}")
         return False
@@ -87,255 +182,729 @@ def sanitize_collection_name(name):
     return name if name else "diger_kategoriler"
 
 
-def initialize_services():
-    """API ve Veritabanı istemcilerini başlatır."""
-    global CLIENT, MODEL, ALL_CATEGORIES, DB_FIRESTORE
-    print(">>> Servisler başlatılıyor... <<<")
-    if not API_KEY: print("HATA: API_KEY bulunamadı."); sys.exit(1)
+def _log_startup_timings(title, startup_timings, start_time):
+    startup_timings["toplam"] = time.time() - start_time
+    print(f"✅ {title} Başlangıç süreleri: " +
+          ", ".join(f"{name} {seconds:.2f} sn" for name, seconds in startup_timings.items()))
+
+
+def initialize_shared_state():
+    """
+    Süreçler arasında paylaşılabilen salt okunur durumu hazırlar: veritabanını eşitler,
+    kaydedilmiş fiyat indeksini, kategori yönlendiricisini ve ürün belge deposunu bellek eşlemeli (mmap)
+    olarak açar ve kategori eşleştiricisini kurar.
+    gunicorn preload modunda ana süreçte bir kez çalışır; işçiler bu durumu fork ile devralır.
+    Ağ veya dosya tanıtıcısı tutan istemciler burada açılmaz.
+    """
+    global ALL_CATEGORIES, QUERY_MATCHER, PRICE_INDEX, CATEGORY_ROUTER, DOCUMENT_STORE
+    print(">>> Paylaşılan durum hazırlanıyor... <<<")
+    startup_timings, start_time = {}, time.time()
     try:
+        step_start = time.time()
         if not download_database_from_gcs():
             sys.exit("Veritabanı indirilemediği için uygulama durduruluyor.")
-        genai.configure(api_key=API_KEY)
-        CLIENT = chromadb.PersistentClient(path=DB_PATH)
-        MODEL = genai.GenerativeModel(GENERATION_MODEL)
-        DB_FIRESTORE = firestore.Client()
+        startup_timings["veritabanı eşitleme"] = time.time() - step_start
+        step_start = time.time()
+        PRICE_INDEX = PriceIndex.load(os.path.join(DB_PATH, PRICE_INDEX_DIRNAME))
+        CATEGORY_ROUTER = CategoryRouter.load(os.path.join(DB_PATH, ROUTER_DIRNAME))
+        DOCUMENT_STORE = ProductDocumentStore(os.path.join(DB_PATH, DOCUMENT_STORE_DIRNAME))
+        startup_timings["fiyat indeksi ve yönlendirici"] = time.time() - step_start
+        step_start = time.time()
         with open(CATEGORIES_FILENAME, 'r', encoding='utf-8') as f:
             categories_list = json.load(f)
         ALL_CATEGORIES = sorted(categories_list, key=len, reverse=True)
-        print("✅ Servisler başarıyla başlatıldı.")
+        QUERY_MATCHER = QueryMatcher(ALL_CATEGORIES, SEARCH_INTENT_PHRASES)
+        startup_timings["kategoriler"] = time.time() - step_start
+        _log_startup_timings("Paylaşılan durum hazır.", startup_timings, start_time)
+    except Exception as e:
+        print(f"HATA: Paylaşılan durum hazırlanamadı: {e}");
+        sys.exit(1)
+
+
+def initialize_process_clients(model=None, embed_content=None):
+    """
+    Sürece özel istemcileri (Gemini, ChromaDB, Firestore, vektör önbelleği) açar.
+    gRPC kanalları, SQLite bağlantıları ve ChromaDB'nin iş parçacıkları fork'tan sonra
+    güvenle kullanılamadığı için çok süreçli modda her işçide fork'tan sonra çağrılır.
+    model ve embed_content verilirse Gemini yerine bunlar kullanılır (benchmark'lardaki yerel sahteler).
+    """
+    global CLIENT, MODEL, EMBED_CONTENT, DB_FIRESTORE, EMBEDDING_CACHE, PRICE_INDEX, CATEGORY_ROUTER, SESSION_STORE
+    global SEARCH_CACHE, ANSWER_CACHE, COLLECTION_HANDLES
+    print(f">>> Süreç istemcileri başlatılıyor (pid {os.getpid()})... <<<")
+    uses_gemini = model is None or embed_content is None
+    if uses_gemini and not API_KEY: print("HATA: API_KEY bulunamadı."); sys.exit(1)
+    startup_timings, start_time = {}, time.time()
+    try:
+        step_start = time.time()
+        if uses_gemini: genai.configure(api_key=API_KEY)
+        CLIENT = chromadb.PersistentClient(path=DB_PATH)
+        COLLECTION_HANDLES = {collection.name: collection for collection in CLIENT.list_collections()}
+        startup_timings["chroma"] = time.time() - step_start
+        if PRICE_INDEX is None:
+            # Eski veritabanlarında kaydedilmiş indeks ve yönlendirici yoktur; koleksiyonlardan kurulur.
+            step_start = time.time()
+            PRICE_INDEX = PriceIndex.build(CLIENT)
+            startup_timings["fiyat indeksi"] = time.time() - step_start
+        if CATEGORY_ROUTER is None:
+            step_start = time.time()
+            CATEGORY_ROUTER = CategoryRouter.build(CLIENT)
+            startup_timings["yönlendirici"] = time.time() - step_start
+        step_start = time.time()
+        MODEL = model if model is not None else genai.GenerativeModel(GENERATION_MODEL)
+        EMBED_CONTENT = embed_content if embed_content is not None else genai.embed_content
+        if SESSION_BACKEND == "memory":
+            session_backend = InMemorySessionBackend()
+        else:
+            DB_FIRESTORE = firestore.Client()
+            session_backend = FirestoreSessionBackend(DB_FIRESTORE)
+        SESSION_STORE = SessionStore(session_backend, resolve_products=resolve_product_references,
+                                     max_turns=MAX_HISTORY_TURNS,
+                                     cache_size=SESSION_CACHE_SIZE if SESSION_CACHE_ENABLED else 0,
+                                     cache_ttl=SESSION_CACHE_TTL, flush_interval=SESSION_FLUSH_INTERVAL)
+        EMBEDDING_CACHE = EmbeddingCache(EMBEDDING_MODEL, max_size=EMBEDDING_CACHE_SIZE,
+                                         ttl_seconds=EMBEDDING_CACHE_TTL, disk_path=EMBEDDING_CACHE_PATH,
+                                         disk_ttl_seconds=EMBEDDING_CACHE_DISK_TTL,
+                                         disk_max_rows=EMBEDDING_CACHE_DISK_MAX_ROWS)
+        SEARCH_CACHE = CoalescingCache(max_size=SEARCH_CACHE_SIZE, ttl_seconds=SEARCH_CACHE_TTL) \
+            if SEARCH_COALESCING_ENABLED else None
+        ANSWER_CACHE = SemanticAnswerCache(similarity_threshold=ANSWER_CACHE_SIMILARITY,
+                                           max_products=ANSWER_CACHE_SIZE,
+                                           ttl_seconds=ANSWER_CACHE_TTL) if ANSWER_CACHE_ENABLED else None
+        startup_timings["istemciler"] = time.time() - step_start
+        _log_startup_timings("Servisler başarıyla başlatıldı.", startup_timings, start_time)
     except Exception as e:
         print(f"HATA: Servisler başlatılamadı: {e}");
         sys.exit(1)
 
 
+def initialize_services():
+    """API ve Veritabanı istemcilerini başlatır."""
+    print(">>> Servisler başlatılıyor... <<<")
+    initialize_shared_state()
+    initialize_process_clients()
+
+
+def collect_service_stats():
+    """Önbellek ve oturum deposu sayaçlarını /metrics için toplar."""
+    stats = {}
+    if EMBEDDING_CACHE is not None:
+        stats.update({f"embedding_cache_{name}": value for name, value in EMBEDDING_CACHE.stats().items()})
+    if SESSION_STORE is not None:
+        stats.update({f"session_store_{name}": value for name, value in SESSION_STORE.stats().items()})
+    if SEARCH_CACHE is not None:
+        stats.update({f"search_cache_{name}": value for name, value in SEARCH_CACHE.stats().items()})
+    if ANSWER_CACHE is not None:
+        stats.update({f"answer_cache_{name}": value for name, value in ANSWER_CACHE.stats().items()})
+    return stats
+
+
+METRICS.register_collector(collect_service_stats)
+
+
 def get_conversation_history(session_id):
     try:
-        doc = DB_FIRESTORE.collection('conversations').document(session_id).get()
-        return doc.to_dict().get('history', []) if doc.exists else []
+        with span("history"):
+            return SESSION_STORE.get_history(session_id)
     except Exception as e:
         print(f"HATA: Konuşma geçmişi alınamadı: {e}");
         return []
 
 
-def save_conversation_history(session_id, history):
+def save_conversation_turn(session_id, turn):
+    """Turu geçmişe ekler; Firestore'a yazma arka planda yapılır."""
     try:
-        DB_FIRESTORE.collection('conversations').document(session_id).set({'history': history})
+        SESSION_STORE.append_turn(session_id, turn)
     except Exception as e:
         print(f"HATA: Konuşma geçmişi kaydedilemedi: {e}")
 
 
-def parse_turkish_price(price_str):
-    if not isinstance(price_str, str): return float(price_str)
-    try:
-        return float(price_str.replace('.', '').replace(',', '.'))
-    except (ValueError, TypeError):
-        return 0.0
-
-
-def convert_words_to_numbers(text):
-    text = re.sub(r'(\d[\d\.,]*)\s*(?:bin|k)\b', lambda m: str(int(parse_turkish_price(m.group(1)) * 1000)), text,
-                  flags=re.IGNORECASE)
-    text = re.sub(r'(\d[\d\.,]*)\s*milyon\b', lambda m: str(int(parse_turkish_price(m.group(1)) * 1000000)), text,
-                  flags=re.IGNORECASE)
-    return text
+def resolve_product_references(references):
+    """Geçmişte kimliğiyle saklanan ürünlerin güncel bağlamlarını veritabanından getirir."""
+    resolved = {}
+    by_collection = {}
+    for reference in references:
+        by_collection.setdefault(reference["collection"], set()).add(reference["product_id"])
+    for collection_name, product_ids in by_collection.items():
+        try:
+            result = get_collection(CLIENT, collection_name).get(ids=list(product_ids), include=['metadatas'])
+        except Exception as e:
+            print(f"HATA: Geçmişteki ürünler alınamadı ({collection_name}): {e}")
+            continue
+        for product in to_product_contexts(result['ids'], result['metadatas'], collection_name):
+            resolved[(collection_name, product['product_id'])] = hydrate_product(product)
+    return [resolved.get((r["collection"], r["product_id"])) for r in references]
 
 
 def extract_query_details(query_text):
-    processed_query = convert_words_to_numbers(query_text)
-    lower_query = processed_query.lower()
-    target_collection, found_category, search_text = None, None, processed_query
-    for category in ALL_CATEGORIES:
-        category_lower = category.strip().lower()
-        if category_lower in lower_query:
-            found_category, target_collection = category, sanitize_collection_name(category)
-            break
-    search_type = SEARCH_TYPE_DEFAULT
-    if 'fiyat performans' in lower_query or 'f/p' in lower_query:
-        search_type = SEARCH_TYPE_FP
-    elif 'daha ucuz' in lower_query or 'en ucuz' in lower_query:
-        search_type = SEARCH_TYPE_CHEAPEST
-    elif 'daha pahalı' in lower_query or 'en pahalı' in lower_query:
-        search_type = SEARCH_TYPE_EXPENSIVE
+    match = QUERY_MATCHER.match(query_text)
+    found_category = match["category"]
+    target_collection = sanitize_collection_name(found_category) if found_category else None
+    search_text = match["processed_text"]
+    search_type = match["search_type"] or SEARCH_TYPE_DEFAULT
     where_filter = {}
-    try:
-        prices_str = re.findall(r'(\d[\d\.,]*)', processed_query)
-        prices = sorted([p for p in (parse_turkish_price(s) for s in prices_str) if p > 10])
-        if len(prices) >= 2:
-            where_filter = {"$and": [{"min_price": {"$gte": prices[0]}}, {"min_price": {"$lte": prices[1]}}]}
-        elif len(prices) == 1:
-            price_val = prices[0]
-            where_filter = {"$and": [{"min_price": {"$gte": price_val * (1 - PRICE_RANGE_MULTIPLIER)}},
-                                     {"min_price": {"$lte": price_val * (1 + PRICE_RANGE_MULTIPLIER)}}]}
-    except Exception:
-        pass
+    prices = sorted(p for p in match["prices"] if p > 10)
+    if len(prices) >= 2:
+        where_filter = {"$and": [{"min_price": {"$gte": prices[0]}}, {"min_price": {"$lte": prices[1]}}]}
+    elif len(prices) == 1:
+        price_val = prices[0]
+        where_filter = {"$and": [{"min_price": {"$gte": price_val * (1 - PRICE_RANGE_MULTIPLIER)}},
+                                 {"min_price": {"$lte": price_val * (1 + PRICE_RANGE_MULTIPLIER)}}]}
     return {"collection": target_collection, "where_filter": where_filter, "search_text": search_text.strip(),
             "search_type": search_type}
 
 
+def embed_query(search_text):
+    """Sorgu metninin vektörünü önbellekten, yoksa Gemini'den getirir."""
+
+    def compute_embedding():
+        result = EMBED_CONTENT(model=EMBEDDING_MODEL, content=[search_text], task_type="RETRIEVAL_QUERY")
+        return result['embedding'][0]
+
+    with span("embed"):
+        if EMBEDDING_CACHE is None: return compute_embedding()
+        return EMBEDDING_CACHE.get_or_compute(search_text, compute_embedding)
+
+
+def embed_queries(search_texts):
+    """
+    Birden çok sorgu metninin vektörlerini sırayla döndürür. Önbellekte olmayan farklı metinler
+    EMBED_BATCH_SIZE'lık (Gemini'nin istek başına sınırı) toplu embed_content istekleriyle vektörleştirilir.
+    """
+
+    def compute_embeddings(texts):
+        vectors = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            result = EMBED_CONTENT(model=EMBEDDING_MODEL, content=texts[i:i + EMBED_BATCH_SIZE],
+                                   task_type="RETRIEVAL_QUERY")
+            vectors.extend(result['embedding'])
+        return vectors
+
+    with span("embed"):
+        if EMBEDDING_CACHE is not None: return EMBEDDING_CACHE.get_or_compute_many(search_texts, compute_embeddings)
+        unique_texts = list(dict.fromkeys(search_texts))
+        vectors = dict(zip(unique_texts, compute_embeddings(unique_texts)))
+        return [vectors[text] for text in search_texts]
+
+
+def to_product_contexts(ids, metadatas, collection_name):
+    """Chroma sonuçlarını, kimliği ve koleksiyonu da içeren ürün bağlamlarına çevirir."""
+    return [dict(metadata, product_id=product_id, collection=collection_name)
+            for product_id, metadata in zip(ids, metadatas)]
+
+
+def hydrate_product(product_context):
+    """Seçilen ürünün ağır alanlarını (özellikler, teklifler) belge deposundan ekler."""
+    if DOCUMENT_STORE is None or product_context is None: return product_context
+    with span("documents"):
+        return DOCUMENT_STORE.hydrate(product_context)
+
+
+def query_price_candidates(collection, query_embedding, query_details):
+    """
+    Fiyat odaklı aramalarda adayları fiyat indeksinden seçer: fiyat aralığı ikili arama ile,
+    en ucuz / en pahalı / en iyi F/P ilk SPECIAL_N_RESULTS ürün vektörel olarak bulunur.
+    Yalnızca fiyat aralığı verilmiş aramalarda adaylar, aralıktaki ürünler arasından nicemlenmiş
+    vektör katmanıyla (varsa) yaklaşık en yakın olanlardır.
+    Vektör araması yalnızca bu adaylar arasında alaka düzeyine göre kesin sıralama yapar.
+    Dönüş: (ürünler, uzaklıklar); indeks bu sorgu için kullanılamıyorsa None döner.
+    """
+    index = PRICE_INDEX.get(collection.name) if PRICE_INDEX else None
+    bounds = price_bounds_from_where(query_details["where_filter"])
+    if index is None or bounds is None: return None
+    start, end = index.price_slice(*bounds)
+    if query_details['search_type'] == SEARCH_TYPE_DEFAULT:
+        if index.vectors is None or not VECTOR_TIER_ENABLED: return None
+        with span("vector_coarse"):
+            candidate_ids = index.nearest_ids(query_embedding[0], start, end,
+                                              DEFAULT_N_RESULTS * VECTOR_TIER_RERANK_FACTOR)
+    else:
+        candidate_ids = index.top_ids(query_details['search_type'], start, end, SPECIAL_N_RESULTS)
+    if not candidate_ids: return [], []
+    with span("vector_query"):
+        results = collection.query(query_embeddings=query_embedding, ids=candidate_ids,
+                                   n_results=min(DEFAULT_N_RESULTS, len(candidate_ids)),
+                                   include=['metadatas', 'distances'])
+    if not results or not results.get('metadatas'): return [], []
+    return to_product_contexts(results['ids'][0], results['metadatas'][0], collection.name), results['distances'][0]
+
+
+def uses_price_candidates(query_details):
+    return query_details['search_type'] != SEARCH_TYPE_DEFAULT or bool(query_details["where_filter"])
+
+
+def plain_query_parameters(query_details):
+    """Fiyat indeksi kullanılamadığında collection.query için (sonuç sayısı, where filtresi)."""
+    n_results = SPECIAL_N_RESULTS if query_details['search_type'] != SEARCH_TYPE_DEFAULT else DEFAULT_N_RESULTS
+    return n_results, query_details["where_filter"] or None
+
+
+def search_collection(collection, query_embedding, query_details):
+    """Tek bir koleksiyondaki adayları alaka sırasıyla döndürür: (ürünler, uzaklıklar)."""
+    if uses_price_candidates(query_details):
+        candidates = query_price_candidates(collection, query_embedding, query_details)
+        if candidates is not None: return candidates
+    n_results, where_filter = plain_query_parameters(query_details)
+    with span("vector_query"):
+        results = collection.query(query_embeddings=query_embedding, n_results=n_results,
+                                   where=where_filter, include=['metadatas', 'distances'])
+    if not results or not results.get('metadatas'): return [], []
+    return to_product_contexts(results['ids'][0], results['metadatas'][0], collection.name), results['distances'][0]
+
+
+def route_collections(query_vector):
+    """Kategorisiz sorgu için aranacak koleksiyonlar; sorgu hiçbir koleksiyona yeterince benzemiyorsa None."""
+    with span("route"):
+        routes = CATEGORY_ROUTER.route(query_vector, ROUTER_TOP_K)
+    if not routes or routes[0][1] < ROUTER_MIN_SCORE: return None
+    return [name for name, _ in routes]
+
+
+def merge_routed_results(results, search_type):
+    """
+    Yönlendirilen koleksiyonların (ürünler, uzaklıklar) sonuçlarını uzaklığa göre birleştirir. Fiyat odaklı
+    aramalarda fiyat karşılaştırması farklı kategoriler arasında anlamsız olduğundan yalnızca en yakın
+    ürünün koleksiyonundaki adaylar tutulur.
+    """
+    merged = sorted(((distance, product) for products, distances in results
+                     for product, distance in zip(products, distances)), key=lambda item: item[0])
+    candidates = [product for _, product in merged]
+    if candidates and search_type != SEARCH_TYPE_DEFAULT:
+        candidates = [p for p in candidates if p['collection'] == candidates[0]['collection']]
+    return candidates
+
+
+def search_routed_collections(client, query_embedding, query_details):
+    """
+    Kategorisi belirtilmemiş sorgular: yönlendiricinin seçtiği en yakın ROUTER_TOP_K koleksiyonda
+    paralel arama yapılır ve sonuçlar uzaklığa göre birleştirilir (bkz. merge_routed_results).
+    Sorgu hiçbir koleksiyona yeterince benzemiyorsa None döner. Bir koleksiyondaki hata çağırana iletilir;
+    eksik adaylarla verilen "bulunamadı" cevabı arama önbelleğine girmez.
+    """
+    collection_names = route_collections(query_embedding[0])
+    if collection_names is None: return None
+
+    def search(collection_name):
+        try:
+            return search_collection(get_collection(client, collection_name), query_embedding, query_details)
+        except Exception as e:
+            print(f"HATA: Yönlendirilen koleksiyonda arama yapılamadı ({collection_name}): {e}")
+            raise
+
+    with span("vector_query"):
+        results = list(SEARCH_EXECUTOR.map(search, collection_names))
+    return merge_routed_results(results, query_details['search_type'])
+
+
+def get_collection(client, collection_name):
+    """Koleksiyon tanıtıcısını önbellekten döndürür; önbellekte yoksa ChromaDB'den alıp saklar."""
+    collection = COLLECTION_HANDLES.get(collection_name)
+    if collection is None:
+        collection = COLLECTION_HANDLES[collection_name] = client.get_collection(name=collection_name)
+    return collection
+
+
+def search_cache_key(query_details):
+    return (query_details["collection"], query_details["search_text"],
+            json.dumps(query_details["where_filter"], sort_keys=True), query_details["search_type"])
+
+
+def rank_candidates(candidates, search_type):
+    """
+    Adayları arama türüne göre sıralar; ilk ürün en uygun olandır. Fiyat odaklı türlerde fiyatı
+    olmayan ürünler elenir (F/P: özellik uzunluğu / fiyat, en ucuz / en pahalı: fiyat).
+    Dönüş: (sıralı ürünler, durum).
+    """
+    if not candidates:
+        return [], "Bu kriterlere uygun ürün bulunamadı."
+    if search_type == SEARCH_TYPE_FP:
+        ranked = sorted((p for p in candidates if p.get('min_price', 0) > 0),
+                        key=lambda p: features_length(p) / p['min_price'], reverse=True)
+        return ranked, "Başarılı" if ranked else "F/P için uygun ürün yok."
+    elif search_type in [SEARCH_TYPE_CHEAPEST, SEARCH_TYPE_EXPENSIVE]:
+        ranked = sorted((p for p in candidates if p.get('min_price', 0) > 0), key=lambda p: p['min_price'],
+                        reverse=(search_type == SEARCH_TYPE_EXPENSIVE))
+        return ranked, "Başarılı" if ranked else "Fiyat bilgisi olan ürün bulunamadı."
+    else:
+        return list(candidates), "Başarılı"
+
+
+def find_best_product(client, query_details, category_required_message):
+    """Arama türüne göre en uygun ürünü bulur: (ürün, durum). Hataları çağırana iletir."""
+    query_embedding = [embed_query(query_details["search_text"])]
+    if query_details["collection"]:
+        candidates, _ = search_collection(get_collection(client, query_details["collection"]), query_embedding,
+                                          query_details)
+    else:
+        candidates = search_routed_collections(client, query_embedding, query_details)
+        if candidates is None: return None, category_required_message
+    ranked, status = rank_candidates(candidates, query_details['search_type'])
+    return (hydrate_product(ranked[0]) if ranked else None), status
+
+
 def get_best_product_match(client, query_details):
-    collection_name = query_details["collection"]
-    if not collection_name: return None, "Lütfen sorgunuzda bir ürün kategorisi belirtin."
+    """
+    En uygun ürünü bulur. Özdeş eşzamanlı aramalar SEARCH_CACHE ile tek aramada birleştirilir ve
+    sonuç kısa süre saklanır; her istek ürün bağlamının kendi kopyasını alır.
+    """
+    if not query_details["collection"] and not CATEGORY_ROUTER: return None, CATEGORY_REQUIRED_MESSAGE
     try:
-        collection = client.get_collection(name=collection_name)
-        n_results = SPECIAL_N_RESULTS if query_details['search_type'] != SEARCH_TYPE_DEFAULT else DEFAULT_N_RESULTS
-        result = genai.embed_content(model=EMBEDDING_MODEL, content=[query_details["search_text"]],
-                                     task_type="RETRIEVAL_QUERY")
-        query_embedding = result['embedding']
-        results = collection.query(query_embeddings=query_embedding, n_results=n_results,
-                                   where=query_details["where_filter"] or None)
-        if not results or not results.get('metadatas') or not results['metadatas'][0]:
-            return None, "Bu kriterlere uygun ürün bulunamadı."
-        candidates = results['metadatas'][0]
-        search_type = query_details['search_type']
-        if search_type == SEARCH_TYPE_FP:
-            best_product = max((p for p in candidates if p.get('min_price', 0) > 0),
-                               key=lambda p: len(p.get('features', '')) / p['min_price'], default=None)
-            return (best_product, "Başarılı") if best_product else (None, "F/P için uygun ürün yok.")
-        elif search_type in [SEARCH_TYPE_CHEAPEST, SEARCH_TYPE_EXPENSIVE]:
-            valid_products = [p for p in candidates if p.get('min_price', 0) > 0]
-            if not valid_products: return None, "Fiyat bilgisi olan ürün bulunamadı."
-            return (
-                sorted(valid_products, key=lambda p: p['min_price'], reverse=(search_type == SEARCH_TYPE_EXPENSIVE))[0],
-                "Başarılı")
-        else:
-            return candidates[0], "Başarılı"
+        if SEARCH_CACHE is None:
+            return find_best_product(client, query_details, CATEGORY_REQUIRED_MESSAGE)
+        product, status = SEARCH_CACHE.get_or_compute(
+            search_cache_key(query_details),
+            lambda: find_best_product(client, query_details, CATEGORY_REQUIRED_MESSAGE))
+        return (dict(product) if product else product), status
     except Exception as e:
         print(f"HATA: Ürün arama sırasında bir sorun oluştu: {e}")
-        return None, "Arama sırasında beklenmedik bir sorun oluştu."
+        return None, SEARCH_ERROR_MESSAGE
+
+
+# --- MODELSİZ ARAMA (/search, /search/batch) ---
+
+def search_collections_grouped(client, tasks):
+    """
+    tasks: [(koleksiyon adı, sorgu vektörü, sorgu ayrıntıları)]. Fiyat indeksiyle yanıtlanabilen aramalar
+    tek tek yapılır; diğerleri aynı koleksiyon, sonuç sayısı ve filtreyi paylaşanlar için tek bir çok
+    vektörlü collection.query ile. Dönüş: her görev için (ürünler, uzaklıklar); başarısız olanlar None.
+    """
+    results = [None] * len(tasks)
+    groups = {}
+    for i, (collection_name, query_vector, query_details) in enumerate(tasks):
+        if uses_price_candidates(query_details):
+            try:
+                results[i] = query_price_candidates(get_collection(client, collection_name), [query_vector],
+                                                    query_details)
+            except Exception as e:
+                print(f"HATA: Fiyat indeksiyle arama yapılamadı ({collection_name}): {e}")
+                continue
+            if results[i] is not None: continue
+        n_results, where_filter = plain_query_parameters(query_details)
+        groups.setdefault((collection_name, n_results, json.dumps(where_filter, sort_keys=True)), []).append(i)
+
+    def search_group(group):
+        (collection_name, n_results, _), indices = group
+        try:
+            response = get_collection(client, collection_name).query(
+                query_embeddings=[tasks[i][1] for i in indices], n_results=n_results,
+                where=plain_query_parameters(tasks[indices[0]][2])[1], include=['metadatas', 'distances'])
+        except Exception as e:
+            print(f"HATA: Toplu koleksiyon sorgusu yapılamadı ({collection_name}, {len(indices)} sorgu): {e}")
+            return
+        for row, i in enumerate(indices):
+            results[i] = (to_product_contexts(response['ids'][row], response['metadatas'][row], collection_name),
+                          response['distances'][row])
+
+    with span("vector_query"):
+        list(BATCH_SEARCH_EXECUTOR.map(search_group, groups.items()))
+    return results
+
+
+def search_products(client, queries, limit=SEARCH_RESULT_LIMIT):
+    """
+    Her sorgu için /chat'in seçeceği ürünle başlayan, en fazla limit ürünlük sıralı listeyi modeli
+    çağırmadan döndürür. Önbellekte olmayan sorgu metinleri toplu olarak vektörleştirilir ve koleksiyon
+    aramaları koleksiyona göre gruplanır. Dönüş: her sorgu için {"query", "status", "products"}.
+    """
+    with span("parse"):
+        details = [extract_query_details(query) for query in queries]
+    set_search_type(details[0]["search_type"] if len(details) == 1 else BATCH_SEARCH_TYPE)
+    outcomes = [([], CATEGORY_REQUIRED_MESSAGE)] * len(queries)
+    searchable = [i for i, d in enumerate(details) if d["collection"] or CATEGORY_ROUTER]
+    try:
+        vectors = embed_queries([details[i]["search_text"] for i in searchable]) if searchable else []
+    except Exception as e:
+        print(f"HATA: Toplu arama için sorgu vektörleri alınamadı: {e}")
+        # Yalnızca vektörleştirmeye gönderilen sorgular başarısız olur; diğerleri kendi durumunu korur
+        for i in searchable:
+            outcomes[i] = ([], SEARCH_ERROR_MESSAGE)
+        vectors, searchable = [], []
+
+    tasks, owners = [], []
+    for i, query_vector in zip(searchable, vectors):
+        collection_names = [details[i]["collection"]] if details[i]["collection"] else route_collections(query_vector)
+        for collection_name in collection_names or []:
+            tasks.append((collection_name, query_vector, details[i]))
+            owners.append(i)
+    results_by_query = {}
+    for i, result in zip(owners, search_collections_grouped(client, tasks)):
+        results_by_query.setdefault(i, []).append(result)
+
+    for i, results in results_by_query.items():
+        if all(result is None for result in results):
+            outcomes[i] = ([], SEARCH_ERROR_MESSAGE)
+            continue
+        results = [result or ([], []) for result in results]
+        search_type = details[i]["search_type"]
+        candidates = results[0][0] if details[i]["collection"] else merge_routed_results(results, search_type)
+        ranked, status = rank_candidates(candidates, search_type)
+        outcomes[i] = ([hydrate_product(product) for product in ranked[:limit]], status)
+    return [{"query": query, "status": status, "products": products}
+            for query, (products, status) in zip(queries, outcomes)]
+
+
+def parse_search_request(data, batch):
+    """
+    /search ({"query", "limit"}) veya /search/batch ({"queries", "limit"}) gövdesini doğrular.
+    Dönüş: (sorgular, limit) veya geçersizse (None, hata mesajı).
+    """
+    if not isinstance(data, dict): return None, "Geçersiz istek"
+    queries = data.get('queries') if batch else [data.get('query')]
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return None, "Geçersiz istek"
+    if len(queries) > SEARCH_BATCH_MAX_QUERIES:
+        return None, f"Bir istekte en fazla {SEARCH_BATCH_MAX_QUERIES} sorgu gönderilebilir."
+    limit = data.get('limit', SEARCH_RESULT_LIMIT)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= SEARCH_MAX_RESULT_LIMIT:
+        return None, f"limit 1 ile {SEARCH_MAX_RESULT_LIMIT} arasında bir tam sayı olmalı."
+    return (queries, limit), None
+
+
+def run_search(queries, limit, batch, trace=NULL_TRACE):
+    """Aramayı istek izi altında çalıştırır; /search için tek sonuç, /search/batch için liste döner."""
+    with activate(trace):
+        results = search_products(CLIENT, queries, limit)
+    trace.finish("ok" if batch or results[0]["products"] else "not_found")
+    return {"results": results} if batch else results[0]
 
 
 def generate_final_prompt(user_question, product_context, history):
-    urun_adi = product_context.get('product_name', 'N/A')
-    urun_linki = product_context.get('product_url', 'N/A')
-    urun_ozellikleri = product_context.get('features', 'Mevcut değil.')
-    try:
-        offers = json.loads(product_context.get('offers_json', '[]'))
-    except (json.JSONDecodeError, TypeError):
-        offers = []
-    satici_bilgisi_listesi, en_ucuz_satici_linki = [], urun_linki
-    valid_offers = sorted([o for o in offers if o.get('price') is not None and o.get('price') > 0],
-                          key=lambda x: x['price'])
-    if valid_offers:
-        en_ucuz_satici_linki = valid_offers[0].get('offer_url', urun_linki)
-        for offer in valid_offers: satici_bilgisi_listesi.append(
-            f"- {offer.get('seller_name', 'N/A')}: {offer.get('price', 'N/A')} TL")
-    satici_bilgisi = "\n".join(satici_bilgisi_listesi) or "Online satıcı bilgisi bulunamadı."
-    history_text = "\n".join([f"Kullanıcı: {h['user']}\nAsistan: {h['assistant']}" for h in history])
-
-    return f"""GÖREV: Akıllı Satış Asistanı
-[ROL TANIMLAMA (PERSONA)]
-Sen, son derece bilgili, ikna edici, güvenilir ve proaktif bir "Akıllı Satış Asistanı"sın. Amacın, müşterilere sunduğun ürün hakkında en doğru bilgiyi vererek onları satın almaya teşvik etmek ve tüm sorularını profesyonel bir dille yanıtlamaktır.
-
-[BAĞLAM (CONTEXT)]
-1. Konuşma Geçmişi
-Önceki diyalogları anlamak için bu bölümü dikkatle incele.
-<konuşma_geçmişi>
-{history_text}
-</konuşma_geçmişi>
-
-2. Sağlanan Ürün Bilgileri (Bilgi Kaynağı - RAG)
-Yanıtlarını oluştururken temel alacağın tek ve yegane bilgi kaynağı burasıdır.
-<ürün_bilgileri>
-Ürün Adı: {urun_adi}
-Ürün Özellikleri: {urun_ozellikleri}
-Fiyat Bilgileri ve Satıcılar:
-{satici_bilgisi}
-En Uygun Fiyatlı Satıcı Linki: {en_ucuz_satici_linki}
-</ürün_bilgileri>
-
-[TALİMATLAR VE SÜREÇ (ADIM ADIM DÜŞÜNME)]
-Müşterinin sorusuna yanıt vermeden önce aşağıdaki adımları sırasıyla takip et:
-Adım 1: Analiz Et
-Müşterinin son sorusunun ({user_question}) ne anlama geldiğini ve neyi amaçladığını anla.
-Konuşma geçmişindeki ({history_text}) önceki konularla bağlantısını kur.
-Soruyu yanıtlamak için hangi bilgilere ihtiyacın olduğunu belirle.
-Adım 2: Bilgiyi Değerlendir
-İhtiyaç duyduğun bilgilerin <ürün_bilgileri> kaynağında olup olmadığını kontrol et.
-Eğer Bilgi Yeterliyse: Yanıtını sadece ve sadece <ürün_bilgileri> bölümündeki verileri kullanarak oluştur. KESİNLİKLE dışarıdan bilgi ekleme veya varsayımda bulunma.
-Eğer Bilgi Yetersizse: Müşteriye, aradığı bilginin mevcut belgelerde olmadığını belirt. Araştırmaya başlamak için ilk olarak en uygun fiyatlı satıcının linkini ({en_ucuz_satici_linki}) kullan. Ardından, "Sizin için hızlıca bir araştırma yaptım ve şunları buldum:" diyerek bulduğun en alakalı ve güvenilir bilgileri özetleyerek sun.
-Adım 3: Yanıtı Oluştur ve Sun
-Ton ve Üslup: İkna edici, samimi, profesyonel ve yardımsever bir dil kullan. Karmaşık teknik detayları herkesin anlayabileceği şekilde basitleştir.
-İçerik: Müşterinin sorusunu doğrudan yanıtla. Cevabında, ürünün özelliklerinin müşteriye sağlayacağı faydaları vurgula. Fiyat karşılaştırması yaparken en uygun seçeneği ve linkini öne çıkar.
-
-[YENİ KULLANICI SORUSU]
-{user_question}"""
+    """Token bütçesine uygun prompt'u ve boyut istatistiklerini döndürür: (prompt, istatistikler)."""
+    return PROMPT_BUILDER.build(user_question, product_context, history)
 
 
-# --- API ENDPOINT ---
-@app.route('/chat', methods=['POST'])
-def chat_handler():
-    data = request.get_json()
-    if not data or 'query' not in data or 'session_id' not in data:
-        return Response(json.dumps({"error": "Geçersiz istek"}), status=400, mimetype='application/json')
+# --- AKIŞ PROTOKOLÜ (AI SDK v3/v4 UYUMLU) ---
+# '0:' ürün bilgisi (JSON), '1:' model metni (JSON olarak encode edilmiş), '2:' hata.
+# mimetype 'text/plain' olmalı, AI SDK bunu bekler.
+STREAM_MIMETYPE = 'text/plain; charset=utf-8'
+MODEL_ERROR_LINE = '2:{ "error": "Modelden cevap alınırken bir sorun oluştu." }\n'
+ANSWER_CACHE_HIT_HEADERS = {'X-Answer-Cache': 'hit'}
 
-    user_question = data['query']
-    session_id = data['session_id']
-    history = get_conversation_history(session_id)
-    query_details = extract_query_details(user_question)
+
+def format_data_line(product_context):
+    return f'0:{json.dumps(product_context)}\n'
+
+
+def format_text_line(text):
+    return f'1:{json.dumps(text)}\n'
+
+
+def format_not_found_line(status):
+    return f'2:{{ "error": "Üzgünüm, bu isteğe uygun bir ürün bulamadım. (Sebep: {status})" }}\n'
+
+
+def format_timing_line(trace):
+    """Akışın sonunda aşama sürelerini (ms) taşıyan kayıt; METRICS_STREAM_TRAILER açıkken gönderilir."""
+    return f'8:{json.dumps([{"server_timing": trace.timings_ms()}])}\n'
+
+
+def timing_headers(trace):
+    """Akış başlamadan önce ölçülen aşamalar için Server-Timing başlığı."""
+    value = trace.server_timing()
+    return {"Server-Timing": value, "Timing-Allow-Origin": "*"} if value else {}
+
+
+def prompt_headers(prompt_stats):
+    return {'X-Prompt-Tokens': str(prompt_stats['prompt_tokens']), 'X-Prompt-Chars': str(prompt_stats['prompt_chars'])}
+
+
+def find_product_for_question(user_question, history):
+    """Soruya uygun ürünü bulur; kategori belirtilmemişse geçmişteki son ürünü kullanır: (ürün, durum)."""
+    with span("parse"):
+        query_details = extract_query_details(user_question)
+    set_search_type(query_details["search_type"])
 
     if not query_details["collection"] and history:
         last_product_context = history[-1].get("product_context")
         if last_product_context:
             if query_details["search_type"] in [SEARCH_TYPE_CHEAPEST, SEARCH_TYPE_EXPENSIVE]:
-                query_details["collection"] = sanitize_collection_name(last_product_context.get("subcategory"))
+                query_details["collection"] = last_product_context.get("collection") or sanitize_collection_name(
+                    last_product_context.get("subcategory"))
                 query_details["search_text"] = f"{last_product_context.get('product_name', '')} {user_question}"
                 last_price = last_product_context.get("min_price", -1)
                 if last_price > 0:
                     query_details["where_filter"] = {"min_price": {"$lt": last_price}} if query_details[
                                                                                               "search_type"] == SEARCH_TYPE_CHEAPEST else {
                         "min_price": {"$gt": last_price}}
-                product_context, status = get_best_product_match(CLIENT, query_details)
-            else:
-                product_context, status = last_product_context, "Başarılı (Geçmişten)"
-        else:
-            product_context, status = get_best_product_match(CLIENT, query_details)
-    else:
-        product_context, status = get_best_product_match(CLIENT, query_details)
+                return get_best_product_match(CLIENT, query_details)
+            return last_product_context, "Başarılı (Geçmişten)"
+    return get_best_product_match(CLIENT, query_details)
+
+
+def answer_cache_version(product_context):
+    """Ürünün cevapları etkileyen, veritabanından gelen alanlarının (fiyat ve teklifler) özeti."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(product_context.get('min_price')).encode('utf-8'))
+    digest.update(str(product_context.get('offers_json', '')).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def lookup_cached_answer(user_question, product_context, history):
+    """
+    Cevap önbelleği açıksa ve konuşma geçmişi kısaysa soruya benzer bir sorunun saklanan cevabını arar.
+    Dönüş: {"key", "version", "question_vector", "answer"} (answer bulunamazsa None) veya önbellek
+    kullanılamıyorsa None.
+    """
+    if ANSWER_CACHE is None or len(history) > ANSWER_CACHE_MAX_HISTORY_TURNS: return None
+    if not product_context.get('product_id') or not product_context.get('collection'): return None
+    try:
+        question_vector = embed_query(user_question)
+    except Exception as e:
+        print(f"HATA: Cevap önbelleği için soru vektörü alınamadı: {e}")
+        return None
+    key = (product_context['collection'], product_context['product_id'])
+    version = answer_cache_version(product_context)
+    return {"key": key, "version": version, "question_vector": question_vector,
+            "answer": ANSWER_CACHE.get(key, version, question_vector)}
+
+
+def store_cached_answer(answer_cache, chunks):
+    """Modelin ürettiği cevabı, parçalarıyla birlikte önbelleğe yazar (yeniden oynatma için)."""
+    if answer_cache is not None and answer_cache["answer"] is None and chunks:
+        ANSWER_CACHE.put(answer_cache["key"], answer_cache["version"], answer_cache["question_vector"], chunks)
+
+
+def prepare_chat(user_question, session_id, trace=NULL_TRACE):
+    """
+    Model akışı başlamadan önceki tüm adımlar: geçmiş, ürün arama, cevap önbelleği ve prompt oluşturma.
+    Aşama süreleri verilen istek izine (trace) yazılır.
+    Dönüş: (ürün, durum, prompt, prompt_istatistikleri, cevap_önbelleği); ürün bulunamazsa son üçü None.
+    Önbellekte cevap varsa (cevap_önbelleği["answer"]) prompt oluşturulmaz; prompt ve istatistikleri None.
+    """
+    with activate(trace):
+        history = get_conversation_history(session_id)
+        product_context, status = find_product_for_question(user_question, history)
+        if not product_context:
+            return None, status, None, None, None
+        answer_cache = lookup_cached_answer(user_question, product_context, history)
+        if answer_cache is not None and answer_cache["answer"] is not None:
+            return product_context, status, None, None, answer_cache
+        with span("prompt"):
+            final_prompt, prompt_stats = generate_final_prompt(user_question, product_context, history)
+    print(f"Prompt: {prompt_stats['prompt_tokens']} token (~{prompt_stats['prompt_chars']} karakter), "
+          f"geçmiş {prompt_stats['history_turns']} tam / {prompt_stats['compressed_turns']} özet / "
+          f"{prompt_stats['dropped_turns']} atılan tur, ürün bloğu önbellekten: {prompt_stats['product_block_cached']}")
+    return product_context, status, final_prompt, prompt_stats, answer_cache
+
+
+def response_headers(prompt_stats, trace):
+    """Akış yanıtının başlıkları; cevap önbellekten geliyorsa prompt başlıkları yerine X-Answer-Cache."""
+    return {**(prompt_headers(prompt_stats) if prompt_stats else ANSWER_CACHE_HIT_HEADERS), **timing_headers(trace)}
+
+
+# --- API ENDPOINT ---
+@app.route('/chat', methods=['POST'])
+def chat_handler():
+    data = request.get_json()
+    if not data or 'query' not in data or 'session_id' not in data:
+        return Response(json.dumps({"error": "Geçersiz istek"}), status=400, mimetype='application/json')
+
+    user_question = data['query']
+    session_id = data['session_id']
+    trace = METRICS.start_trace()
+    product_context, status, final_prompt, prompt_stats, answer_cache = prepare_chat(user_question, session_id,
+                                                                                      trace)
 
     if not product_context:
+        trace.finish("not_found")
+
         # Ürün bulunamadığında bile stream formatında cevap verelim
         def empty_stream():
-            yield f'2:{{ "error": "Üzgünüm, bu isteğe uygun bir ürün bulamadım. (Sebep: {status})" }}\n'
+            yield format_not_found_line(status)
 
-        return Response(stream_with_context(empty_stream()), mimetype="text/plain; charset=utf-8")
+        return Response(stream_with_context(empty_stream()), mimetype=STREAM_MIMETYPE, headers=timing_headers(trace))
 
-    final_prompt = generate_final_prompt(user_question, product_context, history)
+    headers = response_headers(prompt_stats, trace)
+    cached_chunks = answer_cache["answer"] if answer_cache else None
 
-    # STREAMING İÇİN YENİ YAPI (AI SDK v3/v4 UYUMLU)
     def stream_response():
+        outcome = "error"
         try:
             # 1. Önce ürün bilgisini (data) gönder.
-            # AI SDK formatı: '0:' prefix'i ile JSON verisi.
-            yield f'0:{json.dumps(product_context)}\n'
-
-            # 2. Sonra modelden gelen metin akışını gönder.
-            response_stream = MODEL.generate_content(final_prompt, stream=True)
-            full_response_text = ""
-            for chunk in response_stream:
-                if chunk.text:
-                    # AI SDK formatı: '1:' prefix'i ile metin verisi (JSON olarak encode edilmiş).
-                    full_response_text += chunk.text
-                    yield f'1:{json.dumps(chunk.text)}\n'
+            yield format_data_line(product_context)
+
+            # 2. Sonra metin akışını gönder: önbellekteki cevabı aynı parçalarla ya da modelin akışını.
+            if cached_chunks is not None:
+                chunks = cached_chunks
+                for text in chunks:
+                    yield format_text_line(text)
+            else:
+                generation_start = time.perf_counter()
+                response_stream = MODEL.generate_content(final_prompt, stream=True)
+                chunks = []
+                for chunk in response_stream:
+                    if chunk.text:
+                        if not chunks:
+                            trace.record("first_token", time.perf_counter() - generation_start)
+                        chunks.append(chunk.text)
+                        yield format_text_line(chunk.text)
+                trace.record("generation", time.perf_counter() - generation_start)
+                store_cached_answer(answer_cache, chunks)
 
             # 3. Konuşma geçmişini tam metinle kaydet
-            history.append({
-                "user": user_question,
-                "assistant": full_response_text,
-                "product_context": product_context
-            })
-            save_conversation_history(session_id, history)
+            with trace.span("history_save"):
+                save_conversation_turn(session_id, {
+                    "user": user_question,
+                    "assistant": "".join(chunks),
+                    "product_context": product_context
+                })
+            outcome = "cached" if cached_chunks is not None else "ok"
+            if METRICS_STREAM_TRAILER and METRICS.enabled:
+                yield format_timing_line(trace)
 
         except Exception as e:
             print(f"HATA: Stream sırasında bir sorun oluştu: {e}")
-            # AI SDK formatı: '2:' prefix'i ile hata JSON'u.
-            yield f'2:{{ "error": "Modelden cevap alınırken bir sorun oluştu." }}\n'
+            yield MODEL_ERROR_LINE
+        finally:
+            trace.finish(outcome)
+
+    return Response(stream_with_context(stream_response()), mimetype=STREAM_MIMETYPE, headers=headers)
+
+
+def search_response(batch):
+    request_args, error = parse_search_request(request.get_json(silent=True), batch)
+    if request_args is None:
+        return Response(json.dumps({"error": error}), status=400, mimetype='application/json')
+    trace = METRICS.start_trace(BATCH_SEARCH_ENDPOINT_LABEL if batch else SEARCH_ENDPOINT_LABEL)
+    payload = run_search(*request_args, batch, trace)
+    return Response(json.dumps(payload, ensure_ascii=False), mimetype='application/json', headers=timing_headers(trace))
+
+
+@app.route('/search', methods=['POST'])
+def search_handler():
+    """Sorgu için sıralı ürün bağlamları; model çağrılmaz."""
+    return search_response(batch=False)
+
+
+@app.route('/search/batch', methods=['POST'])
+def batch_search_handler():
+    """Birden çok sorgu için sıralı ürün bağlamları; vektörler toplu üretilir, aramalar gruplanır."""
+    return search_response(batch=True)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_handler():
+    """Prometheus biçiminde aşama süreleri, istek sayaçları ve önbellek istatistikleri."""
+    if not METRICS.enabled:
+        return Response(status=404)
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 
-    # mimetype 'text/plain' olmalı, AI SDK bunu bekler.
-    return Response(stream_with_context(stream_response()), mimetype='text/plain; charset=utf-8')
+@app.route('/debug/profile', methods=['GET'])
+def profile_handler():
+    """Örneklemeli profil: /debug/profile?seconds=10 (yalnızca PROFILER_ENABLED=1 iken)."""
+    if PROFILER is None:
+        return Response(status=404)
+    collapsed = PROFILER.profile(request.args.get('seconds', default=PROFILE_DEFAULT_SECONDS, type=float))
+    if collapsed is None:
+        return Response(json.dumps({"error": "Başka bir profil alınıyor."}), status=409, mimetype='application/json')
+    return Response(collapsed, mimetype='text/plain; charset=utf-8')
 
 
 # --- UYGULAMAYI BAŞLATMA ---
-initialize_services()
+if PROCESS_CLIENTS_MODE == "post_fork":
+    initialize_shared_state()
+elif PROCESS_CLIENTS_MODE != "manual":
+    initialize_services()
 
 if __name__ == "__main__":
     print(">>> __main__ bloğu çalıştırılıyor (YEREL GELİŞTİRME).")
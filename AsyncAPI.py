@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+import API
+
+# --- SABİTLER VE YAPILANDIRMA ---
+# Aynı anda işlenen en fazla /chat isteği (açık akışlar dahil)
+MAX_CONCURRENT_CHATS = int(os.environ.get("MAX_CONCURRENT_CHATS", 256))
+# Sırada bekleyebilecek en fazla istek; aşılırsa 503 ile geri çevrilir
+MAX_QUEUED_CHATS = int(os.environ.get("MAX_QUEUED_CHATS", 512))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get("QUEUE_TIMEOUT_SECONDS", 30))
+# Geçmiş, vektör ve Chroma gibi engelleyen çağrılar için iş parçacığı sayısı
+RETRIEVAL_THREADS = int(os.environ.get("RETRIEVAL_THREADS", 32))
+# Asenkron arayüzü olmayan modeller için akış tamponu (parça sayısı)
+MODEL_STREAM_BUFFER = 32
+
+RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="retrieval")
+MODEL_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CHATS, thread_name_prefix="model-stream")
+# API'nin koleksiyon arama havuzu gunicorn iş parçacıklarına göre boyutlanır; burada aramalar
+# RETRIEVAL_EXECUTOR'dan gelir. Eski havuz henüz iş parçacığı başlatmadığından değiştirilmesi güvenlidir.
+if not API.SEARCH_THREADS:
+    API.SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, API.ROUTER_TOP_K) * RETRIEVAL_THREADS,
+                                             thread_name_prefix="koleksiyon-arama")
+_STREAM_DONE = object()
+
+
+# --- EŞZAMANLILIK SINIRLAYICI ---
+
+class ConcurrencyLimiter:
+    """
+    Aktif istek sayısını sınırlar. Sınır doluyken istekler sıraya girer; sıra da doluysa
+    veya bekleme süresi aşılırsa istek reddedilir (geri basınç).
+    """
+
+    def __init__(self, max_active, max_waiting, timeout):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_active)
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def releaser(self):
+        """Yalnızca bir kez serbest bırakan fonksiyon döndürür (akış sonu ve arka plan görevi için)."""
+        released = False
+
+        def release_once():
+            nonlocal released
+            if not released:
+                released = True
+                self.release()
+
+        return release_once
+
+
+LIMITER = ConcurrencyLimiter(MAX_CONCURRENT_CHATS, MAX_QUEUED_CHATS, QUEUE_TIMEOUT_SECONDS)
+API.METRICS.register_collector(lambda: {"chat_limiter_active": LIMITER.active, "chat_limiter_waiting": LIMITER.waiting,
+                                        "chat_limiter_rejected": LIMITER.rejected})
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+async def iterate_model_text(final_prompt):
+    """Modelin ürettiği metin parçalarını asenkron olarak döndürür."""
+    generate_async = getattr(API.MODEL, 'generate_content_async', None)
+    if generate_async is not None:
+        response_stream = await generate_async(final_prompt, stream=True)
+        async for chunk in response_stream:
+            if chunk.text:
+                yield chunk.text
+        return
+
+    # Asenkron arayüzü olmayan modeller: akış ayrı bir iş parçacığında okunur, sınırlı bir kuyrukla aktarılır.
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=MODEL_STREAM_BUFFER)
+    stopped = False
+
+    def produce():
+        try:
+            for chunk in API.MODEL.generate_content(final_prompt, stream=True):
+                if stopped:
+                    return
+                if chunk.text:
+                    asyncio.run_coroutine_threadsafe(queue.put(chunk.text), loop).result()
+            item = _STREAM_DONE
+        except Exception as e:
+            item = e
+        if not stopped:
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    loop.run_in_executor(MODEL_EXECUTOR, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped = True
+        # Üretici dolu kuyrukta bekliyorsa serbest kalsın
+        while not queue.empty():
+            queue.get_nowait()
+
+
+def json_response(payload, status_code, headers=None):
+    return Response(json.dumps(payload), status_code=status_code, media_type='application/json', headers=headers)
+
+
+# --- API ENDPOINT ---
+
+async def chat_handler(request):
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        data = None
+    if not data or 'query' not in data or 'session_id' not in data:
+        return json_response({"error": "Geçersiz istek"}, 400)
+
+    if not await LIMITER.acquire():
+        return json_response({"error": "Sunucu şu anda çok yoğun, lütfen tekrar deneyin."}, 503,
+                             headers={"Retry-After": "1"})
+    release = LIMITER.releaser()
+
+    user_question = data['query']
+    session_id = data['session_id']
+    trace = API.METRICS.start_trace()
+    try:
+        loop = asyncio.get_running_loop()
+        product_context, status, final_prompt, prompt_stats, answer_cache = await loop.run_in_executor(
+            RETRIEVAL_EXECUTOR, API.prepare_chat, user_question, session_id, trace)
+    except BaseException:
+        release()
+        trace.finish("error")
+        raise
+
+    if not product_context:
+        release()
+        trace.finish("not_found")
+
+        async def empty_stream():
+            yield API.format_not_found_line(status)
+
+        return StreamingResponse(empty_stream(), media_type=API.STREAM_MIMETYPE, headers=API.timing_headers(trace))
+
+    headers = API.response_headers(prompt_stats, trace)
+    cached_chunks = answer_cache["answer"] if answer_cache else None
+
+    async def stream_response():
+        outcome = "error"
+        try:
+            yield API.format_data_line(product_context)
+            if cached_chunks is not None:
+                chunks = cached_chunks
+                for text in chunks:
+                    yield API.format_text_line(text)
+            else:
+                chunks = []
+                generation_start = time.perf_counter()
+                async for text in iterate_model_text(final_prompt):
+                    if not chunks:
+                        trace.record("first_token", time.perf_counter() - generation_start)
+                    chunks.append(text)
+                    yield API.format_text_line(text)
+                trace.record("generation", time.perf_counter() - generation_start)
+                API.store_cached_answer(answer_cache, chunks)
+            with trace.span("history_save"):
+                API.save_conversation_turn(session_id, {
+                    "user": user_question,
+                    "assistant": "".join(chunks),
+                    "product_context": product_context
+                })
+            outcome = "cached" if cached_chunks is not None else "ok"
+            if API.METRICS_STREAM_TRAILER and API.METRICS.enabled:
+                yield API.format_timing_line(trace)
+        except Exception as e:
+            print(f"HATA: Stream sırasında bir sorun oluştu: {e}")
+            yield API.MODEL_ERROR_LINE
+        finally:
+            release()
+            trace.finish(outcome)
+
+    return StreamingResponse(stream_response(), media_type=API.STREAM_MIMETYPE,
+                             headers=headers, background=BackgroundTask(release))
+
+
+async def search_response(request, batch):
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        data = None
+    request_args, error = API.parse_search_request(data, batch)
+    if request_args is None:
+        return json_response({"error": error}, 400)
+    trace = API.METRICS.start_trace(API.BATCH_SEARCH_ENDPOINT_LABEL if batch else API.SEARCH_ENDPOINT_LABEL)
+    payload = await asyncio.get_running_loop().run_in_executor(RETRIEVAL_EXECUTOR, API.run_search, *request_args,
+                                                               batch, trace)
+    return Response(json.dumps(payload, ensure_ascii=False), media_type='application/json',
+                    headers=API.timing_headers(trace))
+
+
+async def search_handler(request):
+    """Sorgu için sıralı ürün bağlamları; model çağrılmaz."""
+    return await search_response(request, batch=False)
+
+
+async def batch_search_handler(request):
+    """Birden çok sorgu için sıralı ürün bağlamları; vektörler toplu üretilir, aramalar gruplanır."""
+    return await search_response(request, batch=True)
+
+
+async def metrics_handler(request):
+    if not API.METRICS.enabled:
+        return Response(status_code=404)
+    return Response(API.METRICS.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+async def profile_handler(request):
+    """Örneklemeli profil: /debug/profile?seconds=10 (yalnızca PROFILER_ENABLED=1 iken)."""
+    if API.PROFILER is None:
+        return Response(status_code=404)
+    try:
+        seconds = float(request.query_params.get('seconds', API.PROFILE_DEFAULT_SECONDS))
+    except ValueError:
+        return json_response({"error": "Geçersiz süre"}, 400)
+    collapsed = await asyncio.get_running_loop().run_in_executor(None, API.PROFILER.profile, seconds)
+    if collapsed is None:
+        return json_response({"error": "Başka bir profil alınıyor."}, 409)
+    return Response(collapsed, media_type='text/plain; charset=utf-8')
+
+
+# --- UYGULAMA ---
+app = Starlette(
+    routes=[Route('/chat', chat_handler, methods=['POST']),
+            Route('/search', search_handler, methods=['POST']),
+            Route('/search/batch', batch_search_handler, methods=['POST']),
+            Route('/metrics', metrics_handler, methods=['GET']),
+            Route('/debug/profile', profile_handler, methods=['GET'])],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                           expose_headers=["X-Prompt-Tokens", "X-Prompt-Chars", "Server-Timing"])],
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print(">>> __main__ bloğu çalıştırılıyor (YEREL GELİŞTİRME, ASENKRON).")
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# --- AYARLAR ---
+# Belge deposunun veritabanı klasöründeki yeri
+DOCUMENT_STORE_DIRNAME = "urun_belgeleri"
+# ChromaDB meta verisinden ayrılıp belge deposunda tutulan alanlar
+DOCUMENT_FIELDS = ("product_name", "product_url", "features", "offers_json")
+# Meta veride kalan, özellik metninin uzunluğu (F/P puanı için)
+FEATURES_LENGTH_FIELD = "features_length"
+DOCUMENT_SUFFIXES = (".ids.npy", ".offsets.npy", ".data")
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def split_metadata(metadata):
+    """
+    Tam ürün meta verisini (indeks_meta_verisi, belge) olarak ikiye ayırır.
+    İndekste yalnızca filtrelenen ve sıralamada kullanılan küçük alanlar kalır.
+    """
+    index_metadata = {key: value for key, value in metadata.items() if key not in DOCUMENT_FIELDS}
+    index_metadata[FEATURES_LENGTH_FIELD] = len(metadata.get('features', ''))
+    document = {key: metadata[key] for key in DOCUMENT_FIELDS if key in metadata}
+    return index_metadata, document
+
+
+def features_length(product):
+    """Özellik metninin uzunluğu; eski düzendeki meta verilerde metnin kendisinden hesaplanır."""
+    length = product.get(FEATURES_LENGTH_FIELD)
+    return length if length is not None else len(product.get('features', ''))
+
+
+def _collection_paths(directory, collection_name):
+    return [os.path.join(directory, f"{collection_name}{suffix}") for suffix in DOCUMENT_SUFFIXES]
+
+
+def write_collection_documents(directory, collection_name, ids_list, documents):
+    """
+    Bir koleksiyonun belgelerini yazar: kimliğe göre sıralı kimlik dizisi, başlangıç konumları
+    ve art arda eklenmiş JSON kayıtlarından oluşan veri dosyası. Dosyalar önce geçici adlarla yazılır.
+    """
+    os.makedirs(directory, exist_ok=True)
+    order = sorted(range(len(ids_list)), key=lambda i: ids_list[i])
+    encoded = [json.dumps(documents[i], ensure_ascii=False).encode('utf-8') for i in order]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(record) for record in encoded], out=offsets[1:])
+    ids_path, offsets_path, data_path = _collection_paths(directory, collection_name)
+    with open(f"{ids_path}.tmp", 'wb') as f:
+        np.save(f, np.asarray([ids_list[i] for i in order], dtype=str))
+    with open(f"{offsets_path}.tmp", 'wb') as f:
+        np.save(f, offsets)
+    with open(f"{data_path}.tmp", 'wb') as f:
+        f.writelines(encoded)
+    for path in (data_path, offsets_path, ids_path):
+        os.replace(f"{path}.tmp", path)
+
+
+def remove_collection_documents(directory, collection_name):
+    for path in _collection_paths(directory, collection_name):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# --- BELGE DEPOSU ---
+
+class _CollectionDocuments:
+    def __init__(self, directory, collection_name):
+        ids_path, offsets_path, data_path = _collection_paths(directory, collection_name)
+        self.ids = np.load(ids_path, mmap_mode='r')
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        # Boş dosyalar bellek eşlemesiyle açılamaz
+        self.data = np.memmap(data_path, dtype=np.uint8, mode='r') if os.path.getsize(data_path) else b""
+
+    def get(self, product_id):
+        position = int(np.searchsorted(self.ids, product_id))
+        if position >= len(self.ids) or self.ids[position] != product_id:
+            return None
+        return json.loads(bytes(self.data[self.offsets[position]:self.offsets[position + 1]]))
+
+
+class ProductDocumentStore:
+    """
+    Ürünlerin ağır alanlarını (özellikler, teklifler) ChromaDB dışında, bellek eşlemeli dosyalarda tutar.
+    Koleksiyon dosyaları ilk kullanımda açılır; arama ikili arama ile, okuma yalnızca ilgili kayıt kadardır.
+    Klasör yoksa (eski düzendeki veritabanları) hiçbir belge bulunmaz ve ürünler olduğu gibi kullanılır.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _open(self, collection_name):
+        documents = self._collections.get(collection_name)
+        if documents is None and collection_name not in self._collections:
+            with self._lock:
+                if collection_name not in self._collections:
+                    try:
+                        self._collections[collection_name] = _CollectionDocuments(self.directory, collection_name)
+                    except FileNotFoundError:
+                        self._collections[collection_name] = None
+                documents = self._collections[collection_name]
+        return documents
+
+    def get(self, collection_name, product_id):
+        """Ürünün belgesini döndürür; bulunamazsa None."""
+        documents = self._open(collection_name)
+        return documents.get(product_id) if documents is not None else None
+
+    def hydrate(self, product_context):
+        """Ürün bağlamını belge deposundaki alanlarla tamamlar (yeni bir sözlük döndürür)."""
+        if not product_context:
+            return product_context
+        document = self.get(product_context.get('collection'), product_context.get('product_id'))
+        if document is None:
+            return product_context
+        hydrated = {key: value for key, value in product_context.items() if key != FEATURES_LENGTH_FIELD}
+        hydrated.update(document)
+        return hydrated
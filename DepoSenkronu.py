@@ -0,0 +1,276 @@
+import base64
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- AYARLAR ---
+# Kaynak klasördeki dosyaların boyut ve MD5 özetlerini listeleyen manifesto
+SYNC_MANIFEST_FILENAME = "senkron_manifest.json"
+SYNC_MANIFEST_VERSION = 1
+# Yerel dosyaların özetlerini tekrar hesaplamamak için tutulan durum dosyası (yalnızca yerelde)
+LOCAL_STATE_FILENAME = ".senkron_durumu.json"
+# VeriTabanı'nın delta modundaki ürün parmak izi manifestosu; yalnızca derlemede gerekir, API'ye indirilmez
+BUILD_MANIFEST_FILENAME = "urun_manifest.json"
+# Senkronizasyona hiç dahil edilmeyen dosyalar
+SYNC_EXCLUDED_FILENAMES = (SYNC_MANIFEST_FILENAME, LOCAL_STATE_FILENAME, BUILD_MANIFEST_FILENAME)
+DEFAULT_MAX_WORKERS = 8
+DOWNLOAD_RETRIES = 3
+HASH_CHUNK_SIZE = 1 << 20
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def file_md5(path):
+    """Dosyanın MD5 özetini onaltılık metin olarak döndürür."""
+    digest = hashlib.md5(usedforsecurity=False)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_local_files(directory):
+    """Klasördeki dosyaları (göreli yol, tam yol) olarak döndürür; senkron ve derleme dosyaları atlanır."""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            full_path = os.path.join(root, name)
+            relative_path = os.path.relpath(full_path, directory).replace(os.sep, '/')
+            if relative_path in SYNC_EXCLUDED_FILENAMES:
+                continue
+            yield relative_path, full_path
+
+
+def write_sync_manifest(directory):
+    """
+    Veritabanı klasörü için senkronizasyon manifestosunu oluşturur.
+    Klasör buluta yüklenmeden önce çağrılmalıdır; API bu dosyaya göre yalnızca değişen dosyaları indirir.
+    """
+    files = {relative_path: {"size": os.path.getsize(full_path), "md5": file_md5(full_path)}
+             for relative_path, full_path in iter_local_files(directory)}
+    manifest_path = os.path.join(directory, SYNC_MANIFEST_FILENAME)
+    with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({"version": SYNC_MANIFEST_VERSION, "files": files}, f, indent=1, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return files
+
+
+# --- DEPOLAMA ARKA UÇLARI ---
+
+class LocalStorageBackend:
+    """Yerel bir klasörü veritabanı kaynağı olarak kullanır (testler ve yerel geliştirme için)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def __str__(self):
+        return f"yerel klasör '{self.root}'"
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.root, SYNC_MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_files(self):
+        return {relative_path: {"size": os.path.getsize(full_path), "md5": None}
+                for relative_path, full_path in iter_local_files(self.root)}
+
+    def download(self, relative_path, destination):
+        shutil.copyfile(os.path.join(self.root, relative_path), destination)
+
+
+class GCSStorageBackend:
+    """Google Cloud Storage bucket'ındaki bir klasörü veritabanı kaynağı olarak kullanır."""
+
+    def __init__(self, bucket_name, prefix):
+        from google.cloud import storage
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/')
+        self.bucket = storage.Client().bucket(bucket_name)
+
+    def __str__(self):
+        return f"'gs://{self.bucket_name}/{self.prefix}'"
+
+    def _blob_name(self, relative_path):
+        return f"{self.prefix}/{relative_path}" if self.prefix else relative_path
+
+    def read_manifest(self):
+        blob = self.bucket.blob(self._blob_name(SYNC_MANIFEST_FILENAME))
+        if not blob.exists():
+            return None
+        return json.loads(blob.download_as_bytes())
+
+    def list_files(self):
+        files = {}
+        for blob in self.bucket.list_blobs(prefix=f"{self.prefix}/" if self.prefix else None):
+            if blob.name.endswith('/'):
+                continue
+            relative_path = blob.name[len(self.prefix) + 1:] if self.prefix else blob.name
+            if relative_path in SYNC_EXCLUDED_FILENAMES:
+                continue
+            # GCS MD5 değerini base64 olarak verir; bileşik nesnelerde MD5 bulunmaz.
+            md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else None
+            files[relative_path] = {"size": blob.size, "md5": md5}
+        return files
+
+    def download(self, relative_path, destination):
+        self.bucket.blob(self._blob_name(relative_path)).download_to_filename(destination)
+
+
+# --- SENKRONİZASYON ---
+
+def _load_local_state(db_path):
+    try:
+        with open(os.path.join(db_path, LOCAL_STATE_FILENAME), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return state if "files" in state else {}
+
+
+def _source_digest(expected_files):
+    """Kaynaktaki veritabanı sürümünü tanımlayan özet."""
+    return hashlib.sha1(json.dumps(expected_files, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _is_local_file_valid(path, expected, local_state, relative_path):
+    """Yerel dosya beklenen boyut ve özete sahipse True döner. Değişmemiş dosyaların özeti yeniden hesaplanmaz."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if stat.st_size != expected.get("size"):
+        return False
+    if not expected.get("md5"):
+        return True
+    cached = local_state.get(relative_path)
+    if cached and cached.get("mtime_ns") == stat.st_mtime_ns and cached.get("size") == stat.st_size:
+        return cached.get("md5") == expected["md5"]
+    return file_md5(path) == expected["md5"]
+
+
+def _download_with_retry(backend, relative_path, destination, expected):
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            backend.download(relative_path, destination)
+            if expected.get("md5") and file_md5(destination) != expected["md5"]:
+                raise IOError("MD5 özeti manifestoyla uyuşmuyor")
+            return os.path.getsize(destination)
+        except Exception as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise IOError(f"'{relative_path}' indirilemedi: {e}") from e
+            time.sleep(0.5 * attempt)
+
+
+def sync_database(backend, db_path, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Veritabanı klasörünü kaynakla eşitler.
+    Manifestoya göre yerelde zaten bulunan ve geçerli olan dosyalar atlanır, eksik veya
+    değişmiş olanlar sınırlı sayıda paralel iş parçacığıyla bir hazırlık klasörüne indirilir.
+    Her şey indirildikten sonra hazırlık klasörü veritabanı klasörünün yerine taşınır;
+    böylece yarım kalmış bir indirme mevcut veritabanını bozmaz. Başarıda True döner.
+
+    Aynı makinedeki süreçler bir dosya kilidiyle sıraya girer. Kaynaktaki sürüm yerelde
+    zaten eşitlenmişse klasöre dokunulmaz; böylece veritabanını açmış (ve ChromaDB'nin
+    dosyalarını değiştirmiş) başka bir sürecin altından klasör değiştirilmez.
+    """
+    parent_dir = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(parent_dir, exist_ok=True)
+    with open(f"{os.path.abspath(db_path)}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            return _sync_database_locked(backend, db_path, max_workers)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _sync_database_locked(backend, db_path, max_workers):
+    timings = {}
+    start_time = time.time()
+    print(f"{backend} kaynağından veritabanı eşitleniyor -> {db_path}")
+    try:
+        manifest = backend.read_manifest()
+        expected_files = manifest["files"] if manifest else backend.list_files()
+        timings["listeleme"] = time.time() - start_time
+        if not expected_files:
+            print("HATA: Kaynakta veritabanı dosyası bulunamadı.")
+            return False
+
+        step_start = time.time()
+        source_digest = _source_digest(expected_files)
+        local_state = _load_local_state(db_path)
+        if local_state.get("source_digest") == source_digest and os.path.isdir(db_path):
+            timings["toplam"] = time.time() - start_time
+            print(f"✅ Veritabanının bu sürümü zaten eşitlenmiş, indirme atlandı. Süreler: {_format_timings(timings)}")
+            return True
+        local_state = local_state.get("files", {})
+        local_files = dict(iter_local_files(db_path)) if os.path.isdir(db_path) else {}
+        valid, missing = [], []
+        for relative_path, expected in expected_files.items():
+            local_path = local_files.get(relative_path)
+            if local_path and _is_local_file_valid(local_path, expected, local_state, relative_path):
+                valid.append(relative_path)
+            else:
+                missing.append(relative_path)
+        extra = set(local_files) - set(expected_files)
+        timings["yerel kontrol"] = time.time() - step_start
+
+        step_start = time.time()
+        staging_path = f"{db_path}.staging"
+        shutil.rmtree(staging_path, ignore_errors=True)
+        os.makedirs(staging_path)
+        for relative_path in valid:
+            destination = os.path.join(staging_path, relative_path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            try:
+                os.link(local_files[relative_path], destination)
+            except OSError:
+                shutil.copy2(local_files[relative_path], destination)
+        for relative_path in missing:
+            os.makedirs(os.path.dirname(os.path.join(staging_path, relative_path)), exist_ok=True)
+
+        downloaded_bytes, lock = 0, threading.Lock()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [executor.submit(_download_with_retry, backend, relative_path,
+                                       os.path.join(staging_path, relative_path), expected_files[relative_path])
+                       for relative_path in missing]
+            for future in as_completed(futures):
+                size = future.result()
+                with lock:
+                    downloaded_bytes += size
+        timings["indirme"] = time.time() - step_start
+
+        step_start = time.time()
+        new_state = {}
+        for relative_path, expected in expected_files.items():
+            stat = os.stat(os.path.join(staging_path, relative_path))
+            new_state[relative_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": expected.get("md5")}
+        with open(os.path.join(staging_path, LOCAL_STATE_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump({"source_digest": source_digest, "files": new_state}, f)
+        old_path = f"{db_path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(db_path):
+            os.rename(db_path, old_path)
+        os.rename(staging_path, db_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        timings["yer değiştirme"] = time.time() - step_start
+        timings["toplam"] = time.time() - start_time
+
+        download_seconds = timings["indirme"] or 1e-9
+        print(f"✅ Veritabanı eşitlendi: {len(missing)} dosya indirildi ({downloaded_bytes / 1e6:.1f} MB, "
+              f"{downloaded_bytes / 1e6 / download_seconds:.1f} MB/sn), {len(valid)} dosya yerelden kullanıldı, "
+              f"{len(extra)} eski dosya kaldırıldı. Süreler: {_format_timings(timings)}")
+        return True
+    except Exception as e:
+        print(f"HATA: Veritabanı eşitlenirken bir sorun oluştu: {e}")
+        return False
+
+
+def _format_timings(timings):
+    return ", ".join(f"{name} {seconds:.2f} sn" for name, seconds in timings.items())
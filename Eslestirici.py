@@ -0,0 +1,160 @@
+from collections import deque
+
+# --- AYARLAR ---
+# Türkçe karakterlerin eşleştirme için dönüştürüleceği karşılıklar (bire bir, uzunluk korunur)
+TURKISH_FOLD_MAP = str.maketrans({
+    'ı': 'i', 'ğ': 'g', 'ü': 'u', 'ş': 's', 'ö': 'o', 'ç': 'c',
+    'I': 'i', 'İ': 'i', 'Ğ': 'g', 'Ü': 'u', 'Ş': 's', 'Ö': 'o', 'Ç': 'c'
+})
+# Sayının ardından gelebilecek çarpan kelimeleri (uzundan kısaya denenir)
+PRICE_MULTIPLIERS = (("milyon", 1000000), ("bin", 1000), ("k", 1000))
+NUMBER_START_CHARS = frozenset("0123456789")
+NUMBER_CHARS = frozenset("0123456789.,")
+# Eşleştirmede yok sayılan karakterler ("İ".lower() sonucunda oluşan birleşik nokta gibi)
+IGNORED_CHARS = frozenset("\u0307")
+
+# Eşleşme türleri
+MATCH_CATEGORY = 0
+MATCH_INTENT = 1
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def parse_turkish_price(price_str):
+    if not isinstance(price_str, str): return float(price_str)
+    try:
+        return float(price_str.replace('.', '').replace(',', '.'))
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def fold_turkish(text):
+    """
+    Metni Türkçe karakterlerden arındırıp küçük harfe çevirir.
+    Karakter sayısı korunur; böylece bulunan konumlar orijinal metne de uygulanabilir.
+    Örnek: "Buzdolabı İÇİN" -> "buzdolabi icin"
+    """
+    folded = text.translate(TURKISH_FOLD_MAP).lower()
+    if len(folded) != len(text):
+        # Nadir Unicode karakterlerde lower() uzunluğu değiştirebilir; karakter karakter katla.
+        folded = "".join(c.translate(TURKISH_FOLD_MAP).lower()[:1] or c for c in text)
+    return folded
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+# --- EŞLEŞTİRİCİ ---
+
+class QueryMatcher:
+    """
+    Kategori adları ve niyet ifadeleri üzerine kurulu Aho-Corasick otomatı.
+    Bir kez oluşturulur; her sorguda kategori, arama türü ve fiyat değerlerini
+    kategori sayısından bağımsız olarak tek geçişte çıkarır.
+    """
+
+    def __init__(self, categories, intent_phrases):
+        """
+        categories: Öncelik sırasına göre (ilk eşleşen kazanır) kategori adları.
+        intent_phrases: {arama_türü: [ifade, ...]} sözlüğü; sözlük sırası önceliktir.
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for priority, category in enumerate(categories):
+            self._add_phrase(category.strip(), (MATCH_CATEGORY, priority, category))
+        for priority, (search_type, phrases) in enumerate(intent_phrases.items()):
+            for phrase in phrases:
+                self._add_phrase(phrase, (MATCH_INTENT, priority, search_type))
+        self._build_failure_links()
+
+    def _add_phrase(self, phrase, payload):
+        folded = fold_turkish(phrase)
+        if not folded:
+            return
+        state = 0
+        for ch in folded:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = self._output[state] + (payload,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _read_multiplier(self, folded, index):
+        """Sayıdan sonra gelen 'bin', 'k' veya 'milyon' çarpanını okur: (çarpan, bitiş) ya da (None, index)."""
+        length = len(folded)
+        cursor = index
+        while cursor < length and folded[cursor].isspace():
+            cursor += 1
+        for word, multiplier in PRICE_MULTIPLIERS:
+            end = cursor + len(word)
+            if folded.startswith(word, cursor) and (end >= length or not _is_word_char(folded[end])):
+                return multiplier, end
+        return None, index
+
+    def match(self, query_text):
+        """
+        Sorguyu tek geçişte tarar.
+        Dönüş: {"category", "search_type", "prices", "processed_text"}
+        processed_text, "30 bin" gibi ifadelerin sayıya çevrildiği sorgu metnidir.
+        """
+        folded = fold_turkish(query_text)
+        goto, fail, output = self._goto, self._fail, self._output
+        best_category, best_intent = None, None
+        prices, pieces = [], []
+        last_copied, number_start, skip_until = 0, None, 0
+        state = 0
+        length = len(folded)
+        for index in range(length + 1):
+            ch = folded[index] if index < length else ''
+            # Sayı belirteçleri
+            if number_start is not None and ch not in NUMBER_CHARS:
+                number_text = query_text[number_start:index]
+                multiplier, end = self._read_multiplier(folded, index)
+                if multiplier:
+                    value = int(parse_turkish_price(number_text) * multiplier)
+                    pieces.append(query_text[last_copied:number_start])
+                    pieces.append(str(value))
+                    last_copied, skip_until = end, end
+                    prices.append(float(value))
+                else:
+                    prices.append(parse_turkish_price(number_text))
+                number_start = None
+            if not ch:
+                break
+            if number_start is None and index >= skip_until and ch in NUMBER_START_CHARS:
+                number_start = index
+            if ch in IGNORED_CHARS:
+                continue
+            # Kategori ve niyet ifadeleri
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for kind, priority, value in output[state]:
+                if kind == MATCH_CATEGORY:
+                    if best_category is None or priority < best_category[0]:
+                        best_category = (priority, value)
+                elif best_intent is None or priority < best_intent[0]:
+                    best_intent = (priority, value)
+        pieces.append(query_text[last_copied:])
+        return {"category": best_category[1] if best_category else None,
+                "search_type": best_intent[1] if best_intent else None,
+                "prices": prices,
+                "processed_text": "".join(pieces)}
@@ -0,0 +1,190 @@
+import os
+import time
+
+import numpy as np
+
+from BelgeDeposu import features_length
+from VektorKatmani import QuantizedVectors
+
+# --- AYARLAR ---
+# Başlangıçta koleksiyon meta verileri bu büyüklükte sayfalar halinde okunur
+INDEX_PAGE_SIZE = 5000
+# İndeks dosyalarının veritabanı klasöründeki yeri ve sütun dosyalarının uzantıları
+PRICE_INDEX_DIRNAME = "fiyat_indeksi"
+INDEX_COLUMNS = ("ids", "prices", "fp_scores")
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def price_bounds_from_where(where_filter):
+    """
+    API'nin ürettiği min_price filtresini (alt, alt_dahil, üst, üst_dahil) sınırlarına çevirir.
+    Örnek: {"min_price": {"$lt": 5000}} -> (None, True, 5000, False)
+    Fiyat dışı bir koşul içeren filtreler için None döner (indeks kullanılamaz).
+    """
+    low, low_inclusive, high, high_inclusive = None, True, None, True
+    if not where_filter:
+        return low, low_inclusive, high, high_inclusive
+    conditions = where_filter.get("$and") if set(where_filter) == {"$and"} else [where_filter]
+    for condition in conditions:
+        if set(condition) != {"min_price"} or not isinstance(condition["min_price"], dict):
+            return None
+        for operator, value in condition["min_price"].items():
+            if operator in ("$gte", "$gt"):
+                if low is None or value > low or (value == low and operator == "$gt"):
+                    low, low_inclusive = value, operator == "$gte"
+            elif operator in ("$lte", "$lt"):
+                if high is None or value < high or (value == high and operator == "$lt"):
+                    high, high_inclusive = value, operator == "$lte"
+            else:
+                return None
+    return low, low_inclusive, high, high_inclusive
+
+
+# --- İNDEKS SINIFLARI ---
+
+class CollectionPriceIndex:
+    """
+    Tek bir koleksiyonun fiyata göre sıralı sütunsal indeksi.
+    Yalnızca geçerli fiyatı (> 0) olan ürünleri tutar; fiyat aralıkları ikili arama ile,
+    en ucuz / en pahalı / F/P sıralamaları vektörel işlemlerle bulunur.
+    İsteğe bağlı nicemlenmiş vektör katmanı (vectors) aynı sırayla tutulur; fiyat aralığındaki
+    ürünler arasında kaba aday seçimi için kullanılır.
+    """
+
+    def __init__(self, ids, prices, fp_scores, vectors=None):
+        """Fiyata göre sıralanmış sütunlarla oluşturur (diskten mmap ile açılmış diziler de olabilir)."""
+        self.ids = ids
+        self.prices = prices
+        self.fp_scores = fp_scores
+        self.vectors = vectors
+
+    @classmethod
+    def from_unsorted(cls, ids, prices, fp_scores, embeddings=None, vector_dtype=None):
+        prices = np.asarray(prices, dtype=np.float64)
+        fp_scores = np.asarray(fp_scores, dtype=np.float64)
+        ids = np.asarray(ids, dtype=str)
+        valid = prices > 0
+        order = np.argsort(prices[valid], kind='stable')
+        vectors = None
+        if vector_dtype and embeddings is not None and len(ids):
+            vectors = QuantizedVectors.from_float(np.asarray(embeddings)[valid][order], vector_dtype)
+        return cls(ids[valid][order], prices[valid][order], fp_scores[valid][order], vectors)
+
+    @classmethod
+    def from_metadata(cls, ids, metadatas, embeddings=None, vector_dtype=None):
+        prices = [m.get('min_price', -1) or -1 for m in metadatas]
+        fp_scores = [features_length(m) / p if p > 0 else 0.0 for m, p in zip(metadatas, prices)]
+        return cls.from_unsorted(ids, prices, fp_scores, embeddings, vector_dtype)
+
+    def save(self, directory, collection_name):
+        for column in INDEX_COLUMNS:
+            np.save(os.path.join(directory, f"{collection_name}.{column}.npy"), getattr(self, column))
+        if self.vectors is not None:
+            self.vectors.save(directory, collection_name)
+
+    @classmethod
+    def load(cls, directory, collection_name, mmap=True):
+        """
+        Sütunları diskten açar. mmap=True iken diziler belleğe kopyalanmaz; aynı dosyayı açan
+        süreçler (ör. gunicorn işçileri) işletim sisteminin sayfa önbelleğini paylaşır.
+        """
+        return cls(*(np.load(os.path.join(directory, f"{collection_name}.{column}.npy"),
+                             mmap_mode='r' if mmap else None) for column in INDEX_COLUMNS),
+                   vectors=QuantizedVectors.load(directory, collection_name, mmap=mmap))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return (self.prices.nbytes + self.fp_scores.nbytes + self.ids.nbytes
+                + (self.vectors.nbytes if self.vectors is not None else 0))
+
+    def price_slice(self, low=None, low_inclusive=True, high=None, high_inclusive=True):
+        """Fiyat aralığına düşen ürünlerin [başlangıç, bitiş) konumlarını ikili arama ile bulur."""
+        start = 0 if low is None else int(np.searchsorted(self.prices, low, side='left' if low_inclusive else 'right'))
+        end = len(self.prices) if high is None else int(
+            np.searchsorted(self.prices, high, side='right' if high_inclusive else 'left'))
+        return start, max(start, end)
+
+    def top_ids(self, ranking, start, end, k):
+        """
+        Aralıktaki ilk k ürün kimliğini sıralama türüne göre döndürür.
+        ranking: 'cheapest', 'most_expensive' veya 'price_performance'.
+        """
+        if end <= start or k <= 0:
+            return []
+        if ranking == 'cheapest':
+            return self.ids[start:min(end, start + k)].tolist()
+        if ranking == 'most_expensive':
+            return self.ids[max(start, end - k):end][::-1].tolist()
+        scores = self.fp_scores[start:end]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+        else:
+            top = np.argsort(-scores, kind='stable')
+        return self.ids[start:end][top].tolist()
+
+    def nearest_ids(self, query_embedding, start, end, k):
+        """Aralıktaki ürünlerden sorguya yaklaşık en yakın k tanesinin kimlikleri (nicemlenmiş katmanla)."""
+        return self.ids[self.vectors.nearest(query_embedding, start, end, k)].tolist()
+
+
+class PriceIndex:
+    """Tüm koleksiyonlar için fiyat indekslerini tutar; başlangıçta Chroma meta verilerinden kurulur."""
+
+    def __init__(self):
+        self.collections = {}
+
+    @classmethod
+    def build(cls, client, vector_dtype=None):
+        """vector_dtype ('int8' veya 'float16') verilirse nicemlenmiş vektör katmanı da oluşturulur."""
+        index = cls()
+        start_time = time.time()
+        include = ['metadatas', 'embeddings'] if vector_dtype else ['metadatas']
+        for collection in client.list_collections():
+            ids, metadatas, embeddings, offset = [], [], [], 0
+            while True:
+                page = collection.get(include=include, limit=INDEX_PAGE_SIZE, offset=offset)
+                if not page['ids']:
+                    break
+                ids.extend(page['ids'])
+                metadatas.extend(page['metadatas'])
+                if vector_dtype:
+                    embeddings.extend(page['embeddings'])
+                offset += len(page['ids'])
+            index.collections[collection.name] = CollectionPriceIndex.from_metadata(
+                ids, metadatas, embeddings if vector_dtype else None, vector_dtype)
+        total = sum(len(c) for c in index.collections.values())
+        tier = f", {vector_dtype} vektör katmanı" if vector_dtype else ""
+        print(f"✅ Fiyat indeksi oluşturuldu: {len(index.collections)} koleksiyon, {total} ürün{tier}, "
+              f"{index.nbytes / 1024:.0f} KB, {time.time() - start_time:.2f} sn.")
+        return index
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.collections.values())
+
+    def save(self, directory):
+        """İndeksi, her koleksiyon için ayrı .npy sütun dosyaları olarak kaydeder."""
+        os.makedirs(directory, exist_ok=True)
+        for collection_name, collection_index in self.collections.items():
+            collection_index.save(directory, collection_name)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Kaydedilmiş indeksi açar; klasör yoksa None döner."""
+        if not os.path.isdir(directory):
+            return None
+        index = cls()
+        suffix = f".{INDEX_COLUMNS[0]}.npy"
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(suffix):
+                collection_name = filename[:-len(suffix)]
+                index.collections[collection_name] = CollectionPriceIndex.load(directory, collection_name, mmap=mmap)
+        return index
+
+    def get(self, collection_name):
+        return self.collections.get(collection_name)
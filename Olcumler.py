@@ -0,0 +1,264 @@
+import bisect
+import contextvars
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# --- AYARLAR ---
+# Süre histogramlarının üst sınırları (saniye)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_METRIC = "chat_stage_duration_seconds"
+REQUEST_METRIC = "chat_requests_total"
+# Ölçüm kapalıyken kullanılan, hiçbir şey yapmayan span
+NULL_SPAN = nullcontext()
+MAX_PROFILE_SECONDS = 60
+
+_current_trace = contextvars.ContextVar("olcum_izi", default=None)
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- METRİK KAYDI ---
+
+class Histogram:
+    """Prometheus tarzı kümülatif kovalı histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Süreç içi metrik kaydı: etiketli histogramlar, sayaçlar ve okuma anında değer üreten toplayıcılar.
+    Çok süreçli (gunicorn) modda her işçinin kendi kaydı vardır; /metrics o işçinin değerlerini gösterir.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_collector(self, collector):
+        """collector: {metrik_adı: değer} sözlüğü döndüren fonksiyon; değerler gauge olarak yayınlanır."""
+        self._collectors.append(collector)
+
+    def start_trace(self, endpoint="chat"):
+        """
+        Yeni bir istek izi başlatır; ölçüm kapalıysa hiçbir şey yapmayan izi döndürür.
+        endpoint, /chat ve arama uç noktalarının metriklerini ayıran etikettir.
+        """
+        return RequestTrace(self, endpoint) if self.enabled else NULL_TRACE
+
+    def render(self):
+        """Metrikleri Prometheus metin biçiminde döndürür."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines, declared = [], set()
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum!r}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in self._collectors:
+            try:
+                values = collector()
+            except Exception as e:
+                print(f"HATA: Metrik toplayıcısı çalıştırılamadı: {e}")
+                continue
+            for name, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {_format_value(int(value) if isinstance(value, bool) else value)}")
+        return "\n".join(lines) + "\n"
+
+
+# --- İSTEK İZLERİ ---
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class RequestTrace:
+    """
+    Bir isteğin aşama süreleri. Aynı adlı span'lar toplanır.
+    finish() çağrıldığında süreler uç nokta, aşama ve arama türü etiketleriyle kayda işlenir.
+    """
+
+    def __init__(self, registry, endpoint="chat"):
+        self.registry = registry
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.search_type = "unknown"
+        self.finished = False
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        """Şimdiye kadar ölçülen aşamalar için Server-Timing başlık değeri."""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+    def timings_ms(self):
+        return {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+
+    def finish(self, outcome):
+        if self.finished:
+            return
+        self.finished = True
+        self.record("total", time.perf_counter() - self.start)
+        for name, seconds in self.stages.items():
+            self.registry.observe(STAGE_METRIC, seconds, endpoint=self.endpoint, stage=name,
+                                  search_type=self.search_type)
+        self.registry.inc(REQUEST_METRIC, endpoint=self.endpoint, search_type=self.search_type, outcome=outcome)
+
+
+class _NullTrace:
+    """Ölçüm kapalıyken kullanılan iz; tüm işlemleri boştur."""
+    stages = {}
+    search_type = None
+
+    def span(self, name):
+        return NULL_SPAN
+
+    def record(self, name, seconds):
+        pass
+
+    def server_timing(self):
+        return ""
+
+    def timings_ms(self):
+        return {}
+
+    def finish(self, outcome):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+@contextmanager
+def activate(trace):
+    """İzi bu iş parçacığının (veya asenkron görevin) etkin izi yapar; span() onu kullanır."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def span(name):
+    """Etkin iz içinde bir aşamayı ölçer; etkin iz yoksa maliyeti yoktur."""
+    trace = _current_trace.get()
+    return trace.span(name) if trace is not None else NULL_SPAN
+
+
+def set_search_type(search_type):
+    trace = _current_trace.get()
+    if trace is not None and trace is not NULL_TRACE:
+        trace.search_type = search_type
+
+
+# --- ÖRNEKLEMELİ PROFİLLEYİCİ ---
+
+class SamplingProfiler:
+    """
+    Belirli bir süre boyunca tüm iş parçacıklarının yığınlarını düzenli aralıklarla örnekler.
+    Sonuç, flamegraph.pl ve speedscope'un okuyabildiği "katlanmış yığın" (collapsed stack) metnidir.
+    Yalnızca profile() çalışırken maliyeti vardır.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def profile(self, seconds):
+        """Çağıran iş parçacığında seconds boyunca örnekler; başka bir profil sürüyorsa None döner."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            stacks = Counter()
+            own_thread = threading.get_ident()
+            deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    names = []
+                    while frame is not None:
+                        code = frame.f_code
+                        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(names))] += 1
+                time.sleep(self.interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
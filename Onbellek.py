@@ -0,0 +1,380 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+# --- AYARLAR ---
+# Diskteki önbellek tablosunun adı
+EMBEDDING_TABLE_NAME = "embeddings"
+# Disk katmanında süresi dolan / sınırı aşan kayıtlar açılışta ve bu kadar yazmada bir silinir
+DISK_PRUNE_INTERVAL_WRITES = 1000
+
+_MISSING = object()
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def normalize_query_text(text):
+    """
+    Sorgu metnini önbellek anahtarı için normalize eder.
+    Türkçe büyük/küçük harf dönüşümünü doğru yapar ve fazla boşlukları temizler.
+    Örnek: "  En UCUZ   Buzdolabı " -> "en ucuz buzdolabı"
+    """
+    if not text:
+        return ""
+    text = text.replace('I', 'ı').replace('İ', 'i').lower()
+    return " ".join(text.split())
+
+
+# --- ÖNBELLEK SINIFLARI ---
+
+class TTLLRUCache:
+    """Boyut sınırlı, süre (TTL) destekli ve iş parçacığı güvenli LRU önbellek."""
+
+    def __init__(self, max_size=1024, ttl_seconds=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= now:
+                del self._items[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._items.pop(key, _MISSING)
+            return default if item is _MISSING else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {"size": len(self._items), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations}
+
+
+class EmbeddingCache:
+    """
+    Sorgu vektörleri için iki katmanlı önbellek.
+    1. katman: süreç içi TTL'li LRU. 2. katman (isteğe bağlı): yeniden başlatmalarda
+    korunan SQLite dosyası. Anahtar, model adı ve normalize edilmiş sorgu metnidir.
+    Disk katmanında disk_ttl_seconds'tan eski kayıtlar ve disk_max_rows'u aşan en eski kayıtlar
+    açılışta ve her DISK_PRUNE_INTERVAL_WRITES yazmada bir silinir.
+    """
+
+    def __init__(self, model_name, max_size=4096, ttl_seconds=None, disk_path=None, disk_ttl_seconds=None,
+                 disk_max_rows=None):
+        self.model_name = model_name
+        self.memory = TTLLRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.disk_path = disk_path
+        self.disk_ttl_seconds = disk_ttl_seconds
+        self.disk_max_rows = disk_max_rows
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self.disk_pruned = 0
+        self.computes = 0
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        if disk_path:
+            self._open_disk_store(disk_path)
+
+    def _open_disk_store(self, disk_path):
+        try:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(f"CREATE TABLE IF NOT EXISTS {EMBEDDING_TABLE_NAME} "
+                               "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)")
+            self._disk.execute(f"CREATE INDEX IF NOT EXISTS {EMBEDDING_TABLE_NAME}_created_at "
+                               f"ON {EMBEDDING_TABLE_NAME} (created_at)")
+            self._disk.commit()
+        except sqlite3.Error as e:
+            print(f"HATA: Vektör önbelleği diski açılamadı ({disk_path}): {e}")
+            self._disk = None
+            return
+        self.prune_disk()
+
+    def prune_disk(self):
+        """Süresi dolmuş ve disk_max_rows'u aşan en eski kayıtları siler; silinen sayıyı döndürür."""
+        if self._disk is None:
+            return 0
+        deleted = 0
+        try:
+            with self._disk_lock:
+                if self.disk_ttl_seconds:
+                    deleted += self._disk.execute(f"DELETE FROM {EMBEDDING_TABLE_NAME} WHERE created_at <= ?",
+                                                  (time.time() - self.disk_ttl_seconds,)).rowcount
+                if self.disk_max_rows:
+                    deleted += self._disk.execute(
+                        f"DELETE FROM {EMBEDDING_TABLE_NAME} WHERE key IN (SELECT key FROM {EMBEDDING_TABLE_NAME} "
+                        "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.disk_max_rows,)).rowcount
+                self._disk.commit()
+        except sqlite3.Error as e:
+            print(f"HATA: Vektör önbelleği diski temizlenemedi: {e}")
+            return 0
+        self.disk_pruned += deleted
+        return deleted
+
+    def _key(self, text):
+        return f"{self.model_name}\x1f{normalize_query_text(text)}"
+
+    def _disk_get(self, key):
+        if self._disk is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = self._disk.execute(f"SELECT vector, created_at FROM {EMBEDDING_TABLE_NAME} WHERE key = ?",
+                                         (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"HATA: Vektör önbelleği diskten okunamadı: {e}")
+            return None
+        if not row:
+            return None
+        blob, created_at = row
+        if self.disk_ttl_seconds and created_at + self.disk_ttl_seconds <= time.time():
+            return None
+        vector = array('f')
+        vector.frombytes(blob)
+        return vector.tolist()
+
+    def _disk_set(self, key, vector):
+        if self._disk is None:
+            return
+        try:
+            with self._disk_lock:
+                self._disk.execute(f"INSERT OR REPLACE INTO {EMBEDDING_TABLE_NAME} (key, vector, created_at) "
+                                   "VALUES (?, ?, ?)", (key, array('f', vector).tobytes(), time.time()))
+                self._disk.commit()
+            self.disk_writes += 1
+        except sqlite3.Error as e:
+            print(f"HATA: Vektör önbelleği diske yazılamadı: {e}")
+            return
+        if self.disk_writes % DISK_PRUNE_INTERVAL_WRITES == 0:
+            self.prune_disk()
+
+    def get(self, text):
+        key = self._key(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+        vector = self._disk_get(key)
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory.set(key, vector)
+        return vector
+
+    def set(self, text, vector):
+        key = self._key(text)
+        self.memory.set(key, vector)
+        self._disk_set(key, vector)
+
+    def get_or_compute(self, text, compute_fn):
+        """Vektörü önbellekten döndürür; yoksa compute_fn() ile hesaplayıp saklar."""
+        vector = self.get(text)
+        if vector is None:
+            self.computes += 1
+            vector = compute_fn()
+            self.set(text, vector)
+        return vector
+
+    def get_or_compute_many(self, texts, compute_many_fn):
+        """
+        Metinlerin vektörlerini sırayla döndürür; önbellekte olmayan farklı metinler tek bir
+        compute_many_fn(metinler) -> vektörler çağrısıyla hesaplanıp saklanır.
+        """
+        vectors = {}
+        for text in texts:
+            if text not in vectors:
+                vectors[text] = self.get(text)
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            self.computes += len(missing)
+            for text, vector in zip(missing, compute_many_fn(missing)):
+                vectors[text] = vector
+                self.set(text, vector)
+        return [vectors[text] for text in texts]
+
+    def stats(self):
+        memory_stats = self.memory.stats()
+        return {"memory_hits": memory_stats["hits"], "disk_hits": self.disk_hits, "misses": self.computes,
+                "evictions": memory_stats["evictions"], "expirations": memory_stats["expirations"],
+                "memory_size": memory_stats["size"], "disk_writes": self.disk_writes,
+                "disk_pruned": self.disk_pruned,
+                "disk_enabled": self._disk is not None}
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+
+class _InFlightCall:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CoalescingCache:
+    """
+    Aynı anahtar için eşzamanlı hesaplamaları birleştiren (singleflight) ve sonuçları kısa süre saklayan önbellek.
+    Bir anahtar hesaplanırken gelen istekler yeni bir hesaplama başlatmaz, ilk isteğin sonucunu bekler.
+    Hatalar bekleyen isteklere iletilir ama saklanmaz. ttl_seconds boşsa yalnızca birleştirme yapılır.
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=None):
+        self.results = TTLLRUCache(max_size=max_size, ttl_seconds=ttl_seconds) if ttl_seconds else None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.computes = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def get_or_compute(self, key, compute_fn):
+        with self._lock:
+            if self.results is not None:
+                value = self.results.get(key, _MISSING)
+                if value is not _MISSING:
+                    return value
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._in_flight[key] = _InFlightCall()
+                self.computes += 1
+            else:
+                self.coalesced += 1
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = compute_fn()
+            if self.results is not None:
+                self.results.set(key, call.value)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.event.set()
+
+    def stats(self):
+        result_stats = self.results.stats() if self.results is not None else {}
+        return {"hits": result_stats.get("hits", 0), "misses": self.computes, "coalesced": self.coalesced,
+                "errors": self.errors, "in_flight": len(self._in_flight), "size": result_stats.get("size", 0),
+                "evictions": result_stats.get("evictions", 0), "expirations": result_stats.get("expirations", 0)}
+
+
+class _ProductAnswers:
+    __slots__ = ("version", "vectors", "answers")
+
+    def __init__(self, version):
+        self.version = version
+        self.vectors = None
+        self.answers = []
+
+
+class SemanticAnswerCache:
+    """
+    Ürün başına model cevaplarını, cevaplanan sorunun vektörüyle birlikte saklar.
+    Aynı ürün için sorulan yeni soru, kayıtlı sorulardan birine kosinüs benzerliği similarity_threshold
+    ve üzeri ise o sorunun cevabı döner. Her ürün kaydı bir sürümle (ör. fiyat ve teklif özeti) saklanır;
+    sürüm değiştiğinde ürünün tüm cevapları silinir. Ürünler TTL'li LRU ile sınırlanır.
+    """
+
+    def __init__(self, similarity_threshold=0.95, max_products=1024, answers_per_product=16, ttl_seconds=None):
+        self.similarity_threshold = similarity_threshold
+        self.answers_per_product = answers_per_product
+        self.products = TTLLRUCache(max_size=max_products, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, product_key, version, question_vector):
+        """Benzer bir soru için saklanan cevabı döndürür; yoksa veya ürün değişmişse None."""
+        with self._lock:
+            entry = self.products.get(product_key)
+            if entry is not None and entry.version != version:
+                self.products.pop(product_key)
+                self.invalidations += 1
+                entry = None
+            if entry is not None and entry.answers:
+                scores = entry.vectors @ self._normalize(question_vector)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self.hits += 1
+                    return entry.answers[best]
+            self.misses += 1
+            return None
+
+    def put(self, product_key, version, question_vector, answer):
+        with self._lock:
+            entry = self.products.get(product_key)
+            if entry is None or entry.version != version:
+                entry = _ProductAnswers(version)
+                self.products.set(product_key, entry)
+            vector = self._normalize(question_vector)[None, :]
+            entry.vectors = vector if entry.vectors is None else np.vstack([entry.vectors, vector])
+            entry.answers.append(answer)
+            if len(entry.answers) > self.answers_per_product:
+                entry.vectors = entry.vectors[1:]
+                entry.answers.pop(0)
+            self.stores += 1
+
+    def stats(self):
+        product_stats = self.products.stats()
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores,
+                "invalidations": self.invalidations, "products": product_stats["size"],
+                "evictions": product_stats["evictions"], "expirations": product_stats["expirations"]}
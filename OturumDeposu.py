@@ -0,0 +1,245 @@
+import atexit
+import os
+import threading
+import time
+
+from Onbellek import TTLLRUCache
+
+# --- AYARLAR ---
+CONVERSATIONS_COLLECTION = 'conversations'
+TURNS_SUBCOLLECTION = 'turns'
+DEFAULT_MAX_TURNS = 20
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 10 * 60
+DEFAULT_FLUSH_INTERVAL = 0.5
+# Yazılamayan turlar en fazla bu kadar kez yeniden denenir
+MAX_WRITE_ATTEMPTS = 3
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def product_reference(product_context):
+    """Ürün bağlamını veritabanındaki kimliğine indirger; kimliği olmayan bağlamlar için None döner."""
+    if not product_context or not product_context.get('product_id') or not product_context.get('collection'):
+        return None
+    return {"collection": product_context['collection'], "product_id": product_context['product_id']}
+
+
+def serialize_turn(turn, seq):
+    """Bir konuşma turunu saklanacak biçime çevirir: ürün bağlamı yerine yalnızca kimliği yazılır."""
+    data = {"seq": seq, "user": turn["user"], "assistant": turn["assistant"]}
+    reference = product_reference(turn.get("product_context"))
+    if reference:
+        data["product_ref"] = reference
+    elif turn.get("product_context"):
+        data["product_context"] = turn["product_context"]
+    return data
+
+
+# --- SAKLAMA ARKA UÇLARI ---
+
+class InMemorySessionBackend:
+    """Konuşmaları süreç belleğinde tutar (testler ve yerel geliştirme için)."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.write_count = 0
+        self._lock = threading.Lock()
+
+    def load_turns(self, session_id, limit):
+        with self._lock:
+            return list(self.sessions.get(session_id, [])[-limit:])
+
+    def append_turns(self, session_id, turns):
+        with self._lock:
+            self.sessions.setdefault(session_id, []).extend(turns)
+            self.write_count += 1
+
+
+class FirestoreSessionBackend:
+    """
+    Her turu conversations/{session_id}/turns altında ayrı bir belge olarak saklar.
+    Tüm geçmişi tek belgeye yeniden yazmak yerine yalnızca yeni turlar eklenir.
+    Eski biçimdeki konuşmaların 'history' alanı, konuşmaya ilk tur eklenirken tur belgelerine taşınır.
+    """
+
+    def __init__(self, db):
+        from google.cloud import firestore
+        self.db = db
+        self._descending = firestore.Query.DESCENDING
+        self._delete_field = firestore.DELETE_FIELD
+        # Bu süreçte eski biçimden taşınıp taşınmadığı zaten kontrol edilmiş konuşmalar
+        self._migrated = TTLLRUCache(max_size=DEFAULT_CACHE_SIZE)
+
+    def load_turns(self, session_id, limit):
+        conversation = self.db.collection(CONVERSATIONS_COLLECTION).document(session_id)
+        query = conversation.collection(TURNS_SUBCOLLECTION).order_by('seq', direction=self._descending).limit(limit)
+        turns = [doc.to_dict() for doc in query.stream()][::-1]
+        if turns:
+            return turns
+        # Henüz taşınmamış eski biçimli konuşmada geçmiş, konuşma belgesinin 'history' alanındadır.
+        doc = conversation.get()
+        return (doc.to_dict().get('history', []) if doc.exists else [])[-limit:]
+
+    def _legacy_turns(self, conversation, session_id):
+        """
+        Konuşma belgesindeki eski 'history' alanının son turlarını döndürür (toplu yazma sınırı için
+        DEFAULT_MAX_TURNS kadar). Belge her konuşma için süreç başına bir kez okunur.
+        """
+        if self._migrated.get(session_id):
+            return []
+        doc = conversation.get()
+        return ((doc.to_dict() or {}).get('history', []) if doc.exists else [])[-DEFAULT_MAX_TURNS:]
+
+    def append_turns(self, session_id, turns):
+        conversation = self.db.collection(CONVERSATIONS_COLLECTION).document(session_id)
+        legacy_turns = self._legacy_turns(conversation, session_id)
+        batch = self.db.batch()
+        # Eski turlar, zaman damgasından türeyen yeni sıra numaralarından küçük 1..n numaralarını alır.
+        for seq, turn in enumerate(legacy_turns, start=1):
+            batch.set(conversation.collection(TURNS_SUBCOLLECTION).document(f"{seq:020d}"), {**turn, "seq": seq})
+        for turn in turns:
+            batch.set(conversation.collection(TURNS_SUBCOLLECTION).document(f"{turn['seq']:020d}"), turn)
+        fields = {"last_seq": turns[-1]['seq'], "updated_at": time.time()}
+        if legacy_turns:
+            fields["history"] = self._delete_field
+        batch.set(conversation, fields, merge=True)
+        batch.commit()
+        self._migrated.set(session_id, True)
+
+
+# --- OTURUM DEPOSU ---
+
+class SessionStore:
+    """
+    Konuşma geçmişi için önbellekli ve arkadan yazmalı (write-behind) depo.
+    Sık kullanılan oturumlar TTL'li LRU önbellekte tutulur; yeni turlar hemen önbelleğe
+    eklenir ve arka planda çalışan bir iş parçacığı tarafından toplu halde arka uca yazılır.
+    Aynı oturumun bekleyen turları tek bir yazma işleminde birleştirilir.
+    cache_size 0 ise önbellek kapalıdır ve geçmiş her istekte arka uçtan okunur. Aynı oturumun istekleri
+    farklı süreçlere düşebiliyorsa (ör. birden çok gunicorn işçisi) süreç içi önbellek bayat kalır.
+    """
+
+    def __init__(self, backend, resolve_products=None, max_turns=DEFAULT_MAX_TURNS, cache_size=DEFAULT_CACHE_SIZE,
+                 cache_ttl=DEFAULT_CACHE_TTL, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """
+        resolve_products: [ürün_referansı] listesini alıp aynı sırada ürün bağlamlarını
+        (bulunamayanlar için None) döndüren fonksiyon.
+        """
+        self.backend = backend
+        self.resolve_products = resolve_products
+        self.max_turns = max_turns
+        self.flush_interval = flush_interval
+        self.cache = TTLLRUCache(max_size=cache_size, ttl_seconds=cache_ttl) if cache_size > 0 else None
+        self.pending = {}
+        self.inflight = {}
+        self.writes = 0
+        self.coalesced_turns = 0
+        self.failed_writes = 0
+        self._pending_lock = threading.Lock()
+        # Önbellekteki geçmişin oku-değiştir-yaz işlemleri ve bekleyen turlar bu kilit altında güncellenir
+        self._cache_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._writer = None
+        self._writer_pid = None
+        self._last_seq = 0
+        atexit.register(self.flush)
+
+    def _resolve(self, stored_turns):
+        references = [t.get("product_ref") for t in stored_turns]
+        wanted = [r for r in references if r]
+        resolved = iter(self.resolve_products(wanted) if wanted and self.resolve_products else [None] * len(wanted))
+        history = []
+        for turn, reference in zip(stored_turns, references):
+            product_context = next(resolved) if reference else turn.get("product_context")
+            history.append({"user": turn.get("user", ""), "assistant": turn.get("assistant", ""),
+                            "product_context": product_context})
+        return history
+
+    def _unsaved_entries(self, session_id):
+        """Henüz yazılmamış (veya yazılmakta olan) turlar: {sıra: tur}."""
+        with self._pending_lock:
+            entries = self.inflight.get(session_id, []) + self.pending.get(session_id, [])
+        return {seq: turn for turn, seq, _ in entries}
+
+    def get_history(self, session_id):
+        """Oturumun son max_turns turunu döndürür. Dönen liste çağırana aittir."""
+        history = self.cache.get(session_id) if self.cache is not None else None
+        if history is not None:
+            return list(history)
+        # Okuma sürerken yazılıp bekleyenlerden çıkan turlar kaçmasın diye önceki bekleyenler de alınır
+        unsaved = self._unsaved_entries(session_id)
+        stored_turns = self.backend.load_turns(session_id, self.max_turns)
+        last_stored_seq = max((t.get("seq", 0) for t in stored_turns), default=0)
+        resolved = self._resolve(stored_turns)
+        with self._cache_lock:
+            history = self.cache.get(session_id) if self.cache is not None else None
+            if history is None:
+                # Okuma sırasında eklenen turlar da bekleyenlerdedir; kilit altında önbelleğe birlikte yazılır
+                unsaved.update(self._unsaved_entries(session_id))
+                unsaved_turns = [unsaved[seq] for seq in sorted(unsaved) if seq > last_stored_seq]
+                history = (resolved + unsaved_turns)[-self.max_turns:]
+                if self.cache is not None:
+                    self.cache.set(session_id, history)
+        return list(history)
+
+    def append_turn(self, session_id, turn):
+        """Turu önbelleğe ekler ve arka planda yazılmak üzere kuyruğa alır."""
+        with self._cache_lock:
+            history = self.cache.get(session_id) if self.cache is not None else None
+            if history is not None:
+                self.cache.set(session_id, (history + [turn])[-self.max_turns:])
+            with self._pending_lock:
+                self._last_seq = max(time.time_ns(), self._last_seq + 1)
+                self.pending.setdefault(session_id, []).append((turn, self._last_seq, 0))
+        self._ensure_writer()
+        self._wakeup.set()
+
+    def _ensure_writer(self):
+        # fork sonrası iş parçacıkları çocuk süreçte yaşamaz; her süreç kendi yazıcısını başlatır.
+        if self._writer is not None and self._writer_pid == os.getpid() and self._writer.is_alive():
+            return
+        with self._pending_lock:
+            if self._writer is not None and self._writer_pid == os.getpid() and self._writer.is_alive():
+                return
+            self._writer_pid = os.getpid()
+            self._writer = threading.Thread(target=self._writer_loop, name="oturum-yazici", daemon=True)
+            self._writer.start()
+
+    def _writer_loop(self):
+        while True:
+            self._wakeup.wait()
+            # Kısa bir süre bekleyerek aynı oturumun ardışık turlarını tek yazmada topla
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Bekleyen tüm turları arka uca yazar."""
+        with self._pending_lock:
+            batches, self.pending = self.pending, {}
+            self.inflight.update(batches)
+        for session_id, entries in batches.items():
+            turns = [serialize_turn(turn, seq) for turn, seq, _ in entries]
+            retry = []
+            try:
+                self.backend.append_turns(session_id, turns)
+                self.writes += 1
+                self.coalesced_turns += len(turns) - 1
+            except Exception as e:
+                self.failed_writes += 1
+                print(f"HATA: Konuşma geçmişi kaydedilemedi ({session_id}): {e}")
+                retry = [(turn, seq, attempts + 1) for turn, seq, attempts in entries
+                         if attempts + 1 < MAX_WRITE_ATTEMPTS]
+            with self._pending_lock:
+                self.inflight.pop(session_id, None)
+                if retry:
+                    self.pending[session_id] = retry + self.pending.get(session_id, [])
+            if retry:
+                self._wakeup.set()
+
+    def stats(self):
+        cache_stats = self.cache.stats() if self.cache is not None else {"hits": 0, "misses": 0, "size": 0}
+        return {"cache_hits": cache_stats["hits"], "cache_misses": cache_stats["misses"],
+                "cache_size": cache_stats["size"], "writes": self.writes, "coalesced_turns": self.coalesced_turns,
+                "failed_writes": self.failed_writes, "pending_sessions": len(self.pending)}
@@ -0,0 +1,155 @@
+import json
+
+from Onbellek import TTLLRUCache
+
+# --- AYARLAR ---
+# Token sayısı, ek bir bağımlılık ve ağ çağrısı gerektirmemesi için karakter sayısından tahmin edilir
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 8000
+DEFAULT_VERBATIM_TURNS = 3
+# Eski turların sıkıştırılmış halinde asistan cevabından tutulacak en fazla karakter
+COMPRESSED_ANSWER_CHARS = 200
+DEFAULT_PRODUCT_CACHE_SIZE = 2048
+
+PROMPT_TEMPLATE = """GÖREV: Akıllı Satış Asistanı
+[ROL TANIMLAMA (PERSONA)]
+Sen, son derece bilgili, ikna edici, güvenilir ve proaktif bir "Akıllı Satış Asistanı"sın. Amacın, müşterilere sunduğun ürün hakkında en doğru bilgiyi vererek onları satın almaya teşvik etmek ve tüm sorularını profesyonel bir dille yanıtlamaktır.
+
+[BAĞLAM (CONTEXT)]
+1. Konuşma Geçmişi
+Önceki diyalogları anlamak için bu bölümü dikkatle incele.
+<konuşma_geçmişi>
+{history_text}
+</konuşma_geçmişi>
+
+2. Sağlanan Ürün Bilgileri (Bilgi Kaynağı - RAG)
+Yanıtlarını oluştururken temel alacağın tek ve yegane bilgi kaynağı burasıdır.
+<ürün_bilgileri>
+{product_block}
+</ürün_bilgileri>
+
+[TALİMATLAR VE SÜREÇ (ADIM ADIM DÜŞÜNME)]
+Müşterinin sorusuna yanıt vermeden önce aşağıdaki adımları sırasıyla takip et:
+Adım 1: Analiz Et
+Müşterinin son sorusunun ({user_question}) ne anlama geldiğini ve neyi amaçladığını anla.
+<konuşma_geçmişi> bölümündeki önceki konularla bağlantısını kur.
+Soruyu yanıtlamak için hangi bilgilere ihtiyacın olduğunu belirle.
+Adım 2: Bilgiyi Değerlendir
+İhtiyaç duyduğun bilgilerin <ürün_bilgileri> kaynağında olup olmadığını kontrol et.
+Eğer Bilgi Yeterliyse: Yanıtını sadece ve sadece <ürün_bilgileri> bölümündeki verileri kullanarak oluştur. KESİNLİKLE dışarıdan bilgi ekleme veya varsayımda bulunma.
+Eğer Bilgi Yetersizse: Müşteriye, aradığı bilginin mevcut belgelerde olmadığını belirt. Araştırmaya başlamak için ilk olarak en uygun fiyatlı satıcının linkini ({en_ucuz_satici_linki}) kullan. Ardından, "Sizin için hızlıca bir araştırma yaptım ve şunları buldum:" diyerek bulduğun en alakalı ve güvenilir bilgileri özetleyerek sun.
+Adım 3: Yanıtı Oluştur ve Sun
+Ton ve Üslup: İkna edici, samimi, profesyonel ve yardımsever bir dil kullan. Karmaşık teknik detayları herkesin anlayabileceği şekilde basitleştir.
+İçerik: Müşterinin sorusunu doğrudan yanıtla. Cevabında, ürünün özelliklerinin müşteriye sağlayacağı faydaları vurgula. Fiyat karşılaştırması yaparken en uygun seçeneği ve linkini öne çıkar.
+
+[YENİ KULLANICI SORUSU]
+{user_question}"""
+
+PRODUCT_BLOCK_TEMPLATE = """Ürün Adı: {urun_adi}
+Ürün Özellikleri: {urun_ozellikleri}
+Fiyat Bilgileri ve Satıcılar:
+{satici_bilgisi}
+En Uygun Fiyatlı Satıcı Linki: {en_ucuz_satici_linki}"""
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def render_product_block(product_context):
+    """Ürün bilgisi bölümünü ve en uygun satıcı linkini hazırlar: (blok, en_ucuz_satici_linki)."""
+    urun_adi = product_context.get('product_name', 'N/A')
+    urun_linki = product_context.get('product_url', 'N/A')
+    urun_ozellikleri = product_context.get('features', 'Mevcut değil.')
+    try:
+        offers = json.loads(product_context.get('offers_json', '[]'))
+    except (json.JSONDecodeError, TypeError):
+        offers = []
+    satici_bilgisi_listesi, en_ucuz_satici_linki = [], urun_linki
+    valid_offers = sorted([o for o in offers if o.get('price') is not None and o.get('price') > 0],
+                          key=lambda x: x['price'])
+    if valid_offers:
+        en_ucuz_satici_linki = valid_offers[0].get('offer_url', urun_linki)
+        for offer in valid_offers: satici_bilgisi_listesi.append(
+            f"- {offer.get('seller_name', 'N/A')}: {offer.get('price', 'N/A')} TL")
+    satici_bilgisi = "\n".join(satici_bilgisi_listesi) or "Online satıcı bilgisi bulunamadı."
+    block = PRODUCT_BLOCK_TEMPLATE.format(urun_adi=urun_adi, urun_ozellikleri=urun_ozellikleri,
+                                          satici_bilgisi=satici_bilgisi, en_ucuz_satici_linki=en_ucuz_satici_linki)
+    return block, en_ucuz_satici_linki
+
+
+def format_turn(turn):
+    return f"Kullanıcı: {turn['user']}\nAsistan: {turn['assistant']}"
+
+
+def compress_turn(turn):
+    """Eski bir turu kısaltır: soru aynen kalır, cevabın yalnızca başı tutulur."""
+    answer = " ".join(turn['assistant'].split())
+    if len(answer) > COMPRESSED_ANSWER_CHARS:
+        answer = answer[:COMPRESSED_ANSWER_CHARS].rstrip() + "…"
+    return f"Kullanıcı: {turn['user']}\nAsistan (özet): {answer}"
+
+
+# --- PROMPT OLUŞTURUCU ---
+
+class PromptBuilder:
+    """
+    Token bütçesine uyan nihai prompt'u oluşturur.
+    Son turlar olduğu gibi, daha eskileri kısaltılarak eklenir; bütçe aşılırsa en eski turlar atılır.
+    Ürün bilgisi bölümü product_url başına önbelleğe alınır.
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, verbatim_turns=DEFAULT_VERBATIM_TURNS,
+                 product_cache_size=DEFAULT_PRODUCT_CACHE_SIZE):
+        self.token_budget = token_budget
+        self.verbatim_turns = verbatim_turns
+        self.product_blocks = TTLLRUCache(max_size=product_cache_size)
+
+    def product_block(self, product_context):
+        """Ürün bölümünü önbellekten döndürür; ürünün teklifleri veya özellikleri değiştiyse yeniden oluşturur."""
+        signature = (product_context.get('product_name'), product_context.get('features'),
+                     product_context.get('offers_json'))
+        key = product_context.get('product_url')
+        cached = self.product_blocks.get(key) if key else None
+        if cached and cached[0] == signature:
+            return cached[1], cached[2], True
+        block, cheapest_link = render_product_block(product_context)
+        if key:
+            self.product_blocks.set(key, (signature, block, cheapest_link))
+        return block, cheapest_link, False
+
+    def build_history(self, history, token_budget):
+        """Geçmişi bütçeye sığdırır: (metin, tam_tur, kısaltılmış_tur, atılan_tur)."""
+        verbatim_start = max(0, len(history) - self.verbatim_turns)
+        rendered = [compress_turn(turn) if i < verbatim_start else format_turn(turn) for i, turn in enumerate(history)]
+        # En yeni turdan geriye doğru bütçe dolana kadar ekle
+        kept, used = [], 0
+        for text in reversed(rendered):
+            cost = estimate_tokens(text) + 1
+            if used + cost > token_budget:
+                if not kept and token_budget > 0:
+                    # Tek bir tur bile sığmıyorsa en yeni turun sonunu kırp
+                    kept.append(text[-token_budget * CHARS_PER_TOKEN:])
+                break
+            kept.append(text)
+            used += cost
+        kept.reverse()
+        kept_count = len(kept)
+        compressed = max(0, verbatim_start - (len(history) - kept_count))
+        return "\n".join(kept), kept_count - compressed, compressed, len(history) - kept_count
+
+    def build(self, user_question, product_context, history):
+        """Prompt'u ve boyut istatistiklerini döndürür: (prompt, istatistikler)."""
+        block, cheapest_link, block_cached = self.product_block(product_context)
+        fixed_tokens = estimate_tokens(PROMPT_TEMPLATE) + estimate_tokens(block) + \
+            2 * estimate_tokens(user_question) + estimate_tokens(cheapest_link)
+        history_text, verbatim, compressed, dropped = self.build_history(
+            history, max(0, self.token_budget - fixed_tokens))
+        prompt = PROMPT_TEMPLATE.format(history_text=history_text, product_block=block, user_question=user_question,
+                                        en_ucuz_satici_linki=cheapest_link)
+        stats = {"prompt_chars": len(prompt), "prompt_tokens": estimate_tokens(prompt),
+                 "history_turns": verbatim, "compressed_turns": compressed, "dropped_turns": dropped,
+                 "product_block_cached": block_cached}
+        return prompt, stats
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+
+# --- AYARLAR ---
+# Desteklenen nicemleme türleri: int8 (vektör başına ölçekle) ve float16
+VECTOR_TIER_DTYPES = ("int8", "float16")
+VECTOR_COLUMNS = ("codes", "scales", "sq_norms")
+INT8_MAX = 127
+
+
+# --- NİCEMLENMİŞ VEKTÖRLER ---
+
+class QuantizedVectors:
+    """
+    Ürün vektörlerinin düşük hassasiyetli kopyası; kaba aday seçimi için kullanılır.
+    int8 türünde her vektör kendi en büyük mutlak değerine göre ölçeklenir (x ≈ kod * ölçek).
+    Uzaklıklar ChromaDB'nin varsayılan ölçüsüyle (kare L2) uyumludur: |x|² - 2·q·x
+    (|q|² tüm adaylar için aynı olduğundan sıralamayı değiştirmez ve eklenmez).
+    Kesin sıralama, seçilen az sayıdaki aday üzerinde tam hassasiyetli vektörlerle yapılır.
+    """
+
+    def __init__(self, codes, scales, sq_norms):
+        self.codes = codes
+        self.scales = scales
+        self.sq_norms = sq_norms
+
+    @classmethod
+    def from_float(cls, vectors, dtype):
+        if dtype not in VECTOR_TIER_DTYPES:
+            raise ValueError(f"Bilinmeyen vektör katmanı türü: {dtype}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            vectors = vectors.reshape(len(vectors), -1)
+        sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+        if dtype == "float16":
+            return cls(vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32), sq_norms)
+        scales = np.abs(vectors).max(axis=1, initial=0.0) / INT8_MAX
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return cls(codes, scales.astype(np.float32), sq_norms)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def dtype(self):
+        return self.codes.dtype.name
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes + self.sq_norms.nbytes
+
+    def approximate_distances(self, query, start, end):
+        """[başlangıç, bitiş) aralığındaki vektörlerin sorguya yaklaşık kare L2 uzaklıkları (sabit terim hariç)."""
+        query = np.asarray(query, dtype=np.float32)
+        dots = (self.codes[start:end].astype(np.float32) @ query) * self.scales[start:end]
+        return self.sq_norms[start:end] - 2 * dots
+
+    def nearest(self, query, start, end, k):
+        """Aralıktaki en yakın k vektörün konumlarını yakından uzağa döndürür."""
+        if end <= start or k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        distances = self.approximate_distances(query, start, end)
+        if len(distances) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.argsort(distances[top], kind='stable')]
+        else:
+            top = np.argsort(distances, kind='stable')
+        return top + start
+
+    def save(self, directory, name):
+        for column in VECTOR_COLUMNS:
+            np.save(os.path.join(directory, f"{name}.{column}.npy"), getattr(self, column))
+
+    @classmethod
+    def load(cls, directory, name, mmap=True):
+        """Kaydedilmiş katmanı açar; dosyalar yoksa None döner."""
+        paths = [os.path.join(directory, f"{name}.{column}.npy") for column in VECTOR_COLUMNS]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        return cls(*(np.load(path, mmap_mode='r' if mmap else None) for path in paths))
@@ -0,0 +1,268 @@
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Eslestirici import fold_turkish
+
+# --- AYARLAR ---
+# Ürün ve sorgu vektörleri aynı modelden gelmelidir; API.py bu sabiti buradan alır
+EMBEDDING_MODEL = "models/text-embedding-004"
+# Ürün vektörlerinin kontrol noktası (SQLite); yarıda kalan üretim buradan devam eder
+EMBEDDING_CHECKPOINT_FILENAME = "urun_vektorleri.sqlite"
+CHECKPOINT_TABLE_NAME = "product_vectors"
+# Gemini toplu vektör isteği başına en fazla 100 metin kabul eder
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+# Vektörleştirilecek metnin üst sınırı (modelin girdi sınırının altında kalmak için)
+MAX_EMBEDDING_TEXT_CHARS = 8000
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+DEFAULT_HASH_EMBEDDING_DIM = 64
+WORD_PATTERN = re.compile(r"\w+")
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def embedding_text(product):
+    """Bir ürünün vektörleştirilecek metni: ürün adı ve özellikleri."""
+    text = f"{product.get('product_name') or ''} {product.get('features') or ''}".strip()
+    return text[:MAX_EMBEDDING_TEXT_CHARS]
+
+
+def text_digest(model_name, text):
+    """Model adı ve metnin özeti; ikisinden biri değişirse ürün yeniden vektörleştirilir."""
+    return hashlib.blake2b(f"{model_name}\x1f{text}".encode('utf-8'), digest_size=16).hexdigest()
+
+
+# --- VEKTÖRLEŞTİRİCİLER ---
+# Her vektörleştirici model_name özelliğine ve embed_batch(metinler) -> vektörler yöntemine sahiptir.
+
+class GeminiEmbedder:
+    """Gemini text-embedding modeliyle toplu vektör üretir."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, api_key=None, task_type="RETRIEVAL_DOCUMENT"):
+        import google.generativeai as genai
+        api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY bulunamadı.")
+        genai.configure(api_key=api_key)
+        self._embed_content = genai.embed_content
+        self.model_name = model_name
+        self.task_type = task_type
+
+    def embed_batch(self, texts):
+        result = self._embed_content(model=self.model_name, content=list(texts), task_type=self.task_type)
+        return result['embedding']
+
+
+class HashEmbedder:
+    """
+    Metni, kelimelerinin özetleri üzerinden sabit boyutlu bir vektöre çevirir (feature hashing).
+    Ortak kelimeleri olan metinler birbirine yakın düşer; aynı metin her zaman aynı vektörü verir.
+    Testler ve benchmark'lar için ağ gerektirmeyen belirlenimci (deterministic) vektörleştirici.
+    """
+
+    def __init__(self, dim=DEFAULT_HASH_EMBEDDING_DIM):
+        self.dim = dim
+        self.model_name = f"hash-{dim}"
+        self.calls = 0
+
+    def embed_text(self, text):
+        vector = np.zeros(self.dim, dtype=np.float64)
+        for word in WORD_PATTERN.findall(fold_turkish(text)):
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        else:
+            vector[0] = 1.0
+        return vector.tolist()
+
+    def embed_batch(self, texts):
+        self.calls += 1
+        return [self.embed_text(text) for text in texts]
+
+    def __call__(self, model=None, content=None, task_type=None, **kwargs):
+        """genai.embed_content ile uyumlu: liste için vektör listesi, tek metin için tek vektör döner."""
+        self.calls += 1
+        if isinstance(content, str):
+            return {"embedding": self.embed_text(content)}
+        return {"embedding": [self.embed_text(text) for text in content]}
+
+
+EMBEDDERS = {"gemini": GeminiEmbedder, "hash": HashEmbedder}
+
+
+def create_embedder(name):
+    if name not in EMBEDDERS:
+        raise ValueError(f"Bilinmeyen vektörleştirici: {name}")
+    return EMBEDDERS[name]()
+
+
+# --- HIZ SINIRLAYICI VE KONTROL NOKTASI ---
+
+class RateLimiter:
+    """Dakikadaki istek sayısını sınırlayan, iş parçacığı güvenli jeton kovası."""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute
+        self._next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class EmbeddingCheckpoint:
+    """
+    Üretilen ürün vektörlerini (ürün kimliği, metin özeti, vektör) SQLite dosyasında saklar.
+    Her toplu iş ayrı bir işlemle yazılır; süreç çökerse o ana kadar üretilenler korunur.
+    Yalnızca ana iş parçacığından kullanılır.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE_NAME} "
+                         "(product_id TEXT PRIMARY KEY, digest TEXT NOT NULL, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def get(self, product_id, digest):
+        """Metni değişmemiş ürünün kayıtlı vektörünü döndürür; yoksa None."""
+        row = self._db.execute(f"SELECT digest, vector FROM {CHECKPOINT_TABLE_NAME} WHERE product_id = ?",
+                               (product_id,)).fetchone()
+        if not row or row[0] != digest:
+            return None
+        vector = array('f')
+        vector.frombytes(row[1])
+        return vector.tolist()
+
+    def put_many(self, rows):
+        """rows: [(ürün_kimliği, metin_özeti, array('f') vektör)]"""
+        with self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE_NAME} (product_id, digest, vector) "
+                                 "VALUES (?, ?, ?)",
+                                 [(product_id, digest, vector.tobytes())
+                                  for product_id, digest, vector in rows])
+
+    def close(self):
+        self._db.close()
+
+
+# --- VEKTÖR ÜRETİM HATTI ---
+
+class EmbeddingPipeline:
+    """
+    Ham ürünleri akış halinde vektörleştirir ve embedding_vector alanı doldurulmuş olarak geri verir.
+    - Kontrol noktasında metni değişmemiş ürünlerin vektörü yeniden kullanılır; yalnızca yeni veya
+      metni değişmiş ürünler vektörleştiriciye gönderilir.
+    - Metinler batch_size'lık toplu isteklerle, en fazla concurrency eşzamanlı istekle ve
+      (verilirse) dakikada requests_per_minute istekle gönderilir.
+    - Bellekte en fazla 2 * concurrency toplu iş bekler; milyonlarca ürün sabit bellekle işlenir.
+    - Başarısız toplu işler üstel beklemeyle yeniden denenir; yine başarısız olursa ürünleri vektörsüz
+      geçer (veritabanına alınmaz) ve bir sonraki çalıştırmada yeniden denenir.
+    """
+
+    def __init__(self, embedder, checkpoint_path, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                 requests_per_minute=None, max_retries=MAX_RETRIES):
+        self.embedder = embedder
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        self.max_retries = max_retries
+        self.reused = self.embedded = self.failed = self.requests = 0
+
+    def _embed_batch(self, texts):
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                self.requests += 1
+                vectors = self.embedder.embed_batch(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"{len(texts)} metin için {len(vectors)} vektör döndü")
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"HATA: {len(texts)} ürünlük toplu iş vektörleştirilemedi: {e}")
+                    return None
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * (0.5 + random.random() / 2)
+                print(f"UYARI: Vektörleştirme hatası ({e}), {delay:.1f} sn sonra yeniden denenecek.")
+                time.sleep(delay)
+
+    def _complete(self, checkpoint, batch, future):
+        vectors = future.result()
+        if vectors is None:
+            self.failed += len(batch)
+            for product, _ in batch:
+                product.pop('embedding_vector', None)
+                yield product
+            return
+        # Vektörler kontrol noktasındaki gibi float32'ye yuvarlanır; böylece ürünün vektörü (ve veritabanındaki
+        # parmak izi) yeni üretildiği çalıştırmayla kontrol noktasından okunduğu çalıştırmada aynıdır.
+        vectors = [array('f', vector) for vector in vectors]
+        checkpoint.put_many([(product['product_id'], digest, vector)
+                             for (product, digest), vector in zip(batch, vectors)])
+        self.embedded += len(batch)
+        for (product, _), vector in zip(batch, vectors):
+            product['embedding_vector'] = vector.tolist()
+            yield product
+
+    def run(self, products):
+        """products yinelenebilirindeki ürünleri vektörleriyle birlikte döndürür (sıra korunmaz)."""
+        start_time = time.time()
+        checkpoint = EmbeddingCheckpoint(self.checkpoint_path)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="vektor-uretimi")
+        pending, batch, texts = deque(), [], []
+        try:
+            for product in products:
+                text = embedding_text(product)
+                if not product.get('product_id') or not text:
+                    yield product
+                    continue
+                digest = text_digest(self.embedder.model_name, text)
+                vector = checkpoint.get(product['product_id'], digest)
+                if vector is not None:
+                    self.reused += 1
+                    product['embedding_vector'] = vector
+                    yield product
+                    continue
+                batch.append((product, digest))
+                texts.append(text)
+                if len(batch) >= self.batch_size:
+                    pending.append((batch, executor.submit(self._embed_batch, texts)))
+                    batch, texts = [], []
+                    while len(pending) > 2 * self.concurrency:
+                        yield from self._complete(checkpoint, *pending.popleft())
+            if batch:
+                pending.append((batch, executor.submit(self._embed_batch, texts)))
+            while pending:
+                yield from self._complete(checkpoint, *pending.popleft())
+            elapsed = time.time() - start_time
+            print(f"✅ Vektör üretimi: {self.reused} ürün kontrol noktasından, {self.embedded} ürün yeni "
+                  f"vektörleştirildi ({self.requests} istek), {self.failed} ürün başarısız, {elapsed:.2f} sn.")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            checkpoint.close()
@@ -1,14 +1,36 @@
 import chromadb
+import argparse
+import hashlib
 import json
+import os
+import resource
+import shutil
 import sys
+import tempfile
 import time
 import re
+from array import array
+
+from BelgeDeposu import DOCUMENT_STORE_DIRNAME, remove_collection_documents, split_metadata, write_collection_documents
+from DepoSenkronu import BUILD_MANIFEST_FILENAME as MANIFEST_FILENAME, write_sync_manifest
+from FiyatIndeksi import PRICE_INDEX_DIRNAME, PriceIndex
+from VektorKatmani import VECTOR_TIER_DTYPES
+from VektorUretici import (DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, EMBEDDERS, EMBEDDING_CHECKPOINT_FILENAME,
+                           EmbeddingPipeline, create_embedder)
+from Yonlendirici import ROUTER_DIRNAME, CategoryRouter
 
 # --- AYARLAR ---
 INPUT_FILENAME = 'veriler_vektorlu.json'
 DB_PATH = "urun_veritabani"  # Veritabanının kaydedileceği klasör
 # ChromaDB'ye tek seferde gönderilecek maksimum kayıt sayısı.
 DB_BATCH_SIZE = 4096
+# Akış modunda JSON dosyasından tek seferde okunacak karakter sayısı.
+STREAM_CHUNK_SIZE = 1 << 20
+# Akış modunda aynı anda açık tutulacak en fazla kategori ara dosyası sayısı.
+MAX_OPEN_SPILL_FILES = 64
+# Delta modundaki ürün parmak izi manifestosunun (MANIFEST_FILENAME) biçim sürümü.
+# 2: ağır alanlar (özellikler, teklifler) meta veriden belge deposuna taşındı
+MANIFEST_VERSION = 2
 
 
 # --- YARDIMCI FONKSİYONLAR ---
@@ -61,27 +83,358 @@ def get_min_price(product):
         return float('inf')
 
 
-def main():
-    """Ana program fonksiyonu."""
-    print("--- Hiyerarşik Vektör Veritabanı Oluşturma Betiği Başlatıldı ---")
-    start_time = time.time()
+def iter_json_array(filename, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    En üst seviyesi dizi olan bir JSON dosyasındaki elemanları tek tek döndürür.
+    Dosyanın tamamı belleğe alınmaz; yalnızca o an çözülen eleman ve okuma tamponu tutulur.
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, 'r', encoding='utf-8') as f:
+        buffer, position, eof = "", 0, False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        fill()
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position >= len(buffer) or buffer[position] != '[':
+            raise json.JSONDecodeError("JSON dizisi bekleniyordu", buffer, position)
+        position += 1
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','):
+                position += 1
+            if position >= len(buffer):
+                if eof:
+                    raise json.JSONDecodeError("Beklenmeyen dosya sonu", buffer, position)
+                fill()
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end >= len(buffer) and not eof:
+                # Eleman tamponun sonunda bitiyor; devamı olabilir, daha fazla veri okuyup tekrar dene.
+                fill()
+                continue
+            yield item
+            position = end
+            if position > chunk_size:
+                buffer, position = buffer[position:], 0
+
+
+def is_indexable(product):
+    """Veritabanına eklenebilmesi için ürünün kimliği ve vektörü olmalıdır."""
+    return bool(product.get('product_id') and product.get('embedding_vector'))
+
+
+def build_metadata(product, min_price):
+    """Bir ürünün tam meta verisini hazırlar (BelgeDeposu.split_metadata ile indeks ve belge olarak ayrılır)."""
+    return {
+        "product_name": product.get('product_name') or 'N/A',
+        "product_url": f"https://www.akakce.com/p/-{product.get('product_id', '').replace('.html', '')}",
+        "features": product.get('features') or 'N/A',
+        "subcategory": product.get('subcategory') or 'N/A',
+        # En düşük fiyatı meta veriye ekle (sonsuz ise -1 yap)
+        "min_price": min_price if min_price != float('inf') else -1,
+        "offers_json": json.dumps(product.get('offers', []))
+    }
+
+
+def fingerprint_product(embedding, metadata):
+    """
+    Ürünün ChromaDB'ye yazılan her şeyinin (vektör ve indeks meta verisi; min_price dahil)
+    parmak izini çıkarır. Parmak izi değişmeyen ürünler delta modunda yeniden yazılmaz.
+    Belgeler (özellikler, teklifler) her çalıştırmada koleksiyon başına yeniden yazıldığı için parmak izine girmez.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(array('d', embedding).tobytes())
+    digest.update(json.dumps(metadata, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def prepare_collection(category_name, product_list):
+    """
+    Bir kategorinin ürünlerini fiyata göre sıralar ve ChromaDB listelerini hazırlar.
+    Her ürünün en düşük fiyatı yalnızca bir kez hesaplanır.
+    Dönüş: (koleksiyon_adı, kimlikler, vektörler, meta veriler, belgeler, parmak izleri)
+    """
+    priced_products = sorted(((get_min_price(p), p) for p in product_list), key=lambda item: item[0])
+    ids_list = [p['product_id'].replace('.html', '') for _, p in priced_products]
+    embeddings_list = [p['embedding_vector'] for _, p in priced_products]
+    metadata_list, document_list = [], []
+    for min_fiyat, p in priced_products:
+        index_metadata, document = split_metadata(build_metadata(p, min_fiyat))
+        metadata_list.append(index_metadata)
+        document_list.append(document)
+    fingerprint_list = [fingerprint_product(e, m) for e, m in zip(embeddings_list, metadata_list)]
+    return (sanitize_collection_name(category_name), ids_list, embeddings_list, metadata_list, document_list,
+            fingerprint_list)
 
+
+def prepare_collection_from_spill(category_name, spill_filename):
+    """Bir kategorinin ara dosyasını okuyup koleksiyon listelerini hazırlar; dosya okunduktan sonra silinir."""
+    with open(spill_filename, 'r', encoding='utf-8') as f:
+        product_list = [json.loads(line) for line in f]
+    os.remove(spill_filename)
+    return prepare_collection(category_name, product_list)
+
+
+def load_manifest(db_path):
+    """
+    Önceki çalıştırmanın parmak izi manifestosunu okur: {koleksiyon: {ürün_kimliği: parmak_izi}}.
+    Manifesto yoksa, okunamıyorsa veya farklı bir sürümle yazılmışsa None döner.
+    """
+    manifest_filename = os.path.join(db_path, MANIFEST_FILENAME)
+    try:
+        with open(manifest_filename, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError:
+        print(f"UYARI: '{manifest_filename}' okunamadı.")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest.get("collections", {})
+
+
+def save_manifest(db_path, collections):
+    """Manifestoyu önce geçici dosyaya yazar, sonra atomik olarak yerine taşır."""
+    manifest_filename = os.path.join(db_path, MANIFEST_FILENAME)
+    temp_filename = f"{manifest_filename}.tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as f:
+        json.dump({"version": MANIFEST_VERSION, "collections": collections}, f)
+    os.replace(temp_filename, manifest_filename)
+
+
+class DatabaseWriter:
+    """
+    Hazırlanmış koleksiyonları ChromaDB'ye yazan tek yazıcı.
+    Tam modda koleksiyonlar silinip yeniden oluşturulur. Delta modunda yalnızca parmak izi
+    değişen veya yeni ürünler upsert edilir, artık bulunmayan ürünler ve koleksiyonlar silinir.
+    Ürün belgeleri, koleksiyon başarıyla yazıldıktan sonra belge deposuna yazılır.
+    """
+
+    def __init__(self, client, db_path, delta=False):
+        self.client = client
+        self.db_path = db_path
+        self.document_dir = os.path.join(db_path, DOCUMENT_STORE_DIRNAME)
+        self.delta = delta
+        self.existing_collections = {c.name for c in client.list_collections()}
+        self.previous_manifest = load_manifest(db_path) if delta else {}
+        if self.previous_manifest is None:
+            if self.existing_collections:
+                # Upsert eski meta veri alanlarını silmez; eski düzendeki koleksiyonlar baştan yazılmalı.
+                print("UYARI: Geçerli bir parmak izi manifestosu yok, koleksiyonlar baştan yazılacak.")
+                self.delta = False
+            self.previous_manifest = {}
+        self.manifest = {}
+        self.upserted = self.deleted = self.unchanged = 0
+
+    def write(self, collection_name, ids_list, embeddings_list, metadata_list, document_list, fingerprint_list):
+        """Bir koleksiyonu yazar; veritabanına gönderilen ürün sayısını döndürür."""
+        fingerprints = dict(zip(ids_list, fingerprint_list))
+        if self.delta:
+            written = self._write_delta(collection_name, ids_list, embeddings_list, metadata_list, fingerprints)
+        else:
+            written = self._write_full(collection_name, ids_list, embeddings_list, metadata_list)
+        if written is not None:
+            write_collection_documents(self.document_dir, collection_name, ids_list, document_list)
+            self.manifest[collection_name] = fingerprints
+        elif collection_name in self.previous_manifest:
+            # Yazılamayan koleksiyonun eski kaydı korunur; bir sonraki çalıştırmada yeniden denenir.
+            self.manifest[collection_name] = self.previous_manifest[collection_name]
+        return written or 0
+
+    def _write_full(self, collection_name, ids_list, embeddings_list, metadata_list):
+        try:
+            if collection_name in self.existing_collections:
+                self.client.delete_collection(name=collection_name)
+            collection = self.client.create_collection(name=collection_name)
+            self.existing_collections.add(collection_name)
+        except Exception as e:
+            print(f"HATA: '{collection_name}' koleksiyonu oluşturulamadı: {e}")
+            return None
+        self._add_in_batches(collection.add, collection_name, ids_list, embeddings_list, metadata_list)
+        self.upserted += len(ids_list)
+        return len(ids_list)
+
+    def _write_delta(self, collection_name, ids_list, embeddings_list, metadata_list, fingerprints):
+        try:
+            collection = self.client.get_or_create_collection(name=collection_name)
+        except Exception as e:
+            print(f"HATA: '{collection_name}' koleksiyonu açılamadı: {e}")
+            return None
+        if collection_name not in self.existing_collections:
+            previous = {}
+        elif collection_name in self.previous_manifest:
+            previous = self.previous_manifest[collection_name]
+        else:
+            # Manifestosu olmayan mevcut koleksiyon: içindeki ürünlerin tamamı değişmiş sayılır.
+            previous = dict.fromkeys(collection.get(include=[])['ids'])
+        self.existing_collections.add(collection_name)
+
+        changed = [i for i, product_id in enumerate(ids_list) if previous.get(product_id) != fingerprints[product_id]]
+        removed = [product_id for product_id in previous if product_id not in fingerprints]
+        if changed:
+            self._add_in_batches(collection.upsert, collection_name, [ids_list[i] for i in changed],
+                                 [embeddings_list[i] for i in changed], [metadata_list[i] for i in changed])
+        for i in range(0, len(removed), DB_BATCH_SIZE):
+            collection.delete(ids=removed[i:i + DB_BATCH_SIZE])
+        print(f"-> '{collection_name}': {len(changed)} ürün güncellendi/eklendi, {len(removed)} ürün silindi, "
+              f"{len(ids_list) - len(changed)} ürün değişmedi.")
+        self.upserted += len(changed)
+        self.deleted += len(removed)
+        self.unchanged += len(ids_list) - len(changed)
+        return len(changed) + len(removed)
+
+    def _add_in_batches(self, method, collection_name, ids_list, embeddings_list, metadata_list):
+        total_items = len(ids_list)
+        for i in range(0, total_items, DB_BATCH_SIZE):
+            end_index = min(i + DB_BATCH_SIZE, total_items)
+            method(
+                ids=ids_list[i:end_index],
+                embeddings=embeddings_list[i:end_index],
+                metadatas=metadata_list[i:end_index]
+            )
+            print(f"-> {end_index} / {total_items} ürün '{collection_name}' koleksiyonuna yazıldı...")
+
+    def finish(self):
+        """Delta modunda artık veride bulunmayan koleksiyonları siler ve manifestoyu kaydeder."""
+        if self.delta:
+            for collection_name in set(self.previous_manifest) - set(self.manifest):
+                if collection_name in self.existing_collections:
+                    self.client.delete_collection(name=collection_name)
+                    remove_collection_documents(self.document_dir, collection_name)
+                    self.deleted += len(self.previous_manifest[collection_name])
+                    print(f"-> '{collection_name}' koleksiyonu artık veride olmadığı için silindi.")
+            print(f"-> Delta özeti: {self.upserted} upsert, {self.deleted} silme, {self.unchanged} değişmeyen ürün.")
+        save_manifest(self.db_path, self.manifest)
+
+
+def spill_products_by_category(products, spill_dir):
+    """
+    Akış halindeki ürünleri her kategori için ayrı bir JSON Lines ara dosyasına yazar.
+    Dönüş: ({kategori: (dosya_adı, ürün_sayısı)}, okunan_kayıt_sayısı, atlanan_kayıt_sayısı)
+    """
+    spill_files, open_files = {}, {}
+    total_records = skipped_records = 0
+    try:
+        for product in products:
+            total_records += 1
+            if not is_indexable(product):
+                skipped_records += 1
+                continue
+            subcategory = product.get('subcategory') or "Diğer"
+            if subcategory not in spill_files:
+                filename = os.path.join(spill_dir, f"{len(spill_files):05d}.jsonl")
+                spill_files[subcategory] = [filename, 0]
+            handle = open_files.pop(subcategory, None)
+            if handle is None:
+                if len(open_files) >= MAX_OPEN_SPILL_FILES:
+                    # En uzun süredir kullanılmayan dosyayı kapat
+                    oldest = next(iter(open_files))
+                    open_files.pop(oldest).close()
+                handle = open(spill_files[subcategory][0], 'a', encoding='utf-8')
+            open_files[subcategory] = handle
+            handle.write(json.dumps(product, ensure_ascii=False))
+            handle.write('\n')
+            spill_files[subcategory][1] += 1
+    finally:
+        for handle in open_files.values():
+            handle.close()
+    return {category: tuple(info) for category, info in spill_files.items()}, total_records, skipped_records
+
+
+def peak_memory_mb():
+    """Bu sürecin en yüksek bellek kullanımını (MB) döndürür."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report_skipped(skipped_count):
+    if skipped_count:
+        print(f"UYARI: Kimliği veya vektörü olmayan {skipped_count} ürün atlandı.")
+
+
+def report_stage(stage_name, item_count, elapsed, unit="ürün"):
+    rate = item_count / elapsed if elapsed > 0 else float('inf')
+    print(f"-> [{stage_name}] {item_count} {unit}, {elapsed:.2f} sn, {rate:.0f} {unit}/sn | "
+          f"En yüksek bellek: {peak_memory_mb():.0f} MB")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Ürün verilerinden kategori bazlı vektör veritabanı oluşturur.")
+    parser.add_argument("--input", default=INPUT_FILENAME, help="Vektörlü ürün verilerini içeren JSON dosyası")
+    parser.add_argument("--db-path", default=DB_PATH, help="Veritabanının kaydedileceği klasör")
+    parser.add_argument("--stream", action="store_true",
+                        help="Girdiyi akış halinde oku; kategorileri ara dosyalardan tek tek hazırla")
+    parser.add_argument("--delta", action="store_true",
+                        help="Koleksiyonları yeniden oluşturmak yerine yalnızca değişen ürünleri yaz")
+    parser.add_argument("--vector-tier", choices=VECTOR_TIER_DTYPES, default=None,
+                        help="Fiyat indeksine fiyat aralığı aramalarında kaba aday seçimi için nicemlenmiş "
+                             "vektör katmanı ekle")
+    parser.add_argument("--embed", choices=sorted(EMBEDDERS), default=None,
+                        help="Girdideki ham ürünleri bu vektörleştiriciyle vektörleştirerek yaz "
+                             "(yalnızca yeni veya metni değişen ürünler vektörleştirilir)")
+    parser.add_argument("--embedding-checkpoint", default=EMBEDDING_CHECKPOINT_FILENAME,
+                        help="Üretilen vektörlerin saklandığı kontrol noktası dosyası")
+    parser.add_argument("--embed-batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Vektörleştirici isteği başına metin sayısı")
+    parser.add_argument("--embed-concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Eşzamanlı vektörleştirici isteği sayısı")
+    parser.add_argument("--embed-rpm", type=int, default=None,
+                        help="Dakikadaki en fazla vektörleştirici isteği sayısı")
+    return parser.parse_args()
+
+
+def create_embedding_pipeline(args):
+    """--embed verilmişse vektör üretim hattını oluşturur; verilmemişse girdideki vektörler kullanılır."""
+    if not args.embed:
+        return None
+    try:
+        embedder = create_embedder(args.embed)
+    except Exception as e:
+        sys.exit(f"HATA: Vektörleştirici başlatılamadı: {e}")
+    return EmbeddingPipeline(embedder, args.embedding_checkpoint, batch_size=args.embed_batch_size,
+                             concurrency=args.embed_concurrency, requests_per_minute=args.embed_rpm)
+
+
+def run_in_memory(args, writer, pipeline=None):
+    """Klasik mod: tüm dosyayı belleğe yükler ve kategorileri sırayla işler."""
     # BÖLÜM 1: VERİYİ YÜKLEME
-    print(f"\n[BÖLÜM 1] '{INPUT_FILENAME}' dosyasından ürün verileri okunuyor...")
+    print(f"\n[BÖLÜM 1] '{args.input}' dosyasından ürün verileri okunuyor...")
+    stage_start = time.time()
     try:
-        with open(INPUT_FILENAME, 'r', encoding='utf-8') as f:
+        with open(args.input, 'r', encoding='utf-8') as f:
             products = json.load(f)
-        print(f"-> Başarılı: '{INPUT_FILENAME}' dosyasından {len(products)} kayıt okundu.")
+        print(f"-> Başarılı: '{args.input}' dosyasından {len(products)} kayıt okundu.")
     except FileNotFoundError:
-        sys.exit(f"HATA: Girdi dosyası '{INPUT_FILENAME}' bulunamadı.")
+        sys.exit(f"HATA: Girdi dosyası '{args.input}' bulunamadı.")
     except json.JSONDecodeError:
-        sys.exit(f"HATA: '{INPUT_FILENAME}' dosyası geçerli bir JSON formatında değil.")
+        sys.exit(f"HATA: '{args.input}' dosyası geçerli bir JSON formatında değil.")
+    report_stage("Okuma", len(products), time.time() - stage_start)
+    if pipeline is not None:
+        stage_start = time.time()
+        products = list(pipeline.run(products))
+        report_stage("Vektörleştirme", len(products), time.time() - stage_start)
 
     # BÖLÜM 2: ÜRÜNLERİ KATEGORİLERE GÖRE GRUPLAMA
     print("\n[BÖLÜM 2] Ürünler alt kategorilere göre gruplanıyor...")
     categorized_products = {}
+    skipped_count = 0
     for product in products:
-        if not product.get('product_id') or not product.get('embedding_vector'):
+        if not is_indexable(product):
+            skipped_count += 1
             continue
 
         subcategory = product.get('subcategory') or "Diğer"
@@ -89,66 +442,95 @@ def main():
             categorized_products[subcategory] = []
         categorized_products[subcategory].append(product)
 
+    report_skipped(skipped_count)
     print(f"-> {len(categorized_products)} adet benzersiz alt kategori bulundu.")
 
     # BÖLÜM 3: HER KATEGORİ İÇİN VERİTABANI OLUŞTURMA VE DOLDURMA
     print("\n[BÖLÜM 3] Her kategori için ayrı koleksiyonlar oluşturuluyor ve dolduruluyor...")
-    client = chromadb.PersistentClient(path=DB_PATH)
-
+    stage_start = time.time()
+    written = 0
     for category_name, product_list in categorized_products.items():
-        collection_name = sanitize_collection_name(category_name)
-        print(f"\n--- İşleniyor: '{category_name}' -> Koleksiyon: '{collection_name}' ({len(product_list)} ürün) ---")
+        prepared = prepare_collection(category_name, product_list)
+        print(f"\n--- İşleniyor: '{category_name}' -> Koleksiyon: '{prepared[0]}' ({len(product_list)} ürün) ---")
+        written += writer.write(*prepared)
+    report_stage("Yazma", written, time.time() - stage_start)
+    return len(categorized_products)
+
 
-        # Koleksiyonu temizle ve yeniden oluştur
+def run_streaming(args, writer, pipeline=None):
+    """
+    Akış modu: girdi dosyası parça parça okunur ve ürünler kategori ara dosyalarına aktarılır.
+    Vektör üretim hattı verilmişse ürünler okunurken vektörleştirilir.
+    Bellekte aynı anda yalnızca bir kategori tutulur. Kategoriler sırayla hazırlanıp yazılır: süreyi
+    ChromaDB yazması belirler (hazırlık, yazmanın ~%5'i); hazırlığı paralelleştirmek kazanç sağlamaz.
+    """
+    spill_dir = tempfile.mkdtemp(prefix="urun_kategorileri_")
+    try:
+        # BÖLÜM 1: AKIŞ HALİNDE OKUMA VE KATEGORİLERE AYIRMA
+        print(f"\n[BÖLÜM 1] '{args.input}' dosyası akış halinde okunup kategorilere ayrılıyor...")
+        stage_start = time.time()
+        products = iter_json_array(args.input)
+        if pipeline is not None:
+            products = pipeline.run(products)
         try:
-            if collection_name in [c.name for c in client.list_collections()]:
-                client.delete_collection(name=collection_name)
-            collection = client.create_collection(name=collection_name)
-        except Exception as e:
-            print(f"HATA: '{collection_name}' koleksiyonu oluşturulamadı: {e}")
-            continue
+            spill_files, total_records, skipped_count = spill_products_by_category(products, spill_dir)
+        except FileNotFoundError:
+            sys.exit(f"HATA: Girdi dosyası '{args.input}' bulunamadı.")
+        except json.JSONDecodeError:
+            sys.exit(f"HATA: '{args.input}' dosyası geçerli bir JSON formatında değil.")
+        report_stage("Okuma ve ayırma", total_records, time.time() - stage_start, unit="kayıt")
+        report_skipped(skipped_count)
+        print(f"-> {len(spill_files)} adet benzersiz alt kategori bulundu.")
 
-        # Ürünleri fiyata göre sırala
-        sorted_products = sorted(product_list, key=get_min_price)
-
-        # ChromaDB için listeleri hazırla
-        ids_list = [p['product_id'].replace('.html', '') for p in sorted_products]
-        embeddings_list = [p['embedding_vector'] for p in sorted_products]
-
-        metadata_list = []
-        for p in sorted_products:
-            min_fiyat = get_min_price(p)
-            metadata = {
-                "product_name": p.get('product_name') or 'N/A',
-                "product_url": f"https://www.akakce.com/p/-{p.get('product_id', '').replace('.html', '')}",
-                "features": p.get('features') or 'N/A',
-                "subcategory": p.get('subcategory') or 'N/A',
-                # En düşük fiyatı meta veriye ekle (sonsuz ise -1 yap)
-                "min_price": min_fiyat if min_fiyat != float('inf') else -1,
-                "offers_json": json.dumps(p.get('offers', []))
-            }
-            metadata_list.append(metadata)
-
-        # Verileri gruplar halinde veritabanına ekle
-        total_items = len(ids_list)
-        for i in range(0, total_items, DB_BATCH_SIZE):
-            end_index = min(i + DB_BATCH_SIZE, total_items)
+        # BÖLÜM 2-3: KATEGORİLERİ HAZIRLAMA VE DOLDURMA
+        print("\n[BÖLÜM 2] Kategoriler ara dosyalardan hazırlanıp veritabanına yazılıyor...")
+        stage_start = time.time()
+        written, prepare_seconds = 0, 0.0
+        for category_name, (spill_filename, _) in spill_files.items():
+            prepare_start = time.time()
+            prepared = prepare_collection_from_spill(category_name, spill_filename)
+            elapsed = time.time() - prepare_start
+            prepare_seconds += elapsed
+            print(f"\n--- İşleniyor: '{category_name}' -> Koleksiyon: '{prepared[0]}' "
+                  f"({len(prepared[1])} ürün, hazırlık {elapsed:.2f} sn) ---")
+            written += writer.write(*prepared)
+        report_stage("Hazırlama", written, prepare_seconds)
+        report_stage("Hazırlama ve yazma", written, time.time() - stage_start)
+        return len(spill_files)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
 
-            batch_ids = ids_list[i:end_index]
-            batch_embeddings = embeddings_list[i:end_index]
-            batch_metadatas = metadata_list[i:end_index]
 
-            collection.add(
-                ids=batch_ids,
-                embeddings=batch_embeddings,
-                metadatas=batch_metadatas
-            )
-            print(f"-> {end_index} / {total_items} ürün '{collection_name}' koleksiyonuna eklendi...")
+def main():
+    """Ana program fonksiyonu."""
+    args = parse_arguments()
+    print("--- Hiyerarşik Vektör Veritabanı Oluşturma Betiği Başlatıldı ---")
+    start_time = time.time()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    writer = DatabaseWriter(client, args.db_path, delta=args.delta)
+    pipeline = create_embedding_pipeline(args)
+    if args.stream:
+        collection_count = run_streaming(args, writer, pipeline)
+    else:
+        collection_count = run_in_memory(args, writer, pipeline)
+    writer.finish()
+    # Fiyat indeksini, API süreçlerinin mmap ile paylaşabilmesi için veritabanıyla birlikte kaydet
+    price_index_dir = os.path.join(args.db_path, PRICE_INDEX_DIRNAME)
+    shutil.rmtree(price_index_dir, ignore_errors=True)
+    PriceIndex.build(client, vector_dtype=args.vector_tier).save(price_index_dir)
+    # Kategori belirtilmemiş sorgular için koleksiyon yönlendiricisi
+    router_dir = os.path.join(args.db_path, ROUTER_DIRNAME)
+    shutil.rmtree(router_dir, ignore_errors=True)
+    CategoryRouter.build(client).save(router_dir)
+    # API'nin yalnızca değişen dosyaları indirebilmesi için dosya özetlerini kaydet
+    write_sync_manifest(args.db_path)
 
     end_time = time.time()
     print("\n--- Tüm işlemler başarıyla tamamlandı! ---")
-    print(f"Toplam {len(categorized_products)} adet koleksiyon oluşturuldu/güncellendi.")
+    print(f"Toplam {collection_count} adet koleksiyon oluşturuldu/güncellendi.")
     print(f"Toplam süre: {int(end_time - start_time)} saniye")
+    print(f"En yüksek bellek kullanımı: {peak_memory_mb():.0f} MB")
 
 
 if __name__ == "__main__":
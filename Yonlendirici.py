@@ -0,0 +1,90 @@
+import os
+import time
+
+import numpy as np
+
+# --- AYARLAR ---
+# Yönlendirici dosyalarının veritabanı klasöründeki yeri
+ROUTER_DIRNAME = "kategori_yonlendirici"
+ROUTER_COLUMNS = ("names", "centroids")
+# Kuruluşta vektörler bu büyüklükte sayfalar halinde okunur
+ROUTER_PAGE_SIZE = 5000
+
+
+# --- YARDIMCI FONKSİYONLAR ---
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# --- YÖNLENDİRİCİ ---
+
+class CategoryRouter:
+    """
+    Kategori belirtilmemiş sorguları en olası koleksiyonlara yönlendirir.
+    Her koleksiyon, birim uzunluğa getirilmiş ürün vektörlerinin merkeziyle temsil edilir;
+    yönlendirme tek bir matris-vektör çarpımıdır, koleksiyonların kendisine dokunulmaz.
+    (Tek tek örnek ürünlerle temsil, gürültülü ürünlerin öne geçmesine yol açtığı için kullanılmaz.)
+    """
+
+    def __init__(self, names, centroids):
+        self.names = names
+        self.centroids = centroids
+
+    @classmethod
+    def build(cls, client):
+        """Koleksiyonlardaki ürün vektörlerini sayfa sayfa okuyarak merkezleri hesaplar."""
+        start_time = time.time()
+        names, centroids = [], []
+        for collection in sorted(client.list_collections(), key=lambda c: c.name):
+            total, offset = None, 0
+            while True:
+                page = collection.get(include=['embeddings'], limit=ROUTER_PAGE_SIZE, offset=offset)
+                if not len(page['ids']):
+                    break
+                page_sum = _normalize_rows(np.asarray(page['embeddings'], dtype=np.float64)).sum(axis=0)
+                total = page_sum if total is None else total + page_sum
+                offset += len(page['ids'])
+            if total is not None:
+                names.append(collection.name)
+                centroids.append(total)
+        router = cls(np.asarray(names, dtype=str),
+                     _normalize_rows(np.asarray(centroids, dtype=np.float64)).astype(np.float32) if centroids
+                     else np.zeros((0, 0), dtype=np.float32))
+        print(f"✅ Kategori yönlendiricisi oluşturuldu: {len(names)} koleksiyon, {router.nbytes / 1024:.0f} KB, "
+              f"{time.time() - start_time:.2f} sn.")
+        return router
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def nbytes(self):
+        return self.names.nbytes + self.centroids.nbytes
+
+    def route(self, query_embedding, k):
+        """Sorgu vektörüne en yakın k koleksiyonu kosinüs benzerlikleriyle döndürür: [(koleksiyon_adı, benzerlik)]."""
+        if not len(self.names) or k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.centroids @ (query / norm if norm else query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(str(self.names[i]), float(scores[i])) for i in top]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for column in ROUTER_COLUMNS:
+            np.save(os.path.join(directory, f"{column}.npy"), getattr(self, column))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Kaydedilmiş yönlendiriciyi açar; klasör yoksa None döner."""
+        if not os.path.isdir(directory):
+            return None
+        return cls(*(np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r' if mmap else None)
+                     for column in ROUTER_COLUMNS))
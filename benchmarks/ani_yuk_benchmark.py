@@ -0,0 +1,111 @@
+"""
+Ani yük (kampanya bağlantısı) benchmark'ı.
+Aynı sorguyu aynı anda gönderen çok sayıda kullanıcıyı API.get_best_product_match üzerinde benzetir ve
+arama birleştirme / kısa süreli sonuç önbelleği kapalı, yalnızca birleştirme ve birleştirme + önbellek
+durumlarında vektörleştirici çağrısı, koleksiyon sorgusu sayısı ve gecikmeleri karşılaştırır.
+Vektörleştiriciye Gemini'ye benzer bir gecikme eklenir.
+
+Kullanım: python benchmarks/ani_yuk_benchmark.py [--users 64] [--waves 3] [--embed-latency-ms 120]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from Onbellek import CoalescingCache  # noqa: E402
+from chat_yuk_testi import percentile, prepare_database, start_api  # noqa: E402
+from yerel_servisler import HashEmbedder  # noqa: E402
+
+QUERIES = ["en ucuz {category}", "{category} önerir misin", "fiyat performans {category}"]
+WAVE_INTERVAL = 1.0
+
+
+class SlowEmbedder(HashEmbedder):
+    """Her çağrıda ağ gecikmesini benzeten vektörleştirici."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def __call__(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().__call__(*args, **kwargs)
+
+
+def run_wave(api, query, users):
+    """users kullanıcının aynı sorguyu aynı anda göndermesi; her isteğin gecikmesini (ms) döndürür."""
+    barrier = threading.Barrier(users)
+
+    def request():
+        barrier.wait()
+        start = time.perf_counter()
+        product, _ = api.get_best_product_match(api.CLIENT, api.extract_query_details(query))
+        assert product is not None
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        return list(executor.map(lambda _: request(), range(users)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=64, help="Aynı anda aynı sorguyu gönderen kullanıcı sayısı")
+    parser.add_argument("--waves", type=int, default=3, help=f"{WAVE_INTERVAL:.0f} sn arayla tekrarlanan dalga sayısı")
+    parser.add_argument("--embed-latency-ms", type=float, default=120)
+    parser.add_argument("--products", type=int, default=500, help="Kategori başına ürün sayısı")
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    # start_api'nin beklediği sunucu ve sahte model ayarları
+    args.server, args.tokens, args.token_delay_ms, args.first_token_ms, args.vector_tier = "flask", 1, 0, 0, None
+
+    work_dir = tempfile.mkdtemp(prefix="ani_yuk_benchmark_")
+    embedder = SlowEmbedder(args.embed_latency_ms / 1000)
+    categories, source_db_path = prepare_database(args, work_dir, embedder)
+    _, stop_server = start_api(args, work_dir, source_db_path, embedder)
+    import API
+
+    searches = {"count": 0}
+    search_collection = API.search_collection
+
+    def counting_search_collection(*search_args):
+        searches["count"] += 1
+        return search_collection(*search_args)
+
+    API.search_collection = counting_search_collection
+    modes = [("kapalı", None), ("yalnızca birleştirme", 0), ("birleştirme + 30 sn önbellek", 30)]
+    try:
+        print(f"\n{args.users} eşzamanlı kullanıcı x {args.waves} dalga, vektörleştirici gecikmesi "
+              f"{args.embed_latency_ms:.0f} ms\n")
+        print(f"{'mod':<30}{'vektör çağrısı':>15}{'koleksiyon sorgusu':>20}{'p50 ms':>9}{'p95 ms':>9}")
+        for label, ttl in modes:
+            API.SEARCH_CACHE = CoalescingCache(max_size=API.SEARCH_CACHE_SIZE, ttl_seconds=ttl) \
+                if ttl is not None else None
+            latencies, embed_calls, search_calls = [], 0, 0
+            for query_template in QUERIES:
+                query = query_template.format(category=categories[0])
+                API.EMBEDDING_CACHE.memory.clear()
+                embedder.calls, searches["count"] = 0, 0
+                for wave in range(args.waves):
+                    if wave:
+                        time.sleep(WAVE_INTERVAL)
+                    latencies.extend(run_wave(API, query, args.users))
+                embed_calls += embedder.calls
+                search_calls += searches["count"]
+            print(f"{label:<30}{embed_calls:>15}{search_calls:>20}{statistics.median(latencies):>9.1f}"
+                  f"{percentile(latencies, 0.95):>9.1f}")
+        print(f"\n(İstek sayısı: {len(QUERIES) * args.waves * args.users}; "
+              f"vektör önbelleği her sorgudan önce boşaltılır, dalgalar arasında korunur.)")
+    finally:
+        stop_server()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Belge deposu benchmark'ı.
+Ağır alanların (özellikler, teklifler) ChromaDB meta verisinde tutulduğu eski düzen ile
+yalnızca filtrelenen alanların ChromaDB'de, geri kalanının BelgeDeposu'nda tutulduğu yeni düzeni
+aynı sentetik katalog üzerinde karşılaştırır: diskteki boyut, meta verili collection.query süresi
+ve seçilen ürünün belge deposundan tamamlanma süresi.
+
+Kullanım: python benchmarks/belge_deposu_benchmark.py [--categories 4] [--products 2000] [--feature-chars 2000]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import chromadb
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from BelgeDeposu import DOCUMENT_STORE_DIRNAME, ProductDocumentStore, split_metadata, write_collection_documents  # noqa: E402
+from VeriTabanı import DB_BATCH_SIZE, build_metadata, get_min_price, sanitize_collection_name  # noqa: E402
+from chat_yuk_testi import percentile  # noqa: E402
+from yerel_servisler import FEATURE_WORDS, HashEmbedder, build_synthetic_catalogue  # noqa: E402
+
+CATEGORIES = ["Buzdolabı", "Çamaşır Makinesi", "Televizyon", "Laptop", "Süpürge", "Klima", "Fırın", "Kulaklık"]
+N_RESULTS = (20, 50)
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def lengthen_features(products, feature_chars, seed=7):
+    """Sentetik özellik metinlerini gerçek ürün sayfalarındaki uzunluğa yaklaştırır."""
+    rng = random.Random(seed)
+    for product in products:
+        words = [product['features']]
+        length = len(product['features'])
+        while length < feature_chars:
+            word = f"{rng.choice(FEATURE_WORDS)}: {rng.randint(1, 9999)}"
+            words.append(word)
+            length += len(word) + 1
+        product['features'] = " ".join(words)
+
+
+def build_database(db_path, products_by_category, split):
+    """Kataloğu verilen düzende yazar; split=True ise ağır alanlar belge deposuna ayrılır."""
+    client = chromadb.PersistentClient(path=db_path)
+    for category, products in products_by_category.items():
+        collection_name = sanitize_collection_name(category)
+        collection = client.create_collection(name=collection_name)
+        ids_list = [p['product_id'].replace('.html', '') for p in products]
+        embeddings_list = [p['embedding_vector'] for p in products]
+        metadata_list = [build_metadata(p, get_min_price(p)) for p in products]
+        if split:
+            metadata_list, document_list = map(list, zip(*(split_metadata(m) for m in metadata_list)))
+            write_collection_documents(os.path.join(db_path, DOCUMENT_STORE_DIRNAME), collection_name,
+                                       ids_list, document_list)
+        for i in range(0, len(ids_list), DB_BATCH_SIZE):
+            collection.add(ids=ids_list[i:i + DB_BATCH_SIZE], embeddings=embeddings_list[i:i + DB_BATCH_SIZE],
+                           metadatas=metadata_list[i:i + DB_BATCH_SIZE])
+    return client
+
+
+def time_queries(client, queries, n_results, repeat):
+    """Her sorgu için meta verili collection.query süresini ölçer (ms)."""
+    samples = []
+    for _ in range(repeat):
+        for collection_name, embedding in queries:
+            collection = client.get_collection(name=collection_name)
+            start = time.perf_counter()
+            collection.query(query_embeddings=[embedding], n_results=n_results, include=['metadatas', 'distances'])
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def time_hydration(client, db_path, queries):
+    """Yeni düzende ilk sonucun belge deposundan tamamlanma süresini ölçer (µs)."""
+    store = ProductDocumentStore(os.path.join(db_path, DOCUMENT_STORE_DIRNAME))
+    samples = []
+    for collection_name, embedding in queries:
+        result = client.get_collection(name=collection_name).query(query_embeddings=[embedding], n_results=1,
+                                                                   include=['metadatas'])
+        product = dict(result['metadatas'][0][0], product_id=result['ids'][0][0], collection=collection_name)
+        start = time.perf_counter()
+        hydrated = store.hydrate(product)
+        samples.append((time.perf_counter() - start) * 1e6)
+        assert 'offers_json' in hydrated and 'features' in hydrated
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--products", type=int, default=2000, help="Kategori başına ürün sayısı")
+    parser.add_argument("--feature-chars", type=int, default=2000, help="Ürün başına yaklaşık özellik metni uzunluğu")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    embedder = HashEmbedder()
+    categories = CATEGORIES[:args.categories]
+    products = build_synthetic_catalogue(categories, args.products, embedder)
+    lengthen_features(products, args.feature_chars)
+    products_by_category = {}
+    for product in products:
+        products_by_category.setdefault(product['subcategory'], []).append(product)
+    rng = random.Random(1)
+    queries = [(sanitize_collection_name(category), embedder.embed_text(" ".join(rng.choices(FEATURE_WORDS, k=4))))
+               for category in rng.choices(categories, k=args.queries)]
+
+    work_dir = tempfile.mkdtemp(prefix="belge_deposu_benchmark_")
+    try:
+        results = {}
+        for label, split in (("eski (tam meta veri)", False), ("yeni (belge deposu)", True)):
+            db_path = os.path.join(work_dir, "yeni" if split else "eski")
+            start = time.perf_counter()
+            client = build_database(db_path, products_by_category, split)
+            build_seconds = time.perf_counter() - start
+            time_queries(client, queries[:10], N_RESULTS[0], 1)  # ısınma
+            results[label] = {
+                "build": build_seconds,
+                "size": directory_size(db_path),
+                "documents": directory_size(os.path.join(db_path, DOCUMENT_STORE_DIRNAME)) if split else 0,
+                "queries": {n: time_queries(client, queries, n, args.repeat) for n in N_RESULTS},
+                "hydrate": time_hydration(client, db_path, queries) if split else None,
+            }
+        print(f"Ürün sayısı: {len(products)} ({len(categories)} kategori), "
+              f"ortalama özellik uzunluğu: {statistics.mean(len(p['features']) for p in products):.0f} karakter")
+        for label, result in results.items():
+            print(f"\n{label}")
+            print(f"  Yazma süresi          : {result['build']:.2f} sn")
+            print(f"  Diskteki boyut        : {result['size'] / 2 ** 20:.1f} MB"
+                  + (f" (belge deposu {result['documents'] / 2 ** 20:.1f} MB)" if result['documents'] else ""))
+            for n, samples in result['queries'].items():
+                print(f"  query n={n:<3} meta veri : p50 {statistics.median(samples):.2f} ms, "
+                      f"p95 {percentile(samples, 0.95):.2f} ms")
+            if result['hydrate']:
+                print(f"  Belge tamamlama       : p50 {statistics.median(result['hydrate']):.1f} µs, "
+                      f"p95 {percentile(result['hydrate'], 0.95):.1f} µs")
+        old, new = results.values()
+        print(f"\nBoyut oranı (yeni/eski): {new['size'] / old['size']:.2f}")
+        for n in N_RESULTS:
+            print(f"query n={n} hızlanma    : "
+                  f"{statistics.median(old['queries'][n]) / statistics.median(new['queries'][n]):.2f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
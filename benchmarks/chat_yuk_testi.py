@@ -0,0 +1,282 @@
+"""
+/chat uçtan uca yük testi; canlı Google servisleri gerektirmez.
+
+Sentetik bir kataloğu VeriTabanı.py ile veritabanına dönüştürür, API'yi yerel sahtelerle
+(HashEmbedder, FakeStreamingModel, bellek içi konuşma geçmişi, bucket yerine yerel klasör) başlatır
+ve /chat'e eşzamanlı istekler gönderir. Her arama türü için p50/p95/p99 gecikme, ilk token süresi
+(TTFT) ve saniyedeki istek sayısı raporlanır.
+
+Kullanım:
+    python benchmarks/chat_yuk_testi.py [--requests 400] [--concurrency 16] [--server flask|async]
+    python benchmarks/chat_yuk_testi.py --json-output sonuc.json
+    python benchmarks/chat_yuk_testi.py --baseline sonuc.json [--tolerance 0.2]   # gerilemede çıkış kodu 1
+"""
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from yerel_servisler import (ROOT_DIR, FakeStreamingModel, HashEmbedder, build_synthetic_catalogue,
+                             category_vocabulary, write_catalogue)
+
+# Senaryo başına sorgu şablonları; 'takip' senaryosu kategori içermez ve geçmişteki ürüne dayanır.
+# 'kategorisiz' sorgular kategori adı yerine kategoriye özgü kelimeler içerir (yönlendirici ile aranır).
+SCENARIO_TEMPLATES = {
+    "varsayilan": ["{cat} önerir misin", "{cat} almak istiyorum, ne önerirsin?", "sessiz bir {cat} lazım"],
+    "fiyat_araligi": ["{n} bin TL altı {cat}", "{n} ile {m} bin arası {cat}", "{n}k civarı {cat}"],
+    "en_ucuz": ["en ucuz {cat}", "en ucuz {cat} hangisi"],
+    "en_pahali": ["en pahalı {cat} modelini göster", "en pahalı {cat}"],
+    "fiyat_performans": ["fiyat performans {cat}", "f/p olarak en iyi {cat} hangisi"],
+    "kategorisiz": ["{w1} {w2} özellikli bir şey arıyorum", "{w1} olan en ucuz ürün"],
+}
+FOLLOW_UP_SCENARIO = "takip"
+FOLLOW_UP_QUESTIONS = ["garantisi kaç yıl?", "bunun enerji sınıfı ne?", "hangi satıcıdan almalıyım?"]
+FOLLOW_UP_PROBABILITY = 0.3
+REPORTED_METRICS = ("latency_p95_ms", "ttft_p95_ms")
+
+
+# --- HAZIRLIK ---
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="/chat için yerel sahtelerle yük testi.")
+    parser.add_argument("--categories", type=int, default=8, help="Katalogdaki kategori sayısı")
+    parser.add_argument("--products", type=int, default=500, help="Kategori başına ürün sayısı")
+    parser.add_argument("--requests", type=int, default=400, help="Ölçülen toplam istek sayısı")
+    parser.add_argument("--warmup", type=int, default=20, help="Ölçüme katılmayan ısınma isteği sayısı")
+    parser.add_argument("--concurrency", type=int, default=16, help="Eşzamanlı istemci sayısı")
+    parser.add_argument("--tokens", type=int, default=40, help="Sahte modelin ürettiği parça sayısı")
+    parser.add_argument("--token-delay-ms", type=float, default=10, help="Parçalar arası gecikme")
+    parser.add_argument("--first-token-ms", type=float, default=200, help="İlk parçadan önceki gecikme")
+    parser.add_argument("--server", choices=["flask", "async"], default="flask", help="Test edilecek sunucu")
+    parser.add_argument("--vector-tier", choices=["int8", "float16"], default=None,
+                        help="Veritabanını nicemlenmiş vektör katmanıyla oluştur (VeriTabanı.py --vector-tier)")
+    parser.add_argument("--work-dir", default=None, help="Katalog ve veritabanı klasörü (varsayılan: geçici)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json-output", default=None, help="Sonuçların yazılacağı JSON dosyası")
+    parser.add_argument("--baseline", default=None, help="Karşılaştırılacak önceki JSON sonucu")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Kabul edilen göreli gerileme")
+    return parser.parse_args()
+
+
+def prepare_database(args, work_dir, embedder):
+    """Sentetik kataloğu üretir ve VeriTabanı.py ile kaynak veritabanını oluşturur."""
+    with open(os.path.join(ROOT_DIR, "kategoriler.json"), 'r', encoding='utf-8') as f:
+        all_categories = json.load(f)
+    categories = random.Random(args.seed).sample(all_categories, args.categories)
+    catalogue_path = os.path.join(work_dir, "katalog.json")
+    source_db_path = os.path.join(work_dir, "kaynak_veritabani")
+    start_time = time.time()
+    write_catalogue(build_synthetic_catalogue(categories, args.products, embedder, seed=args.seed), catalogue_path)
+    command = [sys.executable, os.path.join(ROOT_DIR, "VeriTabanı.py"), "--input", catalogue_path,
+               "--db-path", source_db_path]
+    if args.vector_tier:
+        command += ["--vector-tier", args.vector_tier]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    print(f"Katalog hazır: {len(categories)} kategori x {args.products} ürün ({time.time() - start_time:.1f} sn)")
+    return categories, source_db_path
+
+
+def start_api(args, work_dir, source_db_path, embedder):
+    """API'yi yerel sahtelerle başlatır ve seçilen sunucuyu arka planda çalıştırır: (port, durdur)."""
+    os.environ["API_PROCESS_CLIENTS"] = "manual"
+    os.environ["DB_SOURCE_DIR"] = source_db_path
+    os.environ["SESSION_BACKEND"] = "memory"
+    os.chdir(ROOT_DIR)
+    import API
+    API.DB_PATH = os.path.join(work_dir, "api_veritabani")
+    API.initialize_shared_state()
+    model = FakeStreamingModel(tokens=args.tokens, token_delay=args.token_delay_ms / 1000,
+                               first_token_delay=args.first_token_ms / 1000)
+    API.initialize_process_clients(model=model, embed_content=embedder)
+
+    if args.server == "flask":
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, API.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.server_port, server.shutdown
+
+    import uvicorn
+    import AsyncAPI
+    server = uvicorn.Server(uvicorn.Config(AsyncAPI.app, host='127.0.0.1', port=0, log_level='warning',
+                                           lifespan='off'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+
+    return server.servers[0].sockets[0].getsockname()[1], stop
+
+
+# --- YÜK ÜRETİMİ ---
+
+def build_conversations(categories, total_requests, seed):
+    """Her konuşma bir ürün sorusu ve olasılıkla bir takip sorusundan oluşur: [(oturum, [(senaryo, sorgu)])]."""
+    rng = random.Random(seed)
+    scenarios = list(SCENARIO_TEMPLATES)
+    conversations, planned = [], 0
+    while planned < total_requests:
+        scenario = scenarios[len(conversations) % len(scenarios)]
+        n = rng.choice([5, 10, 20, 30, 50])
+        category = rng.choice(categories)
+        w1, w2 = rng.sample(category_vocabulary(category), 2)
+        query = rng.choice(SCENARIO_TEMPLATES[scenario]).format(cat=category.lower(), n=n, m=n * 2, w1=w1, w2=w2)
+        turns = [(scenario, query)]
+        if planned + 1 < total_requests and rng.random() < FOLLOW_UP_PROBABILITY:
+            turns.append((FOLLOW_UP_SCENARIO, rng.choice(FOLLOW_UP_QUESTIONS)))
+        conversations.append((f"yuk-{seed}-{len(conversations)}", turns))
+        planned += len(turns)
+    return conversations
+
+
+def send_chat(port, session_id, query):
+    """Tek bir /chat isteği gönderir ve akışı sonuna kadar okur."""
+    body = json.dumps({"query": query, "session_id": session_id})
+    start_time = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    result = {"ttft": None, "status": None, "outcome": "ok"}
+    try:
+        connection.request('POST', '/chat', body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        result["status"] = response.status
+        if response.status != 200:
+            result["outcome"] = "hata"
+            response.read()
+        else:
+            for line in iter(response.readline, b''):
+                if line.startswith(b'1:') and result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - start_time
+                elif line.startswith(b'2:'):
+                    result["outcome"] = "hata" if b'Modelden' in line else "bulunamadi"
+    except (OSError, http.client.HTTPException):
+        result["outcome"] = "hata"
+    finally:
+        connection.close()
+    result["latency"] = time.perf_counter() - start_time
+    return result
+
+
+def run_load(port, conversations, concurrency):
+    results = []
+    lock = threading.Lock()
+
+    def run_conversation(conversation):
+        session_id, turns = conversation
+        for scenario, query in turns:
+            result = send_chat(port, session_id, query)
+            result["scenario"] = scenario
+            with lock:
+                results.append(result)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_conversation, conversations))
+    return results, time.perf_counter() - start_time
+
+
+# --- RAPOR ---
+
+def percentile(values, fraction):
+    """En yakın sıra yöntemiyle yüzdelik değer."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(results, elapsed):
+    latencies = [r["latency"] * 1000 for r in results]
+    ttfts = [r["ttft"] * 1000 for r in results if r["ttft"] is not None]
+    summary = {"requests": len(results), "rps": len(results) / elapsed if elapsed else 0.0,
+               "errors": sum(r["outcome"] == "hata" for r in results),
+               "not_found": sum(r["outcome"] == "bulunamadi" for r in results)}
+    for name, values in (("latency", latencies), ("ttft", ttfts)):
+        for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            summary[f"{name}_{label}_ms"] = percentile(values, fraction)
+    return summary
+
+
+def format_ms(value):
+    return f"{value:8.1f}" if value is not None else "       -"
+
+
+def print_report(report):
+    print(f"\nSunucu: {report['server']}, eşzamanlılık {report['concurrency']}, süre {report['elapsed']:.1f} sn")
+    header = (f"{'senaryo':<18}{'istek':>6}{'rps':>8}{'hata':>6}{'yok':>5}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'TTFT50':>9}{'TTFT95':>9}{'TTFT99':>9}")
+    print(header)
+    print("-" * len(header))
+    for name, summary in list(report["scenarios"].items()) + [("TOPLAM", report["overall"])]:
+        print(f"{name:<18}{summary['requests']:>6}{summary['rps']:>8.1f}{summary['errors']:>6}{summary['not_found']:>5}"
+              f"{format_ms(summary['latency_p50_ms'])} {format_ms(summary['latency_p95_ms'])}"
+              f"{format_ms(summary['latency_p99_ms'])} {format_ms(summary['ttft_p50_ms'])}"
+              f"{format_ms(summary['ttft_p95_ms'])} {format_ms(summary['ttft_p99_ms'])}")
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """Önceki sonuca göre gerileyen ölçümleri listeler."""
+    regressions = []
+    for name, summary in list(report["scenarios"].items()) + [("TOPLAM", report["overall"])]:
+        previous = baseline["overall"] if name == "TOPLAM" else baseline["scenarios"].get(name)
+        if not previous:
+            continue
+        for metric in REPORTED_METRICS:
+            if summary.get(metric) and previous.get(metric) and summary[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {previous[metric]:.1f} -> {summary[metric]:.1f}")
+        if previous.get("rps") and summary["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name} rps: {previous['rps']:.1f} -> {summary['rps']:.1f}")
+    return regressions
+
+
+def main():
+    args = parse_arguments()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="chat_yuk_testi_")
+    os.makedirs(work_dir, exist_ok=True)
+    embedder = HashEmbedder()
+    categories, source_db_path = prepare_database(args, work_dir, embedder)
+    port, stop_server = start_api(args, work_dir, source_db_path, embedder)
+    try:
+        if args.warmup:
+            run_load(port, build_conversations(categories, args.warmup, args.seed + 1), args.concurrency)
+        results, elapsed = run_load(port, build_conversations(categories, args.requests, args.seed), args.concurrency)
+    finally:
+        stop_server()
+
+    report = {"server": args.server, "concurrency": args.concurrency, "elapsed": elapsed,
+              "scenarios": {}, "overall": summarize(results, elapsed)}
+    for scenario in list(SCENARIO_TEMPLATES) + [FOLLOW_UP_SCENARIO]:
+        scenario_results = [r for r in results if r["scenario"] == scenario]
+        if scenario_results:
+            report["scenarios"][scenario] = summarize(scenario_results, elapsed)
+    print_report(report)
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSonuçlar '{args.json_output}' dosyasına yazıldı.")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nGERİLEME tespit edildi (tolerans %{:.0f}):".format(args.tolerance * 100))
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\n✅ Önceki sonuca göre gerileme yok.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Sorgu çözümleme mikro-benchmark'ı.
+Eski extract_query_details (kategori listesinde tek tek `in` araması + ayrı regex geçişleri)
+ile Eslestirici.QueryMatcher tabanlı yeni sürümü gerçekçi bir sorgu kümesi üzerinde karşılaştırır.
+
+Kullanım: python benchmarks/eslestirici_benchmark.py [--queries 5000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from Eslestirici import QueryMatcher, parse_turkish_price  # noqa: E402
+
+CATEGORIES_FILENAME = os.path.join(ROOT_DIR, "kategoriler.json")
+SEARCH_INTENT_PHRASES = {
+    'price_performance': ['fiyat performans', 'f/p'],
+    'cheapest': ['daha ucuz', 'en ucuz'],
+    'most_expensive': ['daha pahalı', 'en pahalı'],
+}
+PRICE_RANGE_MULTIPLIER = 0.2
+
+QUERY_TEMPLATES = [
+    "en ucuz {cat}",
+    "en ucuz {cat} hangisi",
+    "{cat} önerir misin",
+    "{cat} almak istiyorum, ne önerirsin?",
+    "{n} bin TL civarı {cat}",
+    "{n}k altı {cat} var mı",
+    "{n} ile {m} bin arası fiyat performans {cat}",
+    "f/p olarak en iyi {cat} hangisi",
+    "en pahalı {cat} modelini göster",
+    "bütçem {n}.000 TL, iyi bir {cat} lazım",
+    "1,5 milyon bütçeli {cat}",
+    "bundan daha ucuz bir tane var mı",
+    "daha pahalı ama daha iyi bir seçenek",
+    "oyun için iyi bir ekran",
+    "bu ürünün garantisi kaç yıl",
+    "{cat} için {n} bin ile {m} bin arasında sessiz bir model",
+]
+
+
+# --- ESKİ UYGULAMA (KARŞILAŞTIRMA İÇİN BİREBİR KOPYA) ---
+
+def legacy_convert_words_to_numbers(text):
+    text = re.sub(r'(\d[\d\.,]*)\s*(?:bin|k)\b', lambda m: str(int(parse_turkish_price(m.group(1)) * 1000)), text,
+                  flags=re.IGNORECASE)
+    text = re.sub(r'(\d[\d\.,]*)\s*milyon\b', lambda m: str(int(parse_turkish_price(m.group(1)) * 1000000)), text,
+                  flags=re.IGNORECASE)
+    return text
+
+
+def legacy_extract_query_details(query_text, all_categories):
+    processed_query = legacy_convert_words_to_numbers(query_text)
+    lower_query = processed_query.lower()
+    found_category, search_text = None, processed_query
+    for category in all_categories:
+        category_lower = category.strip().lower()
+        if category_lower in lower_query:
+            found_category = category
+            break
+    search_type = 'default'
+    if 'fiyat performans' in lower_query or 'f/p' in lower_query:
+        search_type = 'price_performance'
+    elif 'daha ucuz' in lower_query or 'en ucuz' in lower_query:
+        search_type = 'cheapest'
+    elif 'daha pahalı' in lower_query or 'en pahalı' in lower_query:
+        search_type = 'most_expensive'
+    prices_str = re.findall(r'(\d[\d\.,]*)', processed_query)
+    prices = sorted([p for p in (parse_turkish_price(s) for s in prices_str) if p > 10])
+    return {"category": found_category, "search_type": search_type, "prices": prices,
+            "search_text": search_text.strip()}
+
+
+# --- YENİ UYGULAMA ---
+
+def matcher_extract_query_details(query_text, matcher):
+    match = matcher.match(query_text)
+    return {"category": match["category"], "search_type": match["search_type"] or 'default',
+            "prices": sorted(p for p in match["prices"] if p > 10),
+            "search_text": match["processed_text"].strip()}
+
+
+def build_corpus(categories, size, seed=42):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        template = rng.choice(QUERY_TEMPLATES)
+        category = rng.choice(categories)
+        if rng.random() < 0.5:
+            category = category.lower()
+        n = rng.choice([5, 10, 15, 20, 30, 45, 60])
+        corpus.append(template.format(cat=category, n=n, m=n + rng.choice([5, 10, 20])))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(CATEGORIES_FILENAME, 'r', encoding='utf-8') as f:
+        all_categories = sorted(json.load(f), key=len, reverse=True)
+    corpus = build_corpus(all_categories, args.queries)
+
+    build_time = timeit.timeit(lambda: QueryMatcher(all_categories, SEARCH_INTENT_PHRASES), number=1)
+    matcher = QueryMatcher(all_categories, SEARCH_INTENT_PHRASES)
+
+    legacy_results = [legacy_extract_query_details(q, all_categories) for q in corpus]
+    new_results = [matcher_extract_query_details(q, matcher) for q in corpus]
+    differences = [(q, old, new) for q, old, new in zip(corpus, legacy_results, new_results) if old != new]
+
+    legacy_time = min(timeit.repeat(lambda: [legacy_extract_query_details(q, all_categories) for q in corpus],
+                                    number=1, repeat=args.repeat))
+    new_time = min(timeit.repeat(lambda: [matcher_extract_query_details(q, matcher) for q in corpus],
+                                 number=1, repeat=args.repeat))
+
+    print(f"Kategori sayısı      : {len(all_categories)}")
+    print(f"Sorgu sayısı         : {len(corpus)}")
+    print(f"Otomat kurulum süresi: {build_time * 1000:.2f} ms (başlangıçta bir kez)")
+    print(f"Eski uygulama        : {legacy_time / len(corpus) * 1e6:.2f} µs/sorgu")
+    print(f"Otomat               : {new_time / len(corpus) * 1e6:.2f} µs/sorgu")
+    print(f"Hızlanma             : {legacy_time / new_time:.2f}x")
+    print(f"Farklı sonuç         : {len(differences)} / {len(corpus)}")
+    for query, old, new in differences[:10]:
+        print(f"  - {query!r}\n      eski: {old}\n      yeni: {new}")
+
+
+if __name__ == "__main__":
+    main()
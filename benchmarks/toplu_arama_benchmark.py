@@ -0,0 +1,101 @@
+"""
+Modelsiz arama uç noktaları benchmark'ı.
+Aynı sorgu kümesi için ürün seçimini üç yoldan ölçer: /chat döngüsü (sahte model akışı dahil),
+/search döngüsü ve /search/batch (toplu vektör isteği + koleksiyona göre gruplanmış sorgular).
+Saniyedeki sorgu sayısı, vektörleştirici çağrısı ve /search/batch ile /search sonuçlarının aynı ürünü
+seçip seçmediği raporlanır. Vektörleştiriciye Gemini'ye benzer bir gecikme eklenir.
+
+Kullanım: python benchmarks/toplu_arama_benchmark.py [--queries 400] [--batch-size 100] [--server flask|async]
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from ani_yuk_benchmark import SlowEmbedder  # noqa: E402
+from chat_yuk_testi import build_conversations, prepare_database, send_chat, start_api  # noqa: E402
+
+
+def post_json(port, path, payload):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    try:
+        connection.request('POST', path, body=json.dumps(payload), headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{path} {response.status}: {body[:200]!r}")
+        return json.loads(body)
+    finally:
+        connection.close()
+
+
+def top_product_id(result):
+    return result["products"][0]["product_id"] if result["products"] else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=400, help="Toplam sorgu sayısı")
+    parser.add_argument("--batch-size", type=int, default=100, help="/search/batch isteği başına sorgu sayısı")
+    parser.add_argument("--concurrency", type=int, default=16, help="/chat ve /search döngülerinde istemci sayısı")
+    parser.add_argument("--embed-latency-ms", type=float, default=100)
+    parser.add_argument("--server", choices=["flask", "async"], default="flask")
+    parser.add_argument("--products", type=int, default=500, help="Kategori başına ürün sayısı")
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    # start_api'nin beklediği sahte model ayarları (chat_yuk_testi varsayılanları)
+    args.tokens, args.token_delay_ms, args.first_token_ms, args.vector_tier = 40, 10, 200, None
+
+    work_dir = tempfile.mkdtemp(prefix="toplu_arama_benchmark_")
+    embedder = SlowEmbedder(args.embed_latency_ms / 1000)
+    categories, source_db_path = prepare_database(args, work_dir, embedder)
+    port, stop_server = start_api(args, work_dir, source_db_path, embedder)
+    import API
+    # Karşılaştırma soğuk önbellekle yapılır: arama sonucu önbelleği kapatılır,
+    # vektör önbelleği her yoldan önce boşaltılır.
+    API.SEARCH_CACHE = None
+    # Takip soruları oturum geçmişine dayandığından yalnızca konuşmaların ilk soruları kullanılır
+    queries = [turns[0][1] for _, turns in build_conversations(categories, 2 * args.queries, args.seed)][:args.queries]
+
+    def measure(label, run):
+        API.EMBEDDING_CACHE.memory.clear()
+        embedder.calls = 0
+        start = time.perf_counter()
+        output = run()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28}{elapsed:>9.2f}{len(queries) / elapsed:>12.1f}{embedder.calls:>16}")
+        return output
+
+    try:
+        print(f"\n{len(queries)} sorgu, sunucu {args.server}, "
+              f"vektörleştirici gecikmesi {args.embed_latency_ms:.0f} ms\n")
+        print(f"{'yol':<28}{'süre sn':>9}{'sorgu/sn':>12}{'vektör çağrısı':>16}")
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            measure(f"/chat döngüsü (x{args.concurrency})",
+                    lambda: list(executor.map(lambda i: send_chat(port, f"toplu-{i}", queries[i]),
+                                              range(len(queries)))))
+            single = measure(f"/search döngüsü (x{args.concurrency})",
+                             lambda: list(executor.map(lambda q: post_json(port, '/search', {"query": q}), queries)))
+        batches = [queries[i:i + args.batch_size] for i in range(0, len(queries), args.batch_size)]
+        batched = measure(f"/search/batch ({args.batch_size}/istek)",
+                          lambda: [result for batch in batches
+                                   for result in post_json(port, '/search/batch', {"queries": batch})["results"]])
+
+        same = sum(top_product_id(a) == top_product_id(b) for a, b in zip(single, batched))
+        found = sum(1 for result in batched if result["products"])
+        print(f"\n/search/batch ile /search aynı ürünü seçti: {same}/{len(queries)} "
+              f"(ürün bulunan sorgu: {found})")
+    finally:
+        stop_server()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Nicemlenmiş vektör katmanı benchmark'ı.
+Fiyat aralığı verilmiş aramalarda mevcut yol (ChromaDB'de min_price filtreli sorgu) ile fiyat indeksine
+hizalı int8 / float16 katmanla kaba aday seçimi + ChromaDB'de kesin yeniden sıralamayı karşılaştırır.
+Doğruluk, aralıktaki ürünler üzerinde tam hassasiyetli kaba kuvvet aramasına göre recall@20 olarak ölçülür.
+Ayrıca vektör başına bellek/disk maliyeti mevcut düzenlerle karşılaştırılır.
+
+Kullanım: python benchmarks/vektor_katmani_benchmark.py [--categories 4] [--products 5000] [--dim 768]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from BelgeDeposu import split_metadata  # noqa: E402
+from FiyatIndeksi import PriceIndex, price_bounds_from_where  # noqa: E402
+from VektorKatmani import VECTOR_TIER_DTYPES  # noqa: E402
+from VeriTabanı import DB_BATCH_SIZE, build_metadata, get_min_price, sanitize_collection_name  # noqa: E402
+from chat_yuk_testi import percentile  # noqa: E402
+from yerel_servisler import FEATURE_WORDS, HashEmbedder, build_synthetic_catalogue, category_vocabulary  # noqa: E402
+
+CATEGORIES = ["Buzdolabı", "Çamaşır Makinesi", "Televizyon", "Laptop", "Süpürge", "Klima", "Fırın", "Kulaklık"]
+N_RESULTS = 20
+RERANK_FACTORS = (1, 2, 4, 8)
+PRICE_RANGE_MULTIPLIER = 0.2
+
+
+def build_database(db_path, products_by_category):
+    client = chromadb.PersistentClient(path=db_path)
+    for category, products in products_by_category.items():
+        collection = client.create_collection(name=sanitize_collection_name(category))
+        ids_list = [p['product_id'].replace('.html', '') for p in products]
+        embeddings_list = [p['embedding_vector'] for p in products]
+        metadata_list = [split_metadata(build_metadata(p, get_min_price(p)))[0] for p in products]
+        for i in range(0, len(ids_list), DB_BATCH_SIZE):
+            collection.add(ids=ids_list[i:i + DB_BATCH_SIZE], embeddings=embeddings_list[i:i + DB_BATCH_SIZE],
+                           metadatas=metadata_list[i:i + DB_BATCH_SIZE])
+    return client
+
+
+def build_queries(products_by_category, embedder, count, seed=3):
+    """API'nin ürettiği biçimde fiyat aralıklı sorgular: (koleksiyon, sorgu vektörü, where filtresi)."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        category = rng.choice(list(products_by_category))
+        priced = [p for p in products_by_category[category] if get_min_price(p) != float('inf')]
+        price = get_min_price(rng.choice(priced))
+        text = " ".join(rng.choices(FEATURE_WORDS, k=3) + rng.choices(category_vocabulary(category), k=2))
+        where_filter = {"$and": [{"min_price": {"$gte": price * (1 - PRICE_RANGE_MULTIPLIER)}},
+                                 {"min_price": {"$lte": price * (1 + PRICE_RANGE_MULTIPLIER)}}]}
+        queries.append((sanitize_collection_name(category), embedder.embed_text(text), where_filter))
+    return queries
+
+
+def exact_top_ids(exact_vectors, index, query_embedding, start, end):
+    """Aralıktaki ürünler üzerinde tam hassasiyetli kaba kuvvet araması (doğruluk referansı)."""
+    ids = index.ids[start:end]
+    vectors = np.asarray([exact_vectors[product_id] for product_id in ids], dtype=np.float64)
+    distances = ((vectors - np.asarray(query_embedding, dtype=np.float64)) ** 2).sum(axis=1)
+    return set(ids[np.argsort(distances, kind='stable')[:N_RESULTS]].tolist())
+
+
+def run_method(client, queries, truths, candidate_ids_for):
+    """candidate_ids_for None ise filtreli ChromaDB sorgusu, değilse kaba seçim + kesin yeniden sıralama."""
+    latencies, coarse_latencies, recalls = [], [], []
+    for (collection_name, embedding, where_filter), truth in zip(queries, truths):
+        collection = client.get_collection(name=collection_name)
+        start = time.perf_counter()
+        if candidate_ids_for is None:
+            result = collection.query(query_embeddings=[embedding], n_results=N_RESULTS, where=where_filter,
+                                      include=['metadatas', 'distances'])
+        else:
+            candidate_ids = candidate_ids_for(collection_name, embedding, where_filter)
+            coarse_latencies.append((time.perf_counter() - start) * 1000)
+            result = collection.query(query_embeddings=[embedding], ids=candidate_ids,
+                                      n_results=min(N_RESULTS, len(candidate_ids)),
+                                      include=['metadatas', 'distances']) if candidate_ids else {'ids': [[]]}
+        latencies.append((time.perf_counter() - start) * 1000)
+        if truth:
+            recalls.append(len(truth & set(result['ids'][0])) / len(truth))
+    return latencies, coarse_latencies, recalls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--products", type=int, default=5000, help="Kategori başına ürün sayısı")
+    parser.add_argument("--dim", type=int, default=768, help="Vektör boyutu (text-embedding-004: 768)")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    embedder = HashEmbedder(dim=args.dim)
+    categories = CATEGORIES[:args.categories]
+    products = build_synthetic_catalogue(categories, args.products, embedder)
+    products_by_category = {}
+    for product in products:
+        products_by_category.setdefault(product['subcategory'], []).append(product)
+    exact_vectors = {p['product_id'].replace('.html', ''): p['embedding_vector'] for p in products}
+    queries = build_queries(products_by_category, embedder, args.queries)
+
+    work_dir = tempfile.mkdtemp(prefix="vektor_katmani_benchmark_")
+    try:
+        db_path = os.path.join(work_dir, "db")
+        client = build_database(db_path, products_by_category)
+        chroma_size = sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, files in os.walk(db_path) for name in files)
+        indexes = {dtype: PriceIndex.build(client, vector_dtype=dtype) for dtype in VECTOR_TIER_DTYPES}
+        reference = indexes[VECTOR_TIER_DTYPES[0]]
+        slices = [reference.get(name).price_slice(*price_bounds_from_where(where)) for name, _, where in queries]
+        truths = [exact_top_ids(exact_vectors, reference.get(name), embedding, *slice_)
+                  for (name, embedding, _), slice_ in zip(queries, slices)]
+        slice_sizes = [end - start for start, end in slices]
+
+        run_method(client, queries[:10], truths[:10], None)  # ısınma
+        rows = [("chroma filtreli sorgu", *run_method(client, queries, truths, None))]
+        for dtype, index in indexes.items():
+            for factor in RERANK_FACTORS:
+                def candidate_ids_for(collection_name, embedding, where_filter, index=index, factor=factor):
+                    collection_index = index.get(collection_name)
+                    start, end = collection_index.price_slice(*price_bounds_from_where(where_filter))
+                    return collection_index.nearest_ids(embedding, start, end, N_RESULTS * factor)
+                rows.append((f"{dtype} katman x{factor}", *run_method(client, queries, truths, candidate_ids_for)))
+
+        print(f"Ürün sayısı: {len(products)} ({len(categories)} kategori), vektör boyutu {args.dim}, "
+              f"{len(queries)} fiyat aralıklı sorgu (aralıktaki ürün sayısı p50 {statistics.median(slice_sizes):.0f})")
+        print(f"\n{'yöntem':<24}{'p50 ms':>9}{'p95 ms':>9}{'kaba p50':>10}{'recall@20':>11}")
+        print("-" * 63)
+        for label, latencies, coarse, recalls in rows:
+            coarse_text = f"{statistics.median(coarse):.2f}" if coarse else "-"
+            print(f"{label:<24}{statistics.median(latencies):>9.2f}{percentile(latencies, 0.95):>9.2f}"
+                  f"{coarse_text:>10}{statistics.mean(recalls):>11.3f}")
+
+        sample = products[0]['embedding_vector']
+        print("\nVektör başına bellek/disk:")
+        print(f"  JSON metni (veriler_vektorlu.json) : {len(json.dumps(sample)):>7} bayt")
+        print(f"  Python float listesi (bellekte)    : "
+              f"{sys.getsizeof(sample) + sum(sys.getsizeof(x) for x in sample):>7} bayt")
+        print(f"  float32 (ChromaDB)                 : {4 * args.dim:>7} bayt")
+        for dtype, index in indexes.items():
+            tier_bytes = sum(c.vectors.nbytes for c in index.collections.values())
+            tier_count = sum(len(c.vectors) for c in index.collections.values())
+            print(f"  {dtype + ' katmanı':<35}: {tier_bytes / tier_count:>7.0f} bayt "
+                  f"(toplam {tier_bytes / 2 ** 20:.1f} MB)")
+        print(f"  ChromaDB klasörü toplamı           : {chroma_size / len(products):>7.0f} bayt "
+              f"(toplam {chroma_size / 2 ** 20:.1f} MB)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
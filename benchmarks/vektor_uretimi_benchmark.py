@@ -0,0 +1,105 @@
+"""
+Vektör üretim hattı benchmark'ı.
+Ağ gecikmesi ve ara sıra hata veren yerel bir vektörleştiriciyle VektorUretici.EmbeddingPipeline'ı çalıştırır:
+- eşzamanlılığa göre verim (ürün/sn),
+- yarıda kesilen bir çalıştırmadan sonra devam (kontrol noktasından okunan / yeniden üretilen ürün sayısı),
+- metni değişen ürünlerin yalnızca kendilerinin yeniden vektörleştirilmesi.
+
+Kullanım: python benchmarks/vektor_uretimi_benchmark.py [--products 20000] [--latency-ms 50] [--failure-rate 0.05]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import VektorUretici  # noqa: E402
+from VektorUretici import EmbeddingPipeline, HashEmbedder  # noqa: E402
+from yerel_servisler import build_synthetic_catalogue  # noqa: E402
+
+CATEGORIES = ["Buzdolabı", "Çamaşır Makinesi", "Televizyon", "Laptop"]
+CONCURRENCY_LEVELS = (1, 4, 8)
+
+
+class RemoteLikeEmbedder(HashEmbedder):
+    """Her toplu isteği latency saniye bekleten ve failure_rate olasılıkla hata veren vektörleştirici."""
+
+    def __init__(self, latency, failure_rate, seed=5):
+        super().__init__()
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def embed_batch(self, texts):
+        time.sleep(self.latency)
+        with self._lock:
+            failed = self._rng.random() < self.failure_rate
+        if failed:
+            raise RuntimeError("429 Resource exhausted (benzetim)")
+        return super().embed_batch(texts)
+
+
+def run_pipeline(products, checkpoint_path, args, concurrency, limit=None):
+    """Hattı çalıştırır; limit verilirse o kadar ürün alındıktan sonra yarıda keser (çökme benzetimi)."""
+    embedder = RemoteLikeEmbedder(args.latency_ms / 1000, args.failure_rate)
+    pipeline = EmbeddingPipeline(embedder, checkpoint_path, batch_size=args.batch_size, concurrency=concurrency)
+    start = time.perf_counter()
+    received = 0
+    output = pipeline.run(dict(product) for product in products)
+    for product in output:
+        received += 1 if product.get('embedding_vector') else 0
+        if limit is not None and received >= limit:
+            output.close()
+            break
+    return pipeline, received, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000, help="Toplam ürün sayısı")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Toplu istek başına benzetilen gecikme")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Geçici hata veren istek oranı")
+    args = parser.parse_args()
+    # Benzetimde yeniden deneme beklemeleri kısaltılır
+    VektorUretici.RETRY_BASE_DELAY = 0.01
+
+    products = build_synthetic_catalogue(CATEGORIES, args.products // len(CATEGORIES), None)
+    work_dir = tempfile.mkdtemp(prefix="vektor_uretimi_benchmark_")
+    try:
+        print(f"{len(products)} ürün, toplu iş {args.batch_size}, istek gecikmesi {args.latency_ms:.0f} ms, "
+              f"hata oranı {args.failure_rate:.0%}\n")
+        print(f"{'eşzamanlılık':<14}{'süre sn':>9}{'ürün/sn':>10}{'istek':>8}{'başarısız':>11}")
+        for concurrency in CONCURRENCY_LEVELS:
+            checkpoint_path = os.path.join(work_dir, f"verim_{concurrency}.sqlite")
+            pipeline, received, elapsed = run_pipeline(products, checkpoint_path, args, concurrency)
+            print(f"{concurrency:<14}{elapsed:>9.2f}{received / elapsed:>10.0f}{pipeline.requests:>8}"
+                  f"{pipeline.failed:>11}")
+
+        checkpoint_path = os.path.join(work_dir, "devam.sqlite")
+        concurrency = CONCURRENCY_LEVELS[-1]
+        _, received, elapsed = run_pipeline(products, checkpoint_path, args, concurrency, limit=len(products) // 2)
+        print(f"\nYarıda kesilen çalıştırma: {received} ürün, {elapsed:.2f} sn")
+        pipeline, _, elapsed = run_pipeline(products, checkpoint_path, args, concurrency)
+        print(f"Devam: {pipeline.reused} ürün kontrol noktasından, {pipeline.embedded} ürün yeniden üretildi, "
+              f"{elapsed:.2f} sn")
+
+        changed = random.Random(9).sample(range(len(products)), len(products) // 100)
+        for i in changed:
+            products[i] = dict(products[i], features=products[i]['features'] + " güncellendi")
+        pipeline, _, elapsed = run_pipeline(products, checkpoint_path, args, concurrency)
+        print(f"Metni değişen {len(changed)} ürün: {pipeline.embedded} ürün yeniden vektörleştirildi, "
+              f"{pipeline.reused} ürün kontrol noktasından, {elapsed:.2f} sn")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
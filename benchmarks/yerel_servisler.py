@@ -0,0 +1,132 @@
+"""
+Benchmark'lar için Google servislerinin yerine geçen belirlenimci (deterministic) yerel sahteler.
+
+- HashEmbedder (VektorUretici'den): genai.embed_content ile aynı imzaya sahip, kelime özetlerine dayalı
+  vektör üretici.
+- FakeStreamingModel: generate_content(stream=True) ve generate_content_async ile parça parça,
+  ayarlanabilir gecikmeyle metin üreten sahte dil modeli.
+- build_synthetic_catalogue: VeriTabanı.py'nin girdi biçiminde sentetik ürün kataloğu.
+
+Konuşma geçmişi için OturumDeposu.InMemorySessionBackend, bucket yerine DepoSenkronu.LocalStorageBackend kullanılır.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from VektorUretici import HashEmbedder, embedding_text  # noqa: E402,F401
+
+BRANDS = ["Arçelik", "Vestel", "Samsung", "LG", "Bosch", "Philips", "Lenovo", "Asus", "Xiaomi", "Casper"]
+FEATURE_WORDS = ["enerji", "sınıfı", "sessiz", "akıllı", "kablosuz", "hızlı", "geniş", "ekran", "hafif",
+                 "dayanıklı", "inverter", "motor", "garanti", "çift", "kapasite", "turbo", "dokunmatik",
+                 "wifi", "bluetooth", "çelik", "cam", "uzaktan", "kumanda", "otomatik", "program", "litre"]
+# Kategoriye özgü sözde kelimeler bu hecelerden üretilir
+SYLLABLES = ["ka", "le", "mi", "ro", "tu", "sa", "ne", "bo", "zi", "da", "fe", "gu", "pa", "ti"]
+CATEGORY_VOCABULARY_SIZE = 8
+SELLERS = ["Hepsiburada", "Trendyol", "n11", "Amazon", "Teknosa", "MediaMarkt", "Vatan"]
+
+
+# --- SAHTE DİL MODELİ ---
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamingModel:
+    """
+    Sabit sayıda parçayı, her parça arasında token_delay saniye bekleyerek akış halinde döndürür.
+    first_token_delay, modelin ilk parçayı üretmeden önceki düşünme süresini taklit eder.
+    """
+
+    def __init__(self, tokens=40, token_delay=0.01, first_token_delay=0.2):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.calls = 0
+
+    def _pieces(self, prompt):
+        seed = int(hashlib.md5(prompt.encode('utf-8'), usedforsecurity=False).hexdigest()[:8], 16)
+        words = random.Random(seed).choices(FEATURE_WORDS, k=self.tokens)
+        return [f"{word} " for word in words]
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        pieces = self._pieces(prompt)
+        if not stream:
+            time.sleep(self.first_token_delay + self.token_delay * len(pieces))
+            return FakeChunk("".join(pieces))
+
+        def iterate():
+            time.sleep(self.first_token_delay)
+            for index, piece in enumerate(pieces):
+                if index:
+                    time.sleep(self.token_delay)
+                yield FakeChunk(piece)
+
+        return iterate()
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        pieces = self._pieces(prompt)
+        if not stream:
+            await asyncio.sleep(self.first_token_delay + self.token_delay * len(pieces))
+            return FakeChunk("".join(pieces))
+
+        async def iterate():
+            await asyncio.sleep(self.first_token_delay)
+            for index, piece in enumerate(pieces):
+                if index:
+                    await asyncio.sleep(self.token_delay)
+                yield FakeChunk(piece)
+
+        return iterate()
+
+
+# --- SENTETİK KATALOG ---
+
+def category_vocabulary(category, size=CATEGORY_VOCABULARY_SIZE):
+    """Kategoriye özgü, her çağrıda aynı olan sözde kelimeler (kategori adı geçmeyen sorgular için)."""
+    rng = random.Random(hashlib.md5(category.encode('utf-8'), usedforsecurity=False).hexdigest())
+    return ["".join(rng.choices(SYLLABLES, k=3)) for _ in range(size)]
+
+
+def build_synthetic_catalogue(categories, products_per_category, embedder, seed=42):
+    """
+    Her kategori için products_per_category ürün üretir (VeriTabanı.py girdi biçiminde).
+    Fiyatlar kategori başına farklı bir ölçekte log-normal dağılır; bazı ürünlerin teklifi yoktur.
+    Özellikler ortak kelimelerle kategoriye özgü kelimelerin karışımıdır.
+    embedder None ise ürünler vektörsüz (ham) döner.
+    """
+    rng = random.Random(seed)
+    products, product_number = [], 0
+    for category in categories:
+        price_scale = rng.choice([500, 2000, 10000, 40000])
+        vocabulary = category_vocabulary(category)
+        for _ in range(products_per_category):
+            product_number += 1
+            name = f"{rng.choice(BRANDS)} {category} {rng.choice('ABCDEFGHKMX')}{rng.randint(100, 9999)}"
+            feature_words = rng.choices(FEATURE_WORDS, k=rng.randint(5, 60)) + rng.choices(vocabulary, k=rng.randint(2, 6))
+            rng.shuffle(feature_words)
+            features = " ".join(feature_words)
+            offers = [{"seller_name": rng.choice(SELLERS),
+                       "price": round(price_scale * rng.lognormvariate(0, 0.5), 2),
+                       "offer_url": f"https://example.com/teklif/{product_number}/{i}"}
+                      for i in range(rng.choice([0, 1, 2, 3, 5]))]
+            product = {"product_id": f"{product_number}.html", "product_name": name,
+                       "subcategory": category, "features": features, "offers": offers}
+            if embedder is not None:
+                product["embedding_vector"] = embedder.embed_text(embedding_text(product))
+            products.append(product)
+    return products
+
+
+def write_catalogue(products, filename):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(products, f, ensure_ascii=False)
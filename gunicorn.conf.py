@@ -0,0 +1,26 @@
+import os
+
+# Ana süreç uygulamayı bir kez yükler (veritabanı eşitleme, mmap fiyat indeksi, kategori eşleştiricisi);
+# işçiler bu salt okunur durumu fork ile devralır ve kendi istemcilerini fork'tan sonra açar.
+os.environ.setdefault("API_PROCESS_CLIENTS", "post_fork")
+
+bind = f":{os.environ.get('PORT', 8080)}"
+# Varsayılan tek işçidir. Fiyat indeksi, belge deposu ve yönlendirici sayfa önbelleğinden paylaşılır;
+# ancak ChromaDB istemcisi fork'tan sonra açıldığından HNSW indeksleri her işçide ayrıca yüklenir.
+# İşçi başına ek bellek ≈ 20 MB + toplam ürün sayısı x vektör boyutu x 4 bayt x ~1.2
+# (ör. 768 boyutlu 100.000 ürün için ~390 MB); WEB_CONCURRENCY buna göre seçilmelidir.
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = 0
+preload_app = True
+
+if workers > 1:
+    # Aynı oturumun ardışık istekleri farklı işçilere düşebilir; süreç içi geçmiş önbelleği bayatlar.
+    # Geçmiş her istekte arka uçtan okunur ve yeni turlar beklemeden yazılır.
+    os.environ.setdefault("SESSION_CACHE_ENABLED", "0")
+    os.environ.setdefault("SESSION_FLUSH_INTERVAL", "0")
+
+
+def post_fork(server, worker):
+    import API
+    API.initialize_process_clients()
@@ -1,22 +1,17 @@
 #!/bin/bash
 
-# GCS'teki bucket adınız ve klasör adı
-BUCKET_NAME="rag-api-veritabani" # KENDİ BUCKET ADINIZI YAZIN
-SOURCE_FOLDER="urun_veritabani"
-DESTINATION_FOLDER="./urun_veritabani"
+# Veritabanı artık API başlatılırken manifestoya göre eşitleniyor (bkz. DepoSenkronu.py):
+# yerelde geçerli olan dosyalar atlanır, eksikler paralel indirilir.
 
-# Hedef klasörün zaten var olup olmadığını kontrol et
-if [ -d "$DESTINATION_FOLDER" ]; then
-    echo "Veritabanı klasörü zaten mevcut, indirme atlanıyor."
-else
-    echo "Veritabanı GCS'ten indiriliyor..."
-    # gcloud storage cp komutu ile tüm klasörü indir
-    # -r: recursive (tüm alt dosyaları al), -n: no-clobber (varsa üzerine yazma)
-    gcloud storage cp -r "gs://${BUCKET_NAME}/${SOURCE_FOLDER}" .
-    echo "İndirme tamamlandı."
+# SERVER_MODE=async ise /chat asenkron (ASGI) sunucuda çalışır: uzun model akışları iş parçacığı
+# tutmaz, yüzlerce eşzamanlı akış tek süreçte taşınabilir (bkz. AsyncAPI.py).
+if [ "$SERVER_MODE" = "async" ]; then
+    echo "Asenkron (uvicorn) sunucu başlatılıyor..."
+    exec uvicorn AsyncAPI:app --host 0.0.0.0 --port $PORT --timeout-keep-alive 75
 fi
 
 # Gunicorn sunucusunu başlat
-# Procfile'daki komutu buraya taşıdık
+# Veritabanı ana süreçte bir kez hazırlanır; işçi sayısı (varsayılan 1) ve işçi başına bellek maliyeti için
+# bkz. gunicorn.conf.py
 echo "Gunicorn sunucusu başlatılıyor..."
-gunicorn --bind :$PORT --workers 1 --threads 8 --timeout 0 API:app
\ No newline at end of file
+gunicorn -c gunicorn.conf.py API:app
\ No newline at end of file